@@ -27,7 +27,8 @@ module flash2sdram #(
   // 32-bit words
   localparam NUM_WORD = NUM_BYTES / 4;
 
-  reg [15:0] write_counter = 0, read_counter = 0;
+  // up to all 2^19 words of SDRAM, the route index sits after the content
+  reg [19:0] write_counter = 0, read_counter = 0;
   reg [1:0] spi_counter = 0;
   reg [1:0] state = 0;
   // reg spi_ready = 0;
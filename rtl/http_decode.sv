@@ -1,18 +1,57 @@
 /**
 * Parses TCP payload for a HTTP request. At the moment we support matching
-* a bare minimum "GET <TARGET>\r\n" payload. TARGET should only be 1 byte for
-* now.
+* a bare minimum "GET <TARGET>\r\n" payload. TARGET is a path of up to
+* MAX_PATH_WORDS words, terminated by ' ', '\r', '\n' or '?'.
 *
-* Response is asserted 3 cycles after i_payload_valid is de-asserted. Response
-* is asserted for only 1 cycle with no handshaking.
+* The path is hashed with CRC32 while it streams in, 4 bytes per cycle. The
+* fingerprint is then mapped to a slot with the perfect hash built by
+* tools/route_hash.py:
+*   h1 = mix(fp, seed1)[31 -: BUCKET_BITS], h2 = mix(fp, seed2)[31 -: SLOT_BITS]
+*   slot = h2 ^ disp[h1]
+* The slot stores the fingerprint it was built for, a mismatch is a 404.
+*
+* http_entry caches 512 slots, the lower 9 bits of the slot pick the entry and
+* the rest must match its tag. Every slot is also in an index in SDRAM, on a
+* miss its 5 words are read from there and replace the cached entry.
+*
+* A request line with a HTTP version is followed by headers, which are scanned
+* for "Accept-Encoding:" listing gzip until the blank line or the end of the
+* payload. The lookup runs while the headers stream in, a gzip variant of the
+* page is picked if the client accepts it and one exists.
+*
+* The connection is kept open after the response only for a "HTTP/1.1"
+* request without a "Connection: close" header, res_close tells tcb to close
+* it otherwise. The version is matched anywhere in the request line and
+* headers, like the gzip token.
+*
+* The response also points at the first checksum of the page in the segment
+* table of http_entry, which tcb_serializer reads through seg_rd_idx.
+*
+* Response is asserted 8 cycles after the word holding the end of the path, or
+* 1 cycle after the end of the headers, whichever is later. This does not
+* depend on path length or number of pages. Response is asserted for only
+* 1 cycle with no handshaking.
 */
 module http_decode #(
     parameter HTTP_ADDR_FILE = "",
-    parameter HTTP_SIZE_FILE = ""
+    parameter HTTP_SIZE_FILE = "",
+    parameter HTTP_KEY_FILE = "",
+    parameter HTTP_SEED_FILE = "",
+    parameter HTTP_DISP_FILE = "",
+    parameter HTTP_GZIP_ADDR_FILE = "",
+    parameter HTTP_GZIP_SIZE_FILE = "",
+    parameter HTTP_SEG_FILE = "",
+    // 2^HTTP_SLOT_BITS route slots, from 9 to 13
+    parameter HTTP_SLOT_BITS = 9,
+    // longer paths are never looked up
+    parameter MAX_PATH_WORDS = 64,
+    // size of the incoming TCP buffer
+    parameter MAX_REQUEST_WORDS = 512
 ) (
     input clk,
     input rst,
     input tcp_payload_valid,
+    input [15:0] tcp_payload_size,
     input i_payload_valid,
     input [31:0] i_payload_data,
     // Asserted to ask for the payload
@@ -20,25 +59,182 @@ module http_decode #(
     output reg res_valid,
     output reg res_err,
     output reg [15:0] res_payload_size,
-    output reg [18:0] res_payload_addr
+    output reg [18:0] res_payload_addr,
+    // first entry of the page in the segment checksum table
+    output reg [9:0] res_payload_seg,
+    // close the connection once the response is sent
+    output reg res_close,
+    input [9:0] seg_rd_idx,
+    output [15:0] seg_checksum,
+    // reads slots missing from http_entry, held until all words are valid
+    output reg index_rd_en,
+    output reg [18:0] index_rd_ad,
+    input index_rd_valid,
+    input [31:0] index_rd_data
 );
 
   typedef enum {
     IDLE,
     GET_PAYLOAD,
     METHOD,
-    TARGET,
-    MATCH,
-    // FIXME: might not need extra stall here
-    WAIT_CAM1,
-    WAIT_CAM2,
+    PATH,
+    HEADERS,
+    WAIT_LOOKUP,
+    INDEX_READ,
+    INDEX_FILL,
     ABORT
   } state_t;
+  localparam int BUCKET_BITS = HTTP_SLOT_BITS - 1 < 10 ? HTTP_SLOT_BITS - 1 : 10;
+  // addr, length, key, gzip addr, gzip length in each 8 word index entry
+  localparam int INDEX_WORDS = 5;
 
   state_t state, next_state;
-  reg [ 8:0] key;
+  reg [HTTP_SLOT_BITS-1:0] key;
+  wire [3:0] key_tag = 4'(key >> 9);
   reg [31:0] working;
+  reg        working_valid;
   reg [ 2:0] method_counter;
+  reg [$clog2(MAX_REQUEST_WORDS)-1:0] word_idx;
+  reg [15:0] payload_words;
+  wire last_word = word_idx + 1 >= payload_words || word_idx == MAX_REQUEST_WORDS - 1;
+
+  // the 2 seeds, then the word address of the index in SDRAM
+  reg [31:0] seeds[3];
+`ifdef SYNTHESIS
+  if (HTTP_SEED_FILE != "") initial $readmemh(HTTP_SEED_FILE, seeds);
+  else initial begin
+    seeds[0] = '0;
+    seeds[1] = '0;
+    seeds[2] = '0;
+  end
+`else
+  initial begin
+    string seed_file = HTTP_SEED_FILE;
+    void'($value$plusargs("HTTP_SEED_FILE=%s", seed_file));
+    seeds[0] = '0;
+    seeds[1] = '0;
+    seeds[2] = '0;
+    if (seed_file != "") $readmemh(seed_file, seeds);
+  end
+`endif
+
+  // working contains the path LSB first, every byte before the first
+  // terminator is part of the path
+  wire [3:0] path_term;
+  wire [3:0] path_keep;
+  wire [3:0] path_eol;
+  wire [31:0] crc_chain[5];
+  wire [31:0] crc_step[4];
+  reg [31:0] crc;
+  reg [$clog2(MAX_PATH_WORDS)-1:0] path_words;
+  reg path_overflow;
+  assign crc_chain[0] = crc;
+
+  // last 16 header bytes before working, oldest in the LSB like working
+  reg [127:0] header_hist;
+  wire [159:0] header_seq = {working, header_hist};
+  wire [3:0] accept_end, gzip_end, blank_end, header_nl;
+  wire [3:0] version_end, conn_end, close_end;
+  reg in_accept, accept_gzip, http11, in_conn, conn_close;
+  logic scan_in_accept, scan_gzip, scan_blank, scan_http11, scan_in_conn, scan_close;
+
+  genvar i;
+  for (i = 0; i < 4; i = i + 1) begin : g_path_byte
+    wire [7:0] b = working[8*i+:8];
+    assign path_term[i] = b == " " || b == "\r" || b == "\n" || b == "?";
+    assign path_eol[i] = b == "\r" || b == "\n";
+    if (i == 0) assign path_keep[i] = !path_term[i];
+    else assign path_keep[i] = path_keep[i-1] && !path_term[i];
+    crc32 #(
+        .WIDTH(8)
+    ) path_crc (
+        .din(b),
+        .crc_next(crc_chain[i]),
+        .crc_out(crc_step[i])
+    );
+    assign crc_chain[i+1] = path_keep[i] ? crc_step[i] : crc_chain[i];
+
+    // patterns end at byte i of working, all their characters have bit 5
+    // set so OR-ing it in makes the header name case insensitive.
+    assign accept_end[i] = (header_seq[8*(i+1)+:128] | {16{8'h20}}) == ":gnidocne-tpecca";
+    assign gzip_end[i] = (header_seq[8*(i+13)+:32] | {4{8'h20}}) == "pizg";
+    assign blank_end[i] = header_seq[8*(i+13)+:32] == {"\n", "\r", "\n", "\r"};
+    assign header_nl[i] = b == "\n";
+    // the version is case sensitive
+    assign version_end[i] = header_seq[8*(i+9)+:64] == "1.1/PTTH";
+    assign conn_end[i] = (header_seq[8*(i+6)+:88] | {11{8'h20}}) == ":noitcennoc";
+    assign close_end[i] = (header_seq[8*(i+12)+:40] | {5{8'h20}}) == "esolc";
+  end
+
+  // the first terminator decides if there is a version and headers to follow
+  wire [3:0] path_first = path_term & {path_keep[2:0], 1'b1};
+  wire path_end_eol = |(path_first & path_eol);
+
+  always_comb begin
+    scan_in_accept = in_accept;
+    scan_gzip = accept_gzip;
+    scan_blank = 0;
+    scan_http11 = http11;
+    scan_in_conn = in_conn;
+    scan_close = conn_close;
+    for (int j = 0; j < 4; j = j + 1) begin
+      if (scan_in_accept && gzip_end[j]) scan_gzip = 1;
+      if (scan_in_conn && close_end[j]) scan_close = 1;
+      if (header_nl[j]) begin
+        scan_in_accept = 0;
+        scan_in_conn = 0;
+      end
+      if (accept_end[j]) scan_in_accept = 1;
+      if (conn_end[j]) scan_in_conn = 1;
+      if (version_end[j]) scan_http11 = 1;
+      if (blank_end[j]) scan_blank = 1;
+    end
+  end
+
+  // h1 and h2 mix the fingerprint with their own seed, one round per cycle
+  wire [31:0] fingerprint = ~crc;
+  reg [31:0] mix_h1, mix_h2;
+  wire [HTTP_SLOT_BITS-1:0] disp;
+  reg lookup_start, lookup_done;
+  reg [6:0] lookup_stage;
+  wire lookup_ready = lookup_done || lookup_stage[6];
+
+  wire [31:0] content_key;
+  wire [18:0] content_addr, content_gzip_addr;
+  wire [15:0] content_size, content_gzip_size;
+  wire [9:0] content_seg, content_gzip_seg;
+  wire [3:0] content_tag;
+  wire lookup_hit = content_tag == key_tag;
+
+  // an entry read from the index replaces the cached one in INDEX_FILL
+  reg [31:0] index_entry[INDEX_WORDS];
+  reg [2:0] index_word;
+  wire from_index = state == INDEX_FILL;
+  wire [31:0] entry_key = from_index ? index_entry[2] : content_key;
+  wire [18:0] entry_addr = from_index ? index_entry[0][18:0] : content_addr;
+  wire [15:0] entry_size = from_index ? index_entry[1][15:0] : content_size;
+  wire [9:0] entry_seg = from_index ? index_entry[0][28:19] : content_seg;
+  wire [18:0] entry_gzip_addr = from_index ? index_entry[3][18:0] : content_gzip_addr;
+  wire [15:0] entry_gzip_size = from_index ? index_entry[4][15:0] : content_gzip_size;
+  wire [9:0] entry_gzip_seg = from_index ? index_entry[3][28:19] : content_gzip_seg;
+  always_ff @(posedge clk) begin
+    lookup_stage <= {lookup_stage[5:0], lookup_start};
+    if (lookup_start) begin
+      mix_h1 <= (fingerprint ^ seeds[0]) + ((fingerprint ^ seeds[0]) << 6);
+      mix_h2 <= (fingerprint ^ seeds[1]) + ((fingerprint ^ seeds[1]) << 6);
+    end
+    if (lookup_stage[0]) begin
+      mix_h1 <= (mix_h1 ^ (mix_h1 >> 11)) + ((mix_h1 ^ (mix_h1 >> 11)) << 3);
+      mix_h2 <= (mix_h2 ^ (mix_h2 >> 11)) + ((mix_h2 ^ (mix_h2 >> 11)) << 3);
+    end
+    if (lookup_stage[1]) begin
+      mix_h1 <= (mix_h1 ^ (mix_h1 >> 15)) + ((mix_h1 ^ (mix_h1 >> 15)) << 10);
+      mix_h2 <= (mix_h2 ^ (mix_h2 >> 15)) + ((mix_h2 ^ (mix_h2 >> 15)) << 10);
+    end
+    // lookup_stage[2]: displacement read, [4]: slot read, [5]: entry output
+    if (lookup_stage[3]) key <= mix_h2[31-:HTTP_SLOT_BITS] ^ disp;
+  end
+
   always_ff @(posedge clk) begin
     if (rst) begin
       state <= IDLE;
@@ -46,16 +242,54 @@ module http_decode #(
       res_valid <= 0;
       res_err <= 0;
       payload_rd_en <= 0;
+      lookup_start <= 0;
+      lookup_done <= 0;
+      index_rd_en <= 0;
     end else begin
       state <= next_state;
       working <= i_payload_valid ? i_payload_data : working;
+      working_valid <= i_payload_valid;
       method_counter <= state != METHOD ? 0 : method_counter + 'd1;
+      lookup_start <= 0;
+      lookup_done <= state == IDLE ? 0 : lookup_ready;
 
-      // For now we only support ascii [0-7] and [a-z|A-Z]
-      // working contains {X,X,0,\}: X = dont-care
-      // -48: convert to ascii
-      // +1: 0 index is 404
-      if (state == TARGET) key <= {1'b0, working[15:8]} - 'd47;
+      case (state)
+        IDLE: begin
+          // round up to whole words
+          if (tcp_payload_valid) payload_words <= (tcp_payload_size + 3) >> 2;
+        end
+        METHOD: begin
+          crc <= '1;
+          word_idx <= 1;
+          path_words <= '0;
+          path_overflow <= 0;
+          header_hist <= '0;
+          in_accept <= 0;
+          accept_gzip <= 0;
+          http11 <= 0;
+          in_conn <= 0;
+          conn_close <= 0;
+        end
+        PATH, HEADERS: begin
+          if (working_valid) begin
+            word_idx <= word_idx + 1;
+            header_hist <= header_seq[159:32];
+            in_accept <= scan_in_accept;
+            accept_gzip <= scan_gzip;
+            http11 <= scan_http11;
+            in_conn <= scan_in_conn;
+            conn_close <= scan_close;
+          end
+          if (state == PATH && working_valid) begin
+            crc <= crc_chain[4];
+            path_words <= path_words + 1;
+            path_overflow <= !(|path_term) && path_words == MAX_PATH_WORDS - 1 && !last_word;
+            lookup_start <= |path_term || path_words == MAX_PATH_WORDS - 1 || last_word;
+          end
+        end
+        default: begin
+        end
+      endcase
 
       case (state)
         IDLE: begin
@@ -66,13 +300,36 @@ module http_decode #(
         METHOD: begin
           payload_rd_en <= 1;
         end
-        TARGET, GET_PAYLOAD: begin
+        PATH, HEADERS, GET_PAYLOAD: begin
           payload_rd_en <= 1;
         end
-        WAIT_CAM2: begin
-          res_valid <= 1'b1;
-          res_err <= res_payload_size == '0;
+        WAIT_LOOKUP, INDEX_FILL: begin
           payload_rd_en <= 0;
+          index_word <= 0;
+          index_rd_ad <= seeds[2][18:0] + 19'(key << 3);
+          index_rd_en <= state == WAIT_LOOKUP && lookup_ready && !lookup_hit;
+          if ((lookup_ready && lookup_hit) || from_index) begin
+            res_valid <= 1'b1;
+            res_err <= entry_size == '0 || entry_key != fingerprint || path_overflow;
+            res_close <= !http11 || conn_close;
+            if (accept_gzip && entry_gzip_size != '0) begin
+              res_payload_addr <= entry_gzip_addr;
+              res_payload_size <= entry_gzip_size;
+              res_payload_seg  <= entry_gzip_seg;
+            end else begin
+              res_payload_addr <= entry_addr;
+              res_payload_size <= entry_size;
+              res_payload_seg  <= entry_seg;
+            end
+          end
+        end
+        INDEX_READ: begin
+          if (index_rd_valid) begin
+            index_entry[index_word] <= index_rd_data;
+            index_word <= index_word + 1;
+            index_rd_ad <= index_rd_ad + 1;
+            if (index_word == INDEX_WORDS - 1) index_rd_en <= 0;
+          end
         end
         ABORT: begin
           res_valid <= 1'b0;
@@ -95,33 +352,66 @@ module http_decode #(
       GET_PAYLOAD: if (i_payload_valid) next_state = METHOD;
       METHOD: begin
         // LSB order
-        if (" TEG" == working) next_state = TARGET;
+        if (" TEG" == working) next_state = PATH;
         else next_state = ABORT;
       end
-      TARGET: begin
-        // take only the first byte as target endpoint
-        next_state = MATCH;
-      end
-      MATCH: begin
-        next_state = WAIT_CAM1;
-      end
-      WAIT_CAM1: next_state = WAIT_CAM2;
-      WAIT_CAM2: begin
-        next_state = IDLE;
+      PATH: begin
+        if (working_valid) begin
+          // "GET <TARGET>\r\n" has no headers
+          if (path_end_eol || last_word || path_words == MAX_PATH_WORDS - 1 || scan_blank)
+            next_state = WAIT_LOOKUP;
+          else if (|path_term) next_state = HEADERS;
+        end
       end
+      HEADERS: if (working_valid && (scan_blank || last_word)) next_state = WAIT_LOOKUP;
+      WAIT_LOOKUP: if (lookup_ready) next_state = lookup_hit ? IDLE : INDEX_READ;
+      INDEX_READ: if (index_rd_valid && index_word == INDEX_WORDS - 1) next_state = INDEX_FILL;
+      INDEX_FILL: next_state = IDLE;
       ABORT: if (!tcp_payload_valid) next_state = IDLE;
       default: next_state = IDLE;
     endcase
   end
 
+  // 2^BUCKET_BITS displacements of HTTP_SLOT_BITS, indexed by h1
+  ram_sp #(
+      .DATA_WIDTH(HTTP_SLOT_BITS),
+      .ADDR_WIDTH(BUCKET_BITS),
+      .INIT(HTTP_DISP_FILE),
+      .INIT_PLUSARG("HTTP_DISP_FILE")
+  ) route_disp (
+      .clk (clk),
+      .we  ('0),
+      .addr(mix_h1[31-:BUCKET_BITS]),
+      .di  ('0),
+      .dout(disp)
+  );
+
   http_entry #(
       .HTTP_ADDR_FILE(HTTP_ADDR_FILE),
-      .HTTP_SIZE_FILE(HTTP_SIZE_FILE)
+      .HTTP_SIZE_FILE(HTTP_SIZE_FILE),
+      .HTTP_KEY_FILE(HTTP_KEY_FILE),
+      .HTTP_GZIP_ADDR_FILE(HTTP_GZIP_ADDR_FILE),
+      .HTTP_GZIP_SIZE_FILE(HTTP_GZIP_SIZE_FILE),
+      .HTTP_SEG_FILE(HTTP_SEG_FILE)
   ) cam (
       .clk(clk),
-      .key(key),
-      .content_addr(res_payload_addr),
-      .content_size(res_payload_size),
-      .content_checksum()
+      .key(key[8:0]),
+      .fill_en(from_index),
+      .fill_addr(36'(index_entry[0])),
+      .fill_size(36'(index_entry[1])),
+      .fill_key({key_tag, index_entry[2]}),
+      .fill_gzip_addr(36'(index_entry[3])),
+      .fill_gzip_size(36'(index_entry[4])),
+      .seg_rd_idx(seg_rd_idx),
+      .seg_checksum(seg_checksum),
+      .content_addr(content_addr),
+      .content_size(content_size),
+      .content_checksum(),
+      .content_key(content_key),
+      .content_tag(content_tag),
+      .content_gzip_addr(content_gzip_addr),
+      .content_gzip_size(content_gzip_size),
+      .content_seg(content_seg),
+      .content_gzip_seg(content_gzip_seg)
   );
 endmodule
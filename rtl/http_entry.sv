@@ -1,43 +1,134 @@
 module http_entry #(
     parameter HTTP_ADDR_FILE = "",
-    parameter HTTP_SIZE_FILE = ""
+    parameter HTTP_SIZE_FILE = "",
+    parameter HTTP_KEY_FILE = "",
+    // gzip variant of the page in the same slot, size 0 if there is none
+    parameter HTTP_GZIP_ADDR_FILE = "",
+    parameter HTTP_GZIP_SIZE_FILE = "",
+    // ones complement sum of every 1440 byte payload segment
+    parameter HTTP_SEG_FILE = ""
 ) (
     input clk,
     input [8:0] key,
+    // replaces the entry at key, from the index in SDRAM
+    input fill_en,
+    input [35:0] fill_addr,
+    input [35:0] fill_size,
+    input [35:0] fill_key,
+    input [35:0] fill_gzip_addr,
+    input [35:0] fill_gzip_size,
+    // separate port for tcb_serializer, 1 cycle latency
+    input [9:0] seg_rd_idx,
+    output [15:0] seg_checksum,
 
     output reg [18:0] content_addr,
     output reg [15:0] content_size,
-    output reg [15:0] content_checksum
+    output reg [15:0] content_checksum,
+    // fingerprint of the path the slot was built for
+    output reg [31:0] content_key,
+    // slot bits above the 9 bit key of the entry held
+    output reg [3:0] content_tag,
+    output reg [18:0] content_gzip_addr,
+    output reg [15:0] content_gzip_size,
+    // index of the first segment checksum of the page
+    output reg [9:0] content_seg,
+    output reg [9:0] content_gzip_seg
 );
   // 512 entries of 18 bit data, each is an address to SDRAM
-  (*keep*) reg [35:0] cam_content_addr, cam_content_meta;
+  (*keep*) reg [35:0] cam_content_addr, cam_content_meta, cam_content_key;
+  (*keep*) reg [35:0] cam_gzip_addr, cam_gzip_meta;
   always @(posedge clk) begin
     content_addr <= cam_content_addr[18:0];
     content_size <= cam_content_meta[15:0];
     content_checksum <= 0;
+    content_key <= cam_content_key[31:0];
+    content_tag <= cam_content_key[35:32];
+    content_gzip_addr <= cam_gzip_addr[18:0];
+    content_gzip_size <= cam_gzip_meta[15:0];
+    content_seg <= cam_content_addr[28:19];
+    content_gzip_seg <= cam_gzip_addr[28:19];
   end
   ram_sp #(
       .DATA_WIDTH(36),
       .ADDR_WIDTH(9),
-      .INIT(HTTP_ADDR_FILE)
+      .INIT(HTTP_ADDR_FILE),
+      .INIT_PLUSARG("HTTP_ADDR_FILE")
   ) cam_addr (
       .clk (clk),
-      .we  ('0),
+      .we  (fill_en),
       .addr(key),
-      .di  ('0),
+      .di  (fill_addr),
       .dout(cam_content_addr)
   );
   // 512 entries to payload size in bytes
   ram_sp #(
       .DATA_WIDTH(36),
       .ADDR_WIDTH(9),
-      .INIT(HTTP_SIZE_FILE)
+      .INIT(HTTP_SIZE_FILE),
+      .INIT_PLUSARG("HTTP_SIZE_FILE")
   ) cam_size (
       .clk (clk),
-      .we  ('0),
+      .we  (fill_en),
       .addr(key),
-      .di  ('0),
+      .di  (fill_size),
       .dout(cam_content_meta)
   );
+  // 512 entries of path fingerprints, a lookup only hits if they match. The
+  // upper 4 bits are the tag of the slot.
+  ram_sp #(
+      .DATA_WIDTH(36),
+      .ADDR_WIDTH(9),
+      .INIT(HTTP_KEY_FILE),
+      .INIT_PLUSARG("HTTP_KEY_FILE")
+  ) cam_key (
+      .clk (clk),
+      .we  (fill_en),
+      .addr(key),
+      .di  (fill_key),
+      .dout(cam_content_key)
+  );
+
+  ram_sp #(
+      .DATA_WIDTH(36),
+      .ADDR_WIDTH(9),
+      .INIT(HTTP_GZIP_ADDR_FILE),
+      .INIT_PLUSARG("HTTP_GZIP_ADDR_FILE")
+  ) cam_gzip_addr_ram (
+      .clk (clk),
+      .we  (fill_en),
+      .addr(key),
+      .di  (fill_gzip_addr),
+      .dout(cam_gzip_addr)
+  );
+  ram_sp #(
+      .DATA_WIDTH(36),
+      .ADDR_WIDTH(9),
+      .INIT(HTTP_GZIP_SIZE_FILE),
+      .INIT_PLUSARG("HTTP_GZIP_SIZE_FILE")
+  ) cam_gzip_size_ram (
+      .clk (clk),
+      .we  (fill_en),
+      .addr(key),
+      .di  (fill_gzip_size),
+      .dout(cam_gzip_meta)
+  );
+
+  // 1024 entries of segment checksums, the upper bits of the addr entries
+  // point at the first one of each page. This bounds the content to 1024
+  // segments of 1440 bytes, the route index in SDRAM does not lift it.
+  wire [17:0] seg_meta;
+  assign seg_checksum = seg_meta[15:0];
+  ram_sp #(
+      .DATA_WIDTH(18),
+      .ADDR_WIDTH(10),
+      .INIT(HTTP_SEG_FILE),
+      .INIT_PLUSARG("HTTP_SEG_FILE")
+  ) cam_seg (
+      .clk (clk),
+      .we  ('0),
+      .addr(seg_rd_idx),
+      .di  ('0),
+      .dout(seg_meta)
+  );
 
 endmodule
@@ -3,7 +3,16 @@
 
 module mac #(
     parameter HTTP_ADDR_FILE = "",
-    parameter HTTP_SIZE_FILE = ""
+    parameter HTTP_SIZE_FILE = "",
+    parameter HTTP_KEY_FILE = "",
+    parameter HTTP_SEED_FILE = "",
+    parameter HTTP_DISP_FILE = "",
+    parameter HTTP_GZIP_ADDR_FILE = "",
+    parameter HTTP_GZIP_SIZE_FILE = "",
+    parameter HTTP_SEG_FILE = "",
+    // addrs.mem and lengths.mem words of the 404 page
+    parameter HTTP_404_FILE = "",
+    parameter HTTP_SLOT_BITS = 9
 ) (
     input wire clk,
     // for TXC
@@ -85,7 +94,21 @@ module mac #(
   assign tcp_buff_rd_en = tcp_echo_en ? tcp_tx_payload_rd_en : http_req_payload;
   wire [31:0] tcp_tx_payload_rd_data;
   assign tcp_tx_payload_rd_data  = tcp_echo_en ? tcp_buff_rd_data : mem_ctrl_rd_data;
-  assign tcp_tx_payload_rd_valid = tcp_echo_en ? tcp_buff_rd_valid : mem_ctrl_rd_valid;
+
+  // http_decode reads route slots missing from http_entry over the same
+  // SDRAM port. Either side holds its request until it has all its words,
+  // the port only changes hands in between.
+  logic index_rd_en, index_rd_sel = 0;
+  logic [18:0] index_rd_ad, tcp_tx_payload_rd_ad;
+  logic [15:0] tcp_tx_payload_rd_size;
+  assign tcp_tx_payload_rd_valid = tcp_echo_en ? tcp_buff_rd_valid : mem_ctrl_rd_valid && !index_rd_sel;
+  always @(posedge clk) begin
+    if (index_rd_sel ? !index_rd_en : !(tcp_tx_payload_rd_en && !tcp_echo_en))
+      index_rd_sel <= index_rd_en;
+  end
+  assign mem_ctrl_rd_ad   = index_rd_sel ? index_rd_ad : tcp_tx_payload_rd_ad;
+  // index reads do not take a size, sdram_ctrl ignores it
+  assign mem_ctrl_rd_size = tcp_tx_payload_rd_size;
 
   reg [7:0] tcp_decode_payload;
   reg tcp_decode_payload_valid;
@@ -107,7 +130,7 @@ module mac #(
       .rd_data(tcp_buff_rd_data)
   );
 
-  assign mem_ctrl_rd_req = tcp_tx_payload_rd_en && !tcp_echo_en;
+  assign mem_ctrl_rd_req = index_rd_sel ? index_rd_en : tcp_tx_payload_rd_en && !tcp_echo_en;
 
   reg send_arp, send_tcp;
   tcp::packet_t tcp_tx_packet_pending;
@@ -189,6 +212,7 @@ module mac #(
   tcp::packet_t packet;
   assign packet.payload_addr = '0;
   assign packet.window = '0;
+  assign packet.checksum = '0;
   reg tcp_decode_done, tcp_decode_err;
   reg [15:0] tcp_decode_peer_port;
   reg [31:0] tcp_decode_sequence_num, tcp_decode_ack_num;
@@ -273,8 +297,13 @@ module mac #(
   );
 
   reg tcp_arb_rdy, tcp_payload_valid, tcp_payload_err;
+  reg [15:0] tcp_payload_size;
   reg [18:0] to_send_payload_addr;
   reg [15:0] to_send_payload_size;
+  reg [9:0] to_send_payload_seg;
+  reg to_send_close;
+  reg [9:0] seg_rd_idx;
+  reg [15:0] seg_checksum;
   reg [31:0] to_send_peer_addr;
   reg [15:0] to_send_peer_port;
   reg arb_upper_granted;
@@ -287,11 +316,15 @@ module mac #(
       .rdy(tcp_arb_rdy),
       // TODO: provide as parameter
       .tcp_echo_en(tcp_echo_en),
+      .seg_rd_idx(seg_rd_idx),
+      .seg_checksum(seg_checksum),
 
       .is_tx(outgoing_tcp),
       .upper_granted(arb_upper_granted),
       .i_to_send_payload_addr(to_send_payload_addr),
       .i_to_send_payload_size(to_send_payload_size),
+      .i_to_send_payload_seg(to_send_payload_seg),
+      .i_to_send_close(to_send_close),
       .to_send_peer_addr(to_send_peer_addr),
       .to_send_peer_port(to_send_peer_port),
 
@@ -301,6 +334,7 @@ module mac #(
       .tcp_payload_err(tcp_payload_err),
       .tcp_payload_peer_addr(),
       .tcp_payload_peer_port(),
+      .tcp_payload_size(tcp_payload_size),
       .send_tcp(send_tcp),
       .o_pkt_to_send(tcp_tx_packet_pending),
       .o_state(arb_state),
@@ -447,9 +481,28 @@ module mac #(
   // Checks for HTTP decode OK, waits for SM approval, fire off outgoing_tcp.
   // SM responds a few cycles after HTTP decode validates.
   reg http_state = 0;
-  reg http_res_valid, http_res_err, http_req_payload;
+  reg http_res_valid, http_res_err, http_res_close, http_req_payload;
   reg [18:0] http_payload_addr;
   reg [15:0] http_payload_size;
+  reg [9:0] http_payload_seg;
+
+  reg [35:0] notfound[2];
+`ifdef SYNTHESIS
+  if (HTTP_404_FILE != "") initial $readmemh(HTTP_404_FILE, notfound);
+  else initial begin
+    notfound[0] = '0;
+    notfound[1] = '0;
+  end
+`else
+  initial begin
+    string notfound_file = HTTP_404_FILE;
+    void'($value$plusargs("HTTP_404_FILE=%s", notfound_file));
+    notfound[0] = '0;
+    notfound[1] = '0;
+    if (notfound_file != "") $readmemh(notfound_file, notfound);
+  end
+`endif
+
   always @(posedge clk) begin
     if (rst) begin
       outgoing_tcp <= 0;
@@ -459,10 +512,12 @@ module mac #(
         0: begin
           outgoing_tcp <= 1'b0;
           if (http_res_valid) begin
-            // an error in http decoding always sends the 404 page hard coded at
-            // endpoint 0.
-            to_send_payload_addr <= http_res_err ? 0 : http_payload_addr;
-            to_send_payload_size <= http_res_err ? 'h294 : http_payload_size;
+            // an error in http decoding always sends the 404 page, placed by
+            // content_gen.py as given in HTTP_404_FILE
+            to_send_payload_addr <= http_res_err ? notfound[0][18:0] : http_payload_addr;
+            to_send_payload_size <= http_res_err ? notfound[1][15:0] : http_payload_size;
+            to_send_payload_seg <= http_res_err ? notfound[0][28:19] : http_payload_seg;
+            to_send_close <= http_res_close;
             outgoing_tcp <= 1;
             http_state <= 1;
           end
@@ -482,12 +537,20 @@ module mac #(
 
   http_decode #(
       .HTTP_ADDR_FILE(HTTP_ADDR_FILE),
-      .HTTP_SIZE_FILE(HTTP_SIZE_FILE)
+      .HTTP_SIZE_FILE(HTTP_SIZE_FILE),
+      .HTTP_KEY_FILE(HTTP_KEY_FILE),
+      .HTTP_SEED_FILE(HTTP_SEED_FILE),
+      .HTTP_DISP_FILE(HTTP_DISP_FILE),
+      .HTTP_GZIP_ADDR_FILE(HTTP_GZIP_ADDR_FILE),
+      .HTTP_GZIP_SIZE_FILE(HTTP_GZIP_SIZE_FILE),
+      .HTTP_SEG_FILE(HTTP_SEG_FILE),
+      .HTTP_SLOT_BITS(HTTP_SLOT_BITS)
   ) http_dec (
       // FIXME: decode payload is off from phy_rxc
       .clk(clk),
       .rst(rst),
       .tcp_payload_valid(tcp_payload_valid && !tcp_payload_err),
+      .tcp_payload_size(tcp_payload_size),
       .i_payload_valid(tcp_buff_rd_valid),
       .i_payload_data(tcp_buff_rd_data),
       .payload_rd_en(http_req_payload),
@@ -495,7 +558,15 @@ module mac #(
       .res_valid(http_res_valid),
       .res_err(http_res_err),
       .res_payload_size(http_payload_size),
-      .res_payload_addr(http_payload_addr)
+      .res_payload_addr(http_payload_addr),
+      .res_payload_seg(http_payload_seg),
+      .res_close(http_res_close),
+      .seg_rd_idx(seg_rd_idx),
+      .seg_checksum(seg_checksum),
+      .index_rd_en(index_rd_en),
+      .index_rd_ad(index_rd_ad),
+      .index_rd_valid(mem_ctrl_rd_valid && index_rd_sel),
+      .index_rd_data(mem_ctrl_rd_data)
   );
 
   mac_tx #(
@@ -517,8 +588,8 @@ module mac #(
       .tcp_payload_rd_valid(tcp_tx_payload_rd_valid),
       .tcp_payload_rd_data(tcp_tx_payload_rd_data),
       .tcp_payload_rd_en(tcp_tx_payload_rd_en),
-      .tcp_payload_rd_ad(mem_ctrl_rd_ad),
-      .tcp_payload_rd_size(mem_ctrl_rd_size),
+      .tcp_payload_rd_ad(tcp_tx_payload_rd_ad),
+      .tcp_payload_rd_size(tcp_tx_payload_rd_size),
 
       .o_misc(misc_state),
       .o_payload_buff_state(payload_buff_state),
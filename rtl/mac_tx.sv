@@ -44,6 +44,7 @@ module mac_tx #(
   reg pkt_rd_en = 0, pkt_rd_en_q1 = 0;
   reg [18:0] pkt_payload_addr = 0;
   reg [15:0] pkt_payload_size = 0;
+  reg [15:0] pkt_payload_checksum = 0;
 
   reg ip_encode_en, ip_encode_done;
   reg [31:0] ip_encode_sa = MY_IP_ADDR;
@@ -70,6 +71,7 @@ module mac_tx #(
     if (pkt_rd_falling) begin
       pkt_payload_addr <= pkt.payload_addr;
       pkt_payload_size <= pkt.payload_size;
+      pkt_payload_checksum <= pkt.checksum;
       ip_encode_da <= pkt.peer_addr;
       tcp_encode_dest_port <= pkt.peer_port;
       tcp_encode_sequence_num <= pkt.sequence_num;
@@ -89,7 +91,7 @@ module mac_tx #(
     send_tcp_q <= send_tcp;
   end
   fifo #(
-      .DATA_WIDTH(171),
+      .DATA_WIDTH($bits(tcp::packet_t)),
       .DEPTH(64)
   ) outgoing_pkt_queue (
       .clk  (clk),
@@ -104,12 +106,11 @@ module mac_tx #(
       .count()
   );
 
-  reg [15:0] tcp_payload_checksum;
   reg [7:0] tcp_outgoing_rd_data;
   reg tcp_outgoing_wr_en;
   reg [10:0] tcp_outgoing_wr_ptr;
   reg [31:0] tcp_outgoing_wr_data;
-  reg tcp_outgoing_rdy;
+  reg tcp_outgoing_head, tcp_outgoing_rdy;
   mac_tx_buff mac_tx_buff_ (
       .clk(clk),
       .rst(rst),
@@ -121,7 +122,7 @@ module mac_tx #(
       .tcp_payload_rd_en(tcp_payload_rd_en),
       .tcp_payload_rd_ad(tcp_payload_rd_ad),
       .tcp_payload_rd_size(tcp_payload_rd_size),
-      .tcp_payload_checksum(tcp_payload_checksum),
+      .tcp_outgoing_head(tcp_outgoing_head),
       .tcp_outgoing_rdy(tcp_outgoing_rdy),
       .tcp_outgoing_wr_en(tcp_outgoing_wr_en),
       .tcp_outgoing_wr_ptr(tcp_outgoing_wr_ptr),
@@ -210,7 +211,9 @@ module mac_tx #(
       .i_ack_num(tcp_encode_ack_num),
       .i_flags(tcp_encode_flags),
       .i_window(tcp_encode_window),
-      .initial_checksum(tcp_echo_en ? tcp_echo_checksum : tcp_payload_checksum),
+      // the payload sum comes with the packet so the headers do not wait for
+      // the whole payload to be buffered
+      .initial_checksum(tcp_echo_en ? tcp_echo_checksum : pkt_payload_checksum),
       // ebr has 1 cycle read latency so "pre_done_1" is required to meet
       // timing and ensure payload from ebr is ready
       .pre_done_3(tcp_encode_done_pre_3),
@@ -250,7 +253,9 @@ module mac_tx #(
         end
         PAYLOAD_LOADING: begin
           pkt_rd_en <= 0;
-          if (tcp_outgoing_rdy) begin
+          // sdram_ctrl takes about 16 cycles a word and the headers take over
+          // 60, the last few words land before the reader gets to them.
+          if (tcp_outgoing_head || tcp_outgoing_rdy) begin
             tx_state <= IP_PKT_WAIT;
             mac_encode_en <= 1;
           end
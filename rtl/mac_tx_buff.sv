@@ -1,6 +1,9 @@
 `default_nettype none
 
-module mac_tx_buff (
+module mac_tx_buff #(
+    // words still to come from SDRAM when tcp_outgoing_head pulses
+    parameter int TAIL_WORDS = 3
+) (
     input wire clk,
     input wire rst,
     input wire tcp_outgoing_buffer_start,
@@ -10,7 +13,6 @@ module mac_tx_buff (
     input wire [31:0] tcp_payload_rd_data,
 
     output reg tcp_payload_rd_en,
-    output reg [15:0] tcp_payload_checksum,
     output reg [18:0] tcp_payload_rd_ad,
     output reg [15:0] tcp_payload_rd_size,
 
@@ -18,6 +20,8 @@ module mac_tx_buff (
     output reg tcp_outgoing_wr_en = 0,
     output reg [10:0] tcp_outgoing_wr_ptr = 0,
     output reg [31:0] tcp_outgoing_wr_data = 0,
+    // pulses when only TAIL_WORDS words of the payload are left to read
+    output reg tcp_outgoing_head = 0,
     output reg tcp_outgoing_rdy = 0
 );
   reg [15:0] payload_counter = '0;
@@ -56,6 +60,7 @@ module mac_tx_buff (
       tcp_payload_rd_en <= '0;
       tcp_outgoing_wr_en <= '0;
       tcp_outgoing_wr_ptr <= '0;
+      tcp_outgoing_head <= 0;
       tcp_outgoing_rdy <= 0;
       payload_buff_state <= BUFF_STATE_IDLE;
     end else
@@ -64,6 +69,7 @@ module mac_tx_buff (
           tcp_payload_rd_en <= '0;
           tcp_outgoing_wr_en <= '0;
           tcp_outgoing_wr_ptr <= '0;
+          tcp_outgoing_head <= 0;
           tcp_outgoing_rdy <= 0;
           payload_counter <= 0;
           tcp_payload_rd_ad <= i_pkt_payload_addr;
@@ -77,6 +83,7 @@ module mac_tx_buff (
         BUFF_STATE_START: begin
           tcp_payload_rd_en  <= payload_counter != payload_size;
           tcp_outgoing_wr_en <= tcp_payload_rd_valid;
+          tcp_outgoing_head <= tcp_payload_rd_valid && payload_counter + TAIL_WORDS + 1 == payload_size;
           if (tcp_payload_rd_valid) begin
             tcp_payload_rd_ad <= tcp_payload_rd_ad + 1;
             tcp_outgoing_wr_ptr <= tcp_outgoing_wr_ptr + 1;
@@ -85,6 +92,7 @@ module mac_tx_buff (
           if (payload_counter == payload_size) payload_buff_state <= BUFF_STATE_MOVE_TO_LOCAL;
         end
         BUFF_STATE_MOVE_TO_LOCAL: begin
+          tcp_outgoing_head <= 0;
           tcp_outgoing_wr_en <= 1'b0;
           tcp_outgoing_rdy   <= 1;
           payload_buff_state <= BUFF_STATE_IDLE;
@@ -95,28 +103,6 @@ module mac_tx_buff (
       endcase
   end
 
-  reg [15:0] checksum_stage1 = '0;
-  reg checksum_stage_valid;
-  always @(posedge clk) begin
-    checksum_stage_valid <= tcp_outgoing_wr_en;
-    if (tcp_outgoing_wr_en) begin
-      // wr_data is in LE order not network transmit order
-      checksum_stage1 <= utils::ones_comp(
-          {
-            tcp_outgoing_wr_data[7:0], tcp_outgoing_wr_data[15:8]
-          },
-          {
-            tcp_outgoing_wr_data[23:16], tcp_outgoing_wr_data[31:24]
-          }
-      );
-    end else if (tcp_outgoing_buffer_start) checksum_stage1 <= '0;
-  end
-  always @(posedge clk) begin
-    if (checksum_stage_valid) begin
-      tcp_payload_checksum <= utils::ones_comp(checksum_stage1[15:0], tcp_payload_checksum);
-    end else if (tcp_outgoing_buffer_start) tcp_payload_checksum <= '0;
-  end
-
 `ifdef FORMAL
   reg f_past_valid;
   initial f_past_valid = 1'b0;
@@ -125,6 +111,7 @@ module mac_tx_buff (
     // outgoing rdy is a single pulse
     if (f_past_valid) begin
       assert (tcp_outgoing_rdy == 0 || !$stable(tcp_outgoing_rdy));
+      assert (tcp_outgoing_head == 0 || !$stable(tcp_outgoing_head));
       assert (payload_buff_state <= BUFF_STATE_DONE);
       assert (payload_counter == tcp_outgoing_wr_ptr);
       assert (tcp_outgoing_wr_ptr <= i_pkt_payload_size);
@@ -1,7 +1,8 @@
 module ram_sp #(
     parameter int DATA_WIDTH = 1,
     parameter int ADDR_WIDTH = 1,
-    parameter INIT = ""
+    parameter INIT = "",
+    parameter INIT_PLUSARG = ""
 ) (
     input clk,
     we,
@@ -22,7 +23,16 @@ module ram_sp #(
 
   (* ram_style = "block" *) reg [DATA_WIDTH-1:0] mem[SIZE];
 
+`ifdef SYNTHESIS
   if (INIT != "") initial $readmemh(INIT, mem);
+`else
+  // +<INIT_PLUSARG>=<file> swaps the contents without rebuilding the model
+  initial begin
+    string init_file = INIT;
+    if (INIT_PLUSARG != "") void'($value$plusargs({INIT_PLUSARG, "=%s"}, init_file));
+    if (init_file != "") $readmemh(init_file, mem);
+  end
+`endif
 
   always @(posedge clk) begin
     if (we) mem[addr] <= di;
@@ -44,11 +44,12 @@ module sdram_ctrl #(
 `else
   localparam int POWER_UP_DELAY = 200_000 / CYCLE_TIME_NS;
 `endif
-  // auto refresh can be performed once in 15.6us
+  // auto refresh can be performed once in 15.6us, leave room for a request
+  // in progress when it falls due
 `ifdef FORMAL
   localparam shortint REFRESH_CYCLE = 160 / CYCLE_TIME_NS;
 `else
-  localparam shortint REFRESH_CYCLE = (16000 + CYCLE_TIME_NS - 1) / CYCLE_TIME_NS;
+  localparam shortint REFRESH_CYCLE = 15000 / CYCLE_TIME_NS;
 `endif
   // t_rfc (55ns)
   localparam int ROW_CYCLE_TIME = (60 + CYCLE_TIME_NS - 1) / CYCLE_TIME_NS;
@@ -64,7 +65,8 @@ module sdram_ctrl #(
   assign sdram_clk = clk;
 
   reg sdram_dq_oe = 0;
-  assign sdram_dq = sdram_dq_oe ? wr_data : 32'hzzzzzzzz;
+  reg [31:0] wd = '0;
+  assign sdram_dq = sdram_dq_oe ? wd : 32'hzzzzzzzz;
 
   typedef enum {
     BOOT,
@@ -116,7 +118,8 @@ module sdram_ctrl #(
         else if (refresh_pending || wr_req == 'b1 || rd_req == 'b1) next_state = PRECHARGE;
       end
       PRECHARGE: begin
-        if (cycle_counter < PRECHARGE_MIN) next_state = PRECHARGE;
+        // on the first cycle cycle_counter still counts the previous state
+        if (cycle_counter < PRECHARGE_MIN || state != prev_state) next_state = PRECHARGE;
         else if (refresh_pending) next_state = AUTOREFRESH_START;
         else if (wr_req == 'b1 || rd_req == 'b1) next_state = GRANT;
       end
@@ -184,7 +187,7 @@ module sdram_ctrl #(
           sdram_cas_n <= 1;
           sdram_we_n  <= 1;
         end
-        NOOP, AUTOREFRESH_WAIT: begin
+        NOOP, AUTOREFRESH_WAIT, AUTOREFRESH_DONE: begin
           sdram_ras_n <= 1;
           sdram_cas_n <= 1;
           sdram_we_n <= 1;
@@ -197,6 +200,7 @@ module sdram_ctrl #(
           op <= wr_req;
           ra <= wr_req ? wr_ad[18:8] : rd_ad[18:8];
           ca <= wr_req ? wr_ad[7:0] : rd_ad[7:0];
+          wd <= wr_data;
           wr_granted <= wr_req;
           rd_granted <= ~wr_req;
           rd_valid <= '0;
@@ -214,11 +218,6 @@ module sdram_ctrl #(
           sdram_cas_n <= 1'b0;
           sdram_we_n  <= 1'b1;
         end
-        AUTOREFRESH_DONE: begin
-          sdram_ras_n <= 1'b0;
-          sdram_cas_n <= 1'b0;
-          sdram_we_n  <= 1'b1;
-        end
         ACTIVATE: begin
           sdram_ras_n <= 1'b0;
           sdram_cas_n <= 1'b1;
@@ -1,7 +1,8 @@
 `default_nettype none
 
 module sdram_dummy #(
-    parameter INIT = ""
+    parameter INIT = "",
+    parameter INIT_PLUSARG = ""
 ) (
     input wire clk,
     input wire rst,
@@ -62,7 +63,12 @@ module sdram_dummy #(
   end
 `else
   reg [31:0] mem[270000];
-  if (INIT != "") initial $readmemh(INIT, mem);
+  // +<INIT_PLUSARG>=<file> swaps the contents without rebuilding the model
+  initial begin
+    string init_file = INIT;
+    if (INIT_PLUSARG != "") void'($value$plusargs({INIT_PLUSARG, "=%s"}, init_file));
+    if (init_file != "") $readmemh(init_file, mem);
+  end
 
   reg [1:0] state = 0;
   always @(posedge clk) begin
@@ -10,6 +10,9 @@ module tcb #(
     input wire to_send_wr_en,
     input wire [18:0] upper_to_send_payload_addr,
     input wire [15:0] upper_to_send_payload_size,
+    input wire [15:0] upper_to_send_payload_checksum,
+    // last payload of a response that closes the connection
+    input wire upper_to_send_close,
     input wire pkt_granted,
     // Signals from TCP state machine handler. For now only the RX path enters
     // the TCP SM and cause updates to these signals. When tcb_rx_sel matches
@@ -26,7 +29,8 @@ module tcb #(
     // 1. If SM asserts send_ack, this triggers pkt_pending after some time
     // 2. If arbiter wrote into the to_send FIFO
     // 3. If sending a packet in non-echo mode, this re-asserts when
-    // internally transition into FINWAIT for HTTP1.0 closing.
+    // internally transition into FINWAIT, after a response that closes the
+    // connection or when a kept alive connection idles out.
     output reg pkt_pending,
     output reg [31:0] o_expected_ack,
 
@@ -82,16 +86,22 @@ module tcb #(
   logic [31:0] serial_ack_num, serial_ack_num_q;
   logic [18:0] serial_payload_addr, serial_payload_addr_q;
   logic [15:0] serial_payload_size, serial_payload_size_q;
+  logic [15:0] serial_payload_checksum, serial_payload_checksum_q;
   logic [7:0] serial_flags, serial_flags_q;
   fifo #(
-      .DATA_WIDTH(107),
+      .DATA_WIDTH(123),
       .DEPTH(64)
   ) serialized (
       .clk(clk),
       .rst(state_rst || rst),
       .wr_en(serial_wren),
       .din({
-        serial_sequence_num, serial_ack_num, serial_payload_size, serial_payload_addr, serial_flags
+        serial_sequence_num,
+        serial_ack_num,
+        serial_payload_size,
+        serial_payload_checksum,
+        serial_payload_addr,
+        serial_flags
       }),
       .full(),
       .rd_en(tx_update_en && pkt_granted),
@@ -99,6 +109,7 @@ module tcb #(
         serial_sequence_num_q,
         serial_ack_num_q,
         serial_payload_size_q,
+        serial_payload_checksum_q,
         serial_payload_addr_q,
         serial_flags_q
       }),
@@ -114,6 +125,7 @@ module tcb #(
       o_pkt.sequence_num <= serial_sequence_num_q;
       o_pkt.ack_num <= serial_ack_num_q;
       o_pkt.payload_size <= serial_payload_size_q;
+      o_pkt.checksum <= serial_payload_checksum_q;
       o_pkt.payload_addr <= serial_payload_addr_q;
       o_pkt.flags <= serial_flags_q;
     end
@@ -142,10 +154,12 @@ module tcb #(
       end
     endcase
   end
-  reg actual_payload_serialized = 0;
+  // a kept alive connection stays ESTABLISHED after its responses, only a
+  // payload marked close leads to FINWAIT once it is sent and acked
+  reg serial_close, close_serialized = 0;
   always @(posedge clk) begin
-    if (rst || state_rst || tcb_mem.state == tcp::LISTEN) actual_payload_serialized <= 0;
-    else if (serial_state == SERIAL_UPPER_UPDATE) actual_payload_serialized <= 1'b1;
+    if (rst || state_rst || tcb_mem.state == tcp::LISTEN) close_serialized <= 0;
+    else if (serial_state == SERIAL_UPPER_UPDATE && serial_close) close_serialized <= 1'b1;
   end
 
   always @(posedge clk) begin
@@ -176,7 +190,9 @@ module tcb #(
           serial_state <= SERIAL_UPPER;
           to_send_rden <= 1;
           serial_payload_size <= to_send_payload_size;
+          serial_payload_checksum <= to_send_payload_checksum;
           serial_payload_addr <= to_send_payload_addr;
+          serial_close <= to_send_close;
         end
         SERIAL_UPPER: begin
           to_send_rden <= 0;
@@ -211,6 +227,7 @@ module tcb #(
           serial_wren <= 1;
           serial_ack_num <= tcb_mem.ack_num;
           serial_payload_size <= 0;
+          serial_payload_checksum <= 0;
           serial_payload_addr <= 0;
           case (tcb_mem.state)
             tcp::SYN_RECV: begin
@@ -238,6 +255,7 @@ module tcb #(
           serial_sequence_num <= to_ack_sequence_num;
           serial_ack_num <= to_ack_ack_num;
           serial_payload_size <= to_ack_payload_size;
+          serial_payload_checksum <= to_ack_payload_checksum;
           serial_payload_addr <= to_ack_payload_addr;
           serial_flags <= to_ack_flags;
         end
@@ -260,7 +278,7 @@ module tcb #(
       fin_pending_q <= fin_pending;
       if (tcb_mem.state == tcp::FINWAIT) begin
         fin_pending <= 1'b1;
-      end else if (tcb_mem.state == tcp::ESTABLISHED && !echo_en && serial_empty && actual_payload_serialized && to_ack_empty && to_send_empty) begin
+      end else if (tcb_mem.state == tcp::ESTABLISHED && !echo_en && serial_empty && close_serialized && to_ack_empty && to_send_empty) begin
         fin_pending <= 1'b1;
       end else if (tcb_mem.state != tcp::ESTABLISHED) begin
         fin_pending <= 0;
@@ -287,7 +305,9 @@ module tcb #(
   assign idle_timeout = idle_timeout_counter == '0;
   reg [31:0] idle_timeout_counter;
   always @(posedge clk) begin
-    if (tcb_mem.state == tcp::ESTABLISHED && to_send_empty)
+    // any packet from the peer restarts it, a kept alive connection is only
+    // reclaimed when it stops sending requests
+    if (tcb_mem.state == tcp::ESTABLISHED && to_send_empty && !rx_update_en)
       idle_timeout_counter <= idle_timeout_counter == 0 ? 0 : idle_timeout_counter - 1;
     else idle_timeout_counter <= IDLE_TIMEOUT;
   end
@@ -308,7 +328,7 @@ module tcb #(
     end else if (fin_timeout) begin
       tcb_mem.state <= tcp::LISTEN;
     end else if (tcb_mem.state == tcp::ESTABLISHED && !echo_en) begin
-      if (idle_timeout || (serial_empty && actual_payload_serialized && to_ack_empty))
+      if (idle_timeout || (serial_empty && close_serialized && to_ack_empty))
         tcb_mem.state <= tcp::FINWAIT;
     end
   end
@@ -387,22 +407,29 @@ module tcb #(
 
   logic [18:0] to_send_payload_addr, to_send_payload_addr_q;
   logic [15:0] to_send_payload_size, to_send_payload_size_q;
+  logic [15:0] to_send_payload_checksum;
+  logic to_send_close;
   always @(posedge clk) begin
     to_send_payload_size_q <= to_send_payload_size;
     to_send_payload_addr_q <= to_send_payload_addr;
   end
   fifo #(
       .LOOKAHEAD(1),
-      .DATA_WIDTH(35),
+      .DATA_WIDTH(52),
       .DEPTH(64)
   ) to_send (
       .clk  (clk),
       .rst  (rst || state_rst),
       .wr_en(to_send_wr_en && tx_update_en),
-      .din  ({upper_to_send_payload_size, upper_to_send_payload_addr}),
+      .din  ({
+        upper_to_send_close,
+        upper_to_send_payload_checksum,
+        upper_to_send_payload_size,
+        upper_to_send_payload_addr
+      }),
       .full (),
       .rd_en(to_send_rden),
-      .dout ({to_send_payload_size, to_send_payload_addr}),
+      .dout ({to_send_close, to_send_payload_checksum, to_send_payload_size, to_send_payload_addr}),
       .empty(to_send_empty),
       .valid(),
       .count()
@@ -410,6 +437,7 @@ module tcb #(
 
   logic [18:0] to_ack_payload_addr;
   logic [15:0] to_ack_payload_size;
+  logic [15:0] to_ack_payload_checksum;
   logic [31:0] to_ack_sequence_num;
   logic [31:0] to_ack_ack_num;
   logic [ 7:0] to_ack_flags;
@@ -422,11 +450,13 @@ module tcb #(
       .wr_en(to_ack_wr_en),
       .to_send_payload_addr(o_pkt.payload_addr),
       .to_send_payload_size(o_pkt.payload_size),
+      .to_send_payload_checksum(o_pkt.checksum),
       .to_send_sequence_num(o_pkt.sequence_num),
       .to_send_ack_num(o_pkt.ack_num),
       .to_send_flags(o_pkt.flags),
       .to_ack_payload_addr(to_ack_payload_addr),
       .to_ack_payload_size(to_ack_payload_size),
+      .to_ack_payload_checksum(to_ack_payload_checksum),
       .to_ack_sequence_num(to_ack_sequence_num),
       .to_ack_ack_num(to_ack_ack_num),
       .to_ack_flags(to_ack_flags),
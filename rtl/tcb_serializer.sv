@@ -4,17 +4,27 @@ module tcb_serializer (
     input wire rst,
     input wire [18:0] i_to_send_payload_addr,
     input wire [15:0] i_to_send_payload_size,
+    // first entry of the payload in the segment checksum table
+    input wire [9:0] i_to_send_payload_seg,
+    // close the connection after this payload
+    input wire i_to_send_close,
     input wire upper_pending,
     input wire pkt_pending,
     input wire echo_pending,
     input wire [18:0] echo_payload_addr,
     input wire [15:0] echo_payload_size,
+    // segment checksum table, 1 cycle read latency
+    output wire [9:0] seg_rd_idx,
+    input wire [15:0] seg_checksum,
 
     output reg [1:0] tcb_tx_sel,
     output reg to_send_wr_en,
     output reg o_send_tcp,
     output reg [18:0] mux_to_send_payload_addr,
     output reg [15:0] mux_to_send_payload_size,
+    output reg [15:0] mux_to_send_payload_checksum,
+    // set on the last segment of a payload that closes the connection
+    output reg mux_to_send_close,
 
     output reg upper_granted,
     output reg pkt_granted,
@@ -52,13 +62,29 @@ module tcb_serializer (
   reg [15:0] remaining_payload_size;
   reg [18:0] to_send_payload_addr;
   reg [15:0] to_send_payload_size;
+  reg to_send_close;
   always @(posedge clk) begin
     if (upper_pending) begin
       to_send_payload_size <= i_to_send_payload_size;
       to_send_payload_addr <= i_to_send_payload_addr;
+      to_send_close <= i_to_send_close;
     end
   end
 
+  // Every 1440 byte segment has its checksum precomputed by content_gen, one
+  // is emitted per cycle so the next one is always read a cycle ahead.
+  reg [9:0] seg_next;
+  assign seg_rd_idx = grant_state == GRANT_IDLE ? i_to_send_payload_seg : seg_next;
+  always @(posedge clk) begin
+    if (grant_state == GRANT_IDLE) seg_next <= i_to_send_payload_seg + 1;
+    else seg_next <= seg_next + 1;
+  end
+  always @(posedge clk) begin
+    if (grant_state == GRANT_UPPER || grant_state == GRANT_BREAK)
+      mux_to_send_payload_checksum <= seg_checksum;
+    else mux_to_send_payload_checksum <= 0;
+  end
+
   always @(posedge clk) begin
     if (rst) upper_granted <= 0;
     else upper_granted <= grant_state == GRANT_UPPER;
@@ -99,6 +125,7 @@ module tcb_serializer (
       remaining_payload_addr <= 0;
       mux_to_send_payload_size <= 0;
       mux_to_send_payload_addr <= 0;
+      mux_to_send_close <= 0;
     end else
       case (grant_state)
         GRANT_IDLE: begin
@@ -120,6 +147,7 @@ module tcb_serializer (
           if (to_send_payload_size <= 1440) begin
             mux_to_send_payload_size <= to_send_payload_size;
             mux_to_send_payload_addr <= to_send_payload_addr;
+            mux_to_send_close <= to_send_close;
             grant_state <= GRANT_UPPER_WAIT;
           end else begin
             mux_to_send_payload_size <= 1440;
@@ -134,6 +162,7 @@ module tcb_serializer (
           if (!upper_pending) grant_state <= GRANT_IDLE;
           mux_to_send_payload_size <= 0;
           mux_to_send_payload_addr <= 0;
+          mux_to_send_close <= 0;
         end
         GRANT_BREAK: begin
           remaining_payload_size   <= remaining_payload_size - 1440;
@@ -141,6 +170,7 @@ module tcb_serializer (
           mux_to_send_payload_addr <= remaining_payload_addr;
           if (remaining_payload_size <= 1440) begin
             mux_to_send_payload_size <= remaining_payload_size;
+            mux_to_send_close <= to_send_close;
             grant_state <= GRANT_UPPER_WAIT;
           end else begin
             mux_to_send_payload_size <= 1440;
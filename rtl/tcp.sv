@@ -34,8 +34,9 @@ package tcp;
     // Address to payload in memory
     logic [18:0] payload_addr;
     logic [15:0] payload_size;
-    // precomputed ones complement sum of payload and IP psuedo header
-    // logic [15:0] checksum;
+    // precomputed ones complement sum of payload, tcp_encode adds the
+    // header and IP psuedo header
+    logic [15:0] checksum;
     logic [7:0]  flags;
     // Ack number expected to receive for this packet. 
     // Filled up only at the time when the packet is sent as it may change.
@@ -35,11 +35,17 @@ module tcp_arbiter #(
     output reg upper_granted,
     input [18:0] i_to_send_payload_addr,
     input [15:0] i_to_send_payload_size,
+    input [9:0] i_to_send_payload_seg,
+    // close the connection once the payload is sent and acked
+    input i_to_send_close,
     input [31:0] to_send_peer_addr,
     input [15:0] to_send_peer_port,
     // Enable TCP echo, which directly transitions an incoming TCP payload
     // packet to TX state. Connects the incoming EBR to outgoing EBR
     input tcp_echo_en,
+    // segment checksum table of the pages, read per segment sent
+    output [9:0] seg_rd_idx,
+    input [15:0] seg_checksum,
 
     output reg rdy,
     // From TCP SM, connect to encoder FIFO
@@ -53,6 +59,7 @@ module tcp_arbiter #(
     // Provide the peer addr and peer port for the TCP request with valid payload
     output reg [31:0] tcp_payload_peer_addr,
     output reg [15:0] tcp_payload_peer_port,
+    output reg [15:0] tcp_payload_size,
     output reg [7:0] o_state,
     output reg [7:0] o_serial_state,
     output wire [7:0] o_upper_state,
@@ -80,6 +87,8 @@ module tcp_arbiter #(
   reg pkt_granted;
   reg [18:0] mux_to_send_payload_addr;
   reg [15:0] mux_to_send_payload_size;
+  reg [15:0] mux_to_send_payload_checksum;
+  reg mux_to_send_close;
   tcb #(
       .ID(1)
   ) tcb (
@@ -98,6 +107,8 @@ module tcp_arbiter #(
       .tcb_tx_sel(tcb_tx_sel),
       .upper_to_send_payload_addr(mux_to_send_payload_addr),
       .upper_to_send_payload_size(mux_to_send_payload_size),
+      .upper_to_send_payload_checksum(mux_to_send_payload_checksum),
+      .upper_to_send_close(mux_to_send_close),
       .to_send_wr_en(to_send_wr_en),
       .pkt_granted(pkt_granted),
 
@@ -115,17 +126,23 @@ module tcp_arbiter #(
       .rst(rst),
       .i_to_send_payload_addr(i_to_send_payload_addr),
       .i_to_send_payload_size(i_to_send_payload_size),
+      .i_to_send_payload_seg(i_to_send_payload_seg),
+      .i_to_send_close(i_to_send_close),
       .upper_pending(upper_pending),
       .pkt_pending(pkt_pending),
       .echo_pending(echo_pending),
       .echo_payload_addr('0),
       .echo_payload_size(rx_packet.payload_size),
+      .seg_rd_idx(seg_rd_idx),
+      .seg_checksum(seg_checksum),
 
       .tcb_tx_sel(tcb_tx_sel),
       .to_send_wr_en(to_send_wr_en),
       .o_send_tcp(send_tcp),
       .mux_to_send_payload_addr(mux_to_send_payload_addr),
       .mux_to_send_payload_size(mux_to_send_payload_size),
+      .mux_to_send_payload_checksum(mux_to_send_payload_checksum),
+      .mux_to_send_close(mux_to_send_close),
 
       .upper_granted(upper_granted),
       .pkt_granted  (pkt_granted),
@@ -246,6 +263,7 @@ module tcp_arbiter #(
 
           tcp_payload_peer_addr <= tcb_pkt.peer_addr;
           tcp_payload_peer_port <= tcb_pkt.peer_port;
+          tcp_payload_size <= rx_packet_q.payload_size;
           if (sm_accept_payload) begin
             tcp_payload_valid <= 1'b1;
             state <= RX_IDLE;
@@ -6,6 +6,7 @@ module to_ack_fifo (
     input wr_en,
     input [18:0] to_send_payload_addr,
     input [15:0] to_send_payload_size,
+    input [15:0] to_send_payload_checksum,
     input [31:0] to_send_sequence_num,
     input [31:0] to_send_ack_num,
     input [7:0] to_send_flags,
@@ -13,6 +14,7 @@ module to_ack_fifo (
 
     output reg [18:0] to_ack_payload_addr,
     output reg [15:0] to_ack_payload_size,
+    output reg [15:0] to_ack_payload_checksum,
     output reg [31:0] to_ack_sequence_num,
     output reg [31:0] to_ack_ack_num,
     output reg [7:0] to_ack_flags,
@@ -22,7 +24,7 @@ module to_ack_fifo (
   reg rd_en;
   fifo #(
       .LOOKAHEAD(1),
-      .DATA_WIDTH(107),
+      .DATA_WIDTH(123),
       .DEPTH(32)
   ) to_ack (
       .clk(clk),
@@ -32,13 +34,19 @@ module to_ack_fifo (
         to_send_sequence_num,
         to_send_ack_num,
         to_send_payload_size,
+        to_send_payload_checksum,
         to_send_payload_addr,
         to_send_flags
       }),
       .full(),
       .rd_en(rd_en),
       .dout({
-        to_ack_sequence_num, to_ack_ack_num, to_ack_payload_size, to_ack_payload_addr, to_ack_flags
+        to_ack_sequence_num,
+        to_ack_ack_num,
+        to_ack_payload_size,
+        to_ack_payload_checksum,
+        to_ack_payload_addr,
+        to_ack_flags
       }),
       .empty(empty),
       .valid(),
@@ -5,8 +5,8 @@ import pytest
 
 import cocotb
 from cocotb_tools.runner import get_runner
-from cocotb.clock import Clock
 from cocotb.triggers import RisingEdge, with_timeout, ReadWrite
+from common.clocks import start_clock
 
 
 class TB:
@@ -15,8 +15,8 @@ class TB:
 
         self.log = logging.getLogger("cocotb.tb")
         self.log.setLevel(logging.DEBUG)
-        cocotb.start_soon(Clock(dut.clk, 8, units='ns').start())
-        cocotb.start_soon(Clock(dut.rd_clk, 8, units='ns').start())
+        start_clock(dut.clk, 8)
+        start_clock(dut.rd_clk, 8)
 
     async def reset(self, signal):
         signal.setimmediatevalue(0)
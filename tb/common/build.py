@@ -0,0 +1,132 @@
+"""
+Content-hashed build cache for the cocotb runners.
+
+A build is identified by the simulator and its version, the contents of
+every source and of the include directories, and the toplevel, defines,
+parameters, build arguments, timescale and waves setting. Models are kept
+under TB_BUILD_CACHE (tb/sim_cache by default), so tests whose builds match
+share one, whichever directory they run from. Memory files passed as
+parameters are read at run time and only their paths count. Savable
+models (savable=True, see checkpoint.py) are cached apart from the others.
+
+Set TB_REBUILD to build again regardless.
+"""
+import fcntl
+import functools
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+from pathlib import Path
+
+from cocotb_tools.runner import get_runner
+
+CACHE_DIR = Path(os.getenv("TB_BUILD_CACHE", Path(__file__).resolve().parents[1] / "sim_cache"))
+INCLUDE_SUFFIXES = (".sv", ".svh", ".v", ".vh")
+STAMP = "build.json"
+
+
+@functools.lru_cache(maxsize=None)
+def _file_digest(path, mtime_ns, size):
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+def file_digest(path):
+    st = os.stat(path)
+    return _file_digest(str(path), st.st_mtime_ns, st.st_size)
+
+
+@functools.lru_cache(maxsize=None)
+def simulator_version(sim):
+    exe = {"verilator": "verilator", "icarus": "iverilog"}.get(sim, sim)
+    if shutil.which(exe) is None:
+        return None
+    try:
+        out = subprocess.run([exe, "-V" if sim == "icarus" else "--version"],
+                             capture_output=True, text=True, timeout=30)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return out.stdout.splitlines()[0] if out.stdout else None
+
+
+def _source_path(source):
+    # tagged sources (Verilog(...), VHDL(...)) keep the path in .value
+    return Path(getattr(source, "value", source)).resolve()
+
+
+def build_key(sim, sources=(), includes=(), **build_kwargs):
+    """
+    Hex digest identifying the model runner.build(**build_kwargs) would
+    produce from 'sources'.
+    """
+    h = hashlib.sha256()
+    config = {k: v for k, v in build_kwargs.items() if k not in ("verbose", "log_file")}
+    config["sim"] = sim
+    config["version"] = simulator_version(sim)
+    h.update(json.dumps(config, sort_keys=True, default=str).encode())
+    for source in sources:
+        path = _source_path(source)
+        h.update(f"{type(source).__name__}:{path}:{file_digest(path)}\n".encode())
+    for include in includes:
+        include = Path(include).resolve()
+        h.update(f"include:{include}\n".encode())
+        for path in sorted(include.iterdir()):
+            if path.suffix in INCLUDE_SUFFIXES:
+                h.update(f"{path.name}:{file_digest(path)}\n".encode())
+    return h.hexdigest()
+
+
+class CachedRunner:
+    """
+    Wraps a runner whose model lives in 'model_dir'. test() runs the
+    simulation in 'test_dir', so results, waves and relative paths stay
+    where the test expects them.
+    """
+
+    def __init__(self, runner, model_dir, test_dir, lang, hit):
+        self.runner = runner
+        self.model_dir = model_dir
+        self.test_dir = test_dir
+        self.lang = lang
+        self.hit = hit
+
+    def test(self, **kwargs):
+        kwargs["build_dir"] = self.model_dir
+        kwargs.setdefault("test_dir", self.test_dir)
+        kwargs.setdefault("hdl_toplevel_lang", self.lang)
+        return self.runner.test(**kwargs)
+
+
+def cached_build(sim, build_dir="sim_build", savable=False, **build_kwargs):
+    """
+    Builds like get_runner(sim).build(**build_kwargs) unless a model of the
+    same configuration is cached. 'build_dir' becomes the test directory.
+    With 'savable', Verilator models can be checkpointed, other simulators
+    ignore it.
+    """
+    savable = savable and sim == "verilator"
+    if savable:
+        from common.checkpoint import MAIN, SavableVerilator
+        runner = SavableVerilator()
+        key = build_key(sim, checkpoint_main=file_digest(MAIN), **build_kwargs)
+    else:
+        runner = get_runner(sim)
+        key = build_key(sim, **build_kwargs)
+    sources = build_kwargs.get("sources", [])
+    lang = "vhdl" if _source_path(sources[-1]).suffix in (".vhd", ".vhdl") else "verilog"
+    model_dir = CACHE_DIR / f"{build_kwargs.get('hdl_toplevel', 'top')}-{key[:16]}"
+    test_dir = Path(build_dir).resolve()
+    test_dir.mkdir(parents=True, exist_ok=True)
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    # parallel pytest workers asking for the same model build it once
+    with open(model_dir.with_suffix(".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        stamp = model_dir / STAMP
+        hit = stamp.exists() and not os.getenv("TB_REBUILD")
+        if not hit:
+            stamp.unlink(missing_ok=True)
+            runner.build(build_dir=model_dir, always=True, **build_kwargs)
+            stamp.write_text(json.dumps({"key": key, "sim": sim,
+                                         "toplevel": build_kwargs.get("hdl_toplevel")}))
+    return CachedRunner(runner, model_dir, test_dir, lang, hit)
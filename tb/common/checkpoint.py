@@ -0,0 +1,98 @@
+"""
+Checkpoints of Verilator models, to skip warm-up phases such as reset and
+boot in every test.
+
+Savable models are built with --savable and the main in
+verilator_checkpoint.cpp (pass savable=True in the build arguments of
+cached_build or run_profiled). Verilator does not support --savable with
+--timing, so these are built with --no-timing, and delays, such as those
+of the Lattice simulation models, are ignored.
+
+warm(name, phase, clock) runs the coroutine function 'phase' the first
+time and saves the model right after it, next to the cached model. Later
+runs of the same model and plusargs restore that state instead, at the
+current simulation time, and get back the JSON state 'phase' returned for
+the Python side of the bench. Checkpoints are dropped with their model,
+and when the source of 'phase' changes. Set TB_CHECKPOINT=0 to always run
+the phase.
+"""
+import ctypes
+import hashlib
+import inspect
+import json
+import os
+from pathlib import Path
+
+import cocotb
+import cocotb_tools.config
+from cocotb.triggers import RisingEdge, Timer
+from cocotb_tools.runner import Verilator
+
+MAIN = Path(__file__).resolve().with_name("verilator_checkpoint.cpp")
+
+
+class SavableVerilator(Verilator):
+    """
+    Verilator runner building a savable model around the checkpointing main.
+    """
+
+    def _build_command(self):
+        cmds = super()._build_command()
+        cocotb_main = str(cocotb_tools.config.share_dir / "lib" / "verilator" / "verilator.cpp")
+        verilate = ["--no-timing" if arg == "--timing" else arg for arg in cmds[0]
+                    if arg != cocotb_main] + ["-Wno-STMTDLY"]
+        # the main's entry points are looked up by Python in the executable
+        verilate[verilate.index("--exe") + 1:1] = ["--savable", "-LDFLAGS", "-rdynamic"]
+        cmds[0] = verilate + [str(MAIN)]
+        return cmds
+
+
+def _checkpoint_lib():
+    try:
+        lib = ctypes.CDLL(None)
+        lib.tb_checkpoint_save.argtypes = [ctypes.c_char_p]
+        lib.tb_checkpoint_restore.argtypes = [ctypes.c_char_p]
+    except AttributeError:
+        return None
+    return lib
+
+
+def checkpoint_path(name, phase):
+    """
+    Where the checkpoint 'name' of the running model and plusargs, taken
+    after 'phase', lives.
+    """
+    h = hashlib.sha256(json.dumps(cocotb.plusargs, sort_keys=True, default=str).encode())
+    h.update(inspect.getsource(phase).encode())
+    model_dir = Path(cocotb.argv[0]).resolve().parent
+    return model_dir / "checkpoints" / f"{name}-{h.hexdigest()[:16]}.ckpt"
+
+
+async def warm(name, phase, clock):
+    """
+    Brings the model to the state after 'phase', restoring it when a
+    checkpoint exists. Returns what 'phase' returned.
+    """
+    lib = _checkpoint_lib()
+    if lib is None or os.getenv("TB_CHECKPOINT") == "0":
+        return await phase()
+    path = checkpoint_path(name, phase)
+    state_file = path.with_suffix(".json")
+    # saved and restored on the same clock edge, so clocks keep their phase
+    if state_file.exists():
+        await RisingEdge(clock)
+        lib.tb_checkpoint_restore(str(path).encode())
+        await Timer(1, "step")
+        cocotb.log.info(f"restored checkpoint {name} from {path}")
+        return json.loads(state_file.read_text())
+    state = await phase()
+    await RisingEdge(clock)
+    path.parent.mkdir(exist_ok=True)
+    # parallel runs of the same model each write their own and the last wins
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    lib.tb_checkpoint_save(str(tmp).encode())
+    await Timer(1, "step")
+    tmp.replace(path)
+    state_file.write_text(json.dumps(state))
+    cocotb.log.info(f"saved checkpoint {name} to {path}")
+    return state
@@ -0,0 +1,85 @@
+"""
+Clocks toggled by the simulator interface rather than by Python.
+
+start_clock() drives a signal with a cocotb GPI clock, which schedules its
+own edges in C, so Python is not woken up on every half period as it was by
+the _run_clocks coroutines of the benches. A phase in degrees delays the
+first rising edge, e.g. 90 for clk90. With 'enable', a signal, the clock is
+gated like the USRMCLK output to the flash: it only runs while 'enable' is
+high, sampled at the rising edges it would have without gating, and stops
+low. Python then wakes up only on the edges of 'enable'.
+"""
+import cocotb
+from cocotb.clock import Clock
+from cocotb.handle import Immediate
+from cocotb.triggers import FallingEdge, RisingEdge, Timer
+from cocotb.utils import get_sim_steps, get_sim_time
+
+
+class PhaseClock:
+    """
+    A 50% duty cycle clock on 'signal' with a 'period' in 'unit', its rising
+    edges 'phase' degrees after those of a clock started at the same time.
+    """
+
+    def __init__(self, signal, period, phase=0, unit="ns", enable=None):
+        self.signal = signal
+        self.period = get_sim_steps(period, unit)
+        self.offset = get_sim_steps(period * (phase % 360) / 360, unit, round_mode="round")
+        self.enable = enable
+        self._clock = Clock(signal, self.period, "step", impl="gpi", set_action=Immediate)
+        self._task = None
+        self._start = None
+        self._running = False
+
+    def start(self):
+        self.signal.value = Immediate(0)
+        self._task = cocotb.start_soon(self._run())
+        return self._task
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+        self._gate(False)
+
+    def _gate(self, run):
+        if run and not self._running:
+            self._clock.start()
+        elif not run and self._running:
+            self._clock.stop()
+        self._running = run
+
+    def _into_period(self):
+        return (get_sim_time("step") - self._start) % self.period
+
+    async def _run(self):
+        if self.offset:
+            await Timer(self.offset, "step")
+        self._start = get_sim_time("step")
+        if self.enable is None:
+            self._gate(True)
+            return
+        while True:
+            if not self.enable.value.is_resolvable or not int(self.enable.value):
+                await RisingEdge(self.enable)
+                wait = -self._into_period() % self.period
+                if wait:
+                    await Timer(wait, "step")
+                if not int(self.enable.value):
+                    continue
+            self._gate(True)
+            await FallingEdge(self.enable)
+            # finish the current cycle and stop while low
+            into = self._into_period()
+            if into < self.period // 2:
+                await Timer(self.period * 3 // 4 - into, "step")
+            self._gate(False)
+
+
+def start_clock(signal, period, phase=0, unit="ns", enable=None):
+    """
+    Starts a PhaseClock and returns it.
+    """
+    clock = PhaseClock(signal, period, phase, unit, enable)
+    clock.start()
+    return clock
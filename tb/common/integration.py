@@ -0,0 +1,78 @@
+"""
+One model of the mac top level for every integration test.
+
+The tables of a content set are handed to the model as plusargs, so the
+tcp echo tests and any number of http content sets run on the same cached
+build. Echo is the tcp_echo_en input. SPEED_100M changes the clocking of
+the RGMII side and stays a build time define.
+
+With TB_SDRAM=model, runners that pass sdram_model=None build sdram_ctrl
+instead of sdram_dummy, behind the SDRAM model of tb/sdram/model.py.
+"""
+import os
+from pathlib import Path
+
+TB_DIR = Path(__file__).resolve().parents[1]
+RTL_DIR = TB_DIR.parent / "rtl"
+TOPLEVEL = "integration"
+LATTICE_LIB = "/home/bawj/lscc/diamond/3.14/cae_library/simulation"
+
+# plusarg -> file written by content_gen.py
+HTTP_TABLES = {
+    "HTTP_ADDR_FILE": "addrs.mem",
+    "HTTP_SIZE_FILE": "lengths.mem",
+    "HTTP_KEY_FILE": "route_keys.mem",
+    "HTTP_SEED_FILE": "route_seeds.mem",
+    "HTTP_DISP_FILE": "route_disp.mem",
+    "HTTP_GZIP_ADDR_FILE": "gzip_addrs.mem",
+    "HTTP_GZIP_SIZE_FILE": "gzip_lengths.mem",
+    "HTTP_SEG_FILE": "seg_checksums.mem",
+    "HTTP_404_FILE": "notfound.mem",
+    "HTTP_CONTENT_FILE": "content_hex.mem",
+}
+
+SOURCES = [TB_DIR.parent / "config.vlt", TB_DIR / "common" / "integration.sv"] + [
+    RTL_DIR / f for f in (
+        "utils.sv", "cache.sv", "http_decode.sv", "http_entry.sv", "mac_encode.sv",
+        "ram_wrap.sv", "slab_allocator.sv", "ram_sp.sv", "sdram_dummy.sv", "mac_decode.sv",
+        "synchronizer.sv", "ebr.sv", "tcp.sv", "mac.sv", "mac_tx.sv", "oddr.sv", "iddr.sv",
+        "lfsr_rng.sv", "ip_encode.sv", "tcp_encode.sv", "tcp_arbiter.sv", "tcp_sm.sv",
+        "tcp_decode.sv", "ip_decode.sv", "arp_decode.sv", "arp_encode.sv", "rgmii_rcv.sv",
+        "rgmii_tx.sv", "clk_divider.sv", "delay.sv", "fifo.sv", "pulse_stretcher.sv",
+        "to_ack_fifo.sv", "tcb.sv", "crc32.sv")]
+
+
+def content_plusargs(table_dir):
+    """
+    Plusargs loading the content set in 'table_dir'. Tables that are not
+    there are left empty.
+    """
+    table_dir = Path(table_dir).resolve()
+    return [f"+{arg}={table_dir / name}" for arg, name in HTTP_TABLES.items()
+            if (table_dir / name).exists()]
+
+
+def integration_build_kwargs(sim, speed_100=False, sdram_model=False):
+    """
+    Build arguments of the shared model, one per simulator, speed and SDRAM.
+    'sdram_model' None takes it from TB_SDRAM. Waves and tracing come from
+    the profile.
+    """
+    if sdram_model is None:
+        sdram_model = os.getenv("TB_SDRAM") == "model"
+    defines = {}
+    if speed_100:
+        defines["SPEED_100M"] = "True"
+    if sdram_model:
+        defines["SDRAM_MODEL"] = "True"
+    return dict(
+        sources=SOURCES + [RTL_DIR / "sdram_ctrl.sv"] if sdram_model else SOURCES,
+        hdl_toplevel=TOPLEVEL,
+        defines=defines,
+        includes=[RTL_DIR],
+        build_args=["--threads", "8", "--bbox-unsup",
+                    "-y", f"{LATTICE_LIB}/verilog/ecp5u/",
+                    "-y", f"{LATTICE_LIB}/vhdl/ecp5u/", "--timing"
+                    ] if sim == "verilator" else [f"-y{LATTICE_LIB}/verilog/ecp5u/"],
+        timescale=("1ns", "1ps"),
+    )
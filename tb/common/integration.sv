@@ -0,0 +1,136 @@
+// Integration top shared by the tcp and http tests. The HTTP tables and
+// the SDRAM content are loaded at run time from +HTTP_*_FILE plusargs, the
+// parameters only bake in defaults. With SDRAM_MODEL defined, sdram_ctrl
+// replaces sdram_dummy and its pins are left to tb/sdram/model.py, which
+// then holds the content.
+module integration #(
+    parameter HTTP_ADDR_FILE = "",
+    parameter HTTP_SIZE_FILE = "",
+    parameter HTTP_KEY_FILE = "",
+    parameter HTTP_SEED_FILE = "",
+    parameter HTTP_DISP_FILE = "",
+    parameter HTTP_GZIP_ADDR_FILE = "",
+    parameter HTTP_GZIP_SIZE_FILE = "",
+    parameter HTTP_SEG_FILE = "",
+    parameter HTTP_404_FILE = "",
+    parameter HTTP_CONTENT_FILE = ""
+) (
+    input wire clk,
+    input wire clk90,
+    input wire rst,
+    input wire tcp_echo_en,
+
+    output reg [3:0] phy_txd,
+    output reg phy_txctl,
+    output wire phy_txc,
+    input wire [3:0] phy_rxd,
+    input wire phy_rxctl,
+    input wire phy_rxc
+`ifdef SDRAM_MODEL
+    ,
+    output wire [1:0] sdram_ba,
+    output wire sdram_we_n,
+    output wire sdram_cas_n,
+    output wire sdram_ras_n,
+    output wire sdram_clk,
+    output wire [31:0] sdram_dq,
+    // driven by the SDRAM model while it returns read data
+    input wire [31:0] sdram_dq_in,
+    input wire sdram_dq_in_en,
+    output wire [10:0] sdram_addr
+`endif
+);
+
+  GSR GSR_INST (.GSR(1'b1));
+  PUR PUR_INST (.PUR(1'b1));
+  mac #(
+      .HTTP_ADDR_FILE(HTTP_ADDR_FILE),
+      .HTTP_SIZE_FILE(HTTP_SIZE_FILE),
+      .HTTP_KEY_FILE(HTTP_KEY_FILE),
+      .HTTP_SEED_FILE(HTTP_SEED_FILE),
+      .HTTP_DISP_FILE(HTTP_DISP_FILE),
+      .HTTP_GZIP_ADDR_FILE(HTTP_GZIP_ADDR_FILE),
+      .HTTP_GZIP_SIZE_FILE(HTTP_GZIP_SIZE_FILE),
+      .HTTP_SEG_FILE(HTTP_SEG_FILE),
+      .HTTP_404_FILE(HTTP_404_FILE)
+  ) mac_instance (
+      .clk(clk),
+      .clk90(clk90),
+      .rst(rst),
+      .tcp_echo_en(tcp_echo_en),
+
+      .mem_ctrl_rd_req(sdram_rd_req),
+      .mem_ctrl_rd_size(),
+      .mem_ctrl_rd_granted(sdram_rd_granted),
+      .mem_ctrl_rd_ad(sdram_rd_ad),
+      .mem_ctrl_rd_valid(sdram_rd_valid),
+      .mem_ctrl_rd_data(sdram_rd_data),
+
+      .uart_tx  (),
+      .phy_txc  (phy_txc),
+      .phy_txd  (phy_txd),
+      .phy_txctl(phy_txctl),
+
+      .phy_rxd  (phy_rxd),
+      .phy_rxctl(phy_rxctl),
+      .phy_rxc  (phy_rxc)
+  );
+
+  reg  sdram_wr_req;
+  wire sdram_wr_granted;
+  reg [18:0] sdram_wr_ad, sdram_rd_ad;
+  reg [31:0] sdram_wr_data;
+  wire [31:0] sdram_rd_data;
+  reg sdram_rd_req;
+  wire sdram_rd_valid, sdram_rd_granted;
+`ifdef SDRAM_MODEL
+  assign sdram_dq = sdram_dq_in_en ? sdram_dq_in : 32'hzzzzzzzz;
+
+  sdram_ctrl m (
+      .clk(clk),
+      .rst(rst),
+
+      .wr_req(sdram_wr_req),
+      .wr_ad(sdram_wr_ad),
+      .wr_data(sdram_wr_data),
+      .wr_granted(sdram_wr_granted),
+
+      .rd_req(sdram_rd_req),
+      .rd_ad(sdram_rd_ad),
+      .rd_valid(sdram_rd_valid),
+      .rd_data(sdram_rd_data),
+      .rd_granted(sdram_rd_granted),
+      .boot_done(),
+
+      .sdram_ba(sdram_ba),
+      .sdram_we_n(sdram_we_n),
+      .sdram_cas_n(sdram_cas_n),
+      .sdram_ras_n(sdram_ras_n),
+      .sdram_clk(sdram_clk),
+      .sdram_dq(sdram_dq),
+      .sdram_addr(sdram_addr)
+  );
+`else
+  sdram_dummy #(
+      .INIT(HTTP_CONTENT_FILE),
+      .INIT_PLUSARG("HTTP_CONTENT_FILE")
+  ) m (
+      .clk(clk),
+      .rst(rst),
+
+      .wr_req(sdram_wr_req),
+      .wr_ad(sdram_wr_ad),
+      .wr_data(sdram_wr_data),
+      .wr_granted(sdram_wr_granted),
+
+      .rd_req(sdram_rd_req),
+      .rd_ad(sdram_rd_ad),
+      .rd_valid(sdram_rd_valid),
+      .rd_data(sdram_rd_data),
+      .rd_granted(sdram_rd_granted),
+      .boot_done()
+  );
+`endif
+
+endmodule
+
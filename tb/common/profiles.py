@@ -0,0 +1,105 @@
+"""
+Fast and debug simulation profiles.
+
+"fast" builds without tracing at a higher optimization level and only logs
+warnings. "debug" builds with FST tracing of structs and logs everything.
+TB_PROFILE picks the profile, fast by default. When tests fail in the fast
+profile they are run again in the debug profile in <build_dir>_debug, so
+waves only get written for the failures, and the original failure is
+still reported.
+
+Build and test wall time per profile is collected in TIMINGS and printed at
+the end of the pytest session by tb/conftest.py.
+"""
+import os
+import re
+import time
+from pathlib import Path
+from xml.etree import ElementTree
+
+from common.build import cached_build
+
+
+class Profile:
+    def __init__(self, name, waves, verilator_args, log_level):
+        self.name = name
+        self.waves = waves
+        self.verilator_args = verilator_args
+        self.log_level = log_level
+
+    def build_args(self, sim):
+        return list(self.verilator_args) if sim == "verilator" else []
+
+
+PROFILES = {
+    "fast": Profile("fast", False, ["-O3"], "WARNING"),
+    "debug": Profile("debug", True, ["--trace-fst", "--trace-structs"], "INFO"),
+}
+
+# (test, profile, build s, test s, passed)
+TIMINGS = []
+
+
+def current_profile():
+    name = os.getenv("TB_PROFILE", "fast")
+    if name not in PROFILES:
+        raise ValueError(f"unknown TB_PROFILE {name}, expected one of {', '.join(PROFILES)}")
+    return PROFILES[name]
+
+
+def failed_tests(results_xml):
+    """
+    Names of the failed testcases in a cocotb results file.
+    """
+    if not Path(results_xml).is_file():
+        return []
+    tree = ElementTree.parse(results_xml)
+    return [tc.get("name") for tc in tree.iter("testcase") if tc.find("failure") is not None]
+
+
+def _run(profile, sim, build_dir, build_kwargs, test_kwargs, testcase=None):
+    build_kwargs = dict(build_kwargs)
+    build_kwargs["build_args"] = list(build_kwargs.get("build_args", [])) + profile.build_args(sim)
+    build_kwargs["waves"] = profile.waves
+    build_kwargs.setdefault("verbose", profile.waves)
+    test_kwargs = dict(test_kwargs)
+    test_kwargs["waves"] = profile.waves
+    test_kwargs.setdefault("verbose", profile.waves)
+    test_kwargs["extra_env"] = {"COCOTB_LOG_LEVEL": profile.log_level,
+                                **test_kwargs.get("extra_env", {})}
+    results = Path(build_dir).resolve() / f"results_{profile.name}.xml"
+    test_kwargs["results_xml"] = str(results)
+    if testcase:
+        test_kwargs["test_filter"] = rf"(^|\.)({'|'.join(re.escape(t) for t in testcase)})$"
+
+    start = time.perf_counter()
+    runner = cached_build(sim, build_dir=build_dir, **build_kwargs)
+    built = time.perf_counter()
+    passed = True
+    try:
+        runner.test(**test_kwargs)
+    except SystemExit:
+        passed = False
+    done = time.perf_counter()
+    name = os.getenv("PYTEST_CURRENT_TEST", test_kwargs.get("test_module", "")).split(" ")[0]
+    TIMINGS.append((name, profile.name, built - start, done - built, passed))
+    return passed, results
+
+
+def run_profiled(sim, build_kwargs, test_kwargs, build_dir="sim_build"):
+    """
+    Builds and runs a test module in the current profile, like
+    cached_build(sim, **build_kwargs).test(**test_kwargs). Leave waves,
+    verbosity and tracing arguments out of both, the profile sets them.
+    """
+    profile = current_profile()
+    passed, results = _run(profile, sim, build_dir, build_kwargs, test_kwargs)
+    if passed:
+        return
+    failed = failed_tests(results)
+    if profile.name == "fast" and os.getenv("TB_RERUN", "1") != "0":
+        # waves for the failures only
+        _run(PROFILES["debug"], sim, f"{build_dir}_debug", build_kwargs, test_kwargs,
+             testcase=failed or None)
+    raise AssertionError(f"{len(failed) or 'some'} tests failed in the {profile.name} profile: "
+                         f"{', '.join(failed)}, see {results}")
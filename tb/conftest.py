@@ -0,0 +1,14 @@
+from common.profiles import TIMINGS
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not TIMINGS:
+        return
+    terminalreporter.section("simulation wall time")
+    totals = {}
+    for test, profile, build, run, passed in TIMINGS:
+        terminalreporter.write_line(f"{profile:>5} build {build:7.1f} s  test {run:7.1f} s  "
+                                    f"{'passed' if passed else 'FAILED'}  {test}")
+        totals[profile] = totals.get(profile, 0) + build + run
+    for profile, total in totals.items():
+        terminalreporter.write_line(f"{profile:>5} total {total:.1f} s")
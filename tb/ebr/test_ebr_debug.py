@@ -6,9 +6,9 @@ import pytest
 
 import cocotb
 from cocotb_tools.runner import get_runner
-from cocotb.clock import Clock, Timer
 from cocotb.triggers import RisingEdge
 from cocotbext.uart import UartSource, UartSink
+from common.clocks import start_clock
 
 
 class TB:
@@ -17,7 +17,7 @@ class TB:
 
         self.log = logging.getLogger("cocotb.tb")
         self.log.setLevel(logging.DEBUG)
-        cocotb.start_soon(Clock(dut.clk, 8, units='ns').start())
+        start_clock(dut.clk, 8)
 
 
 @cocotb.test()
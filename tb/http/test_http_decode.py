@@ -2,30 +2,24 @@ import pytest
 import cocotb
 import os
 from pathlib import Path
-from cocotb.triggers import RisingEdge, with_timeout, ReadWrite
-from cocotb.clock import Clock, Timer
-from cocotb.utils import get_sim_steps
-from cocotb_tools.runner import get_runner
+from cocotb.triggers import RisingEdge, FallingEdge, with_timeout, ReadWrite
+from common.clocks import start_clock
+from common.profiles import run_profiled
 
 
 class TB:
     def __init__(self, dut):
         self.dut = dut
 
-        cocotb.start_soon(self._run_clocks(dut.clk, 0, 8))
+        start_clock(dut.clk, 8)
         dut.rst.value = cocotb.handle.Immediate(1)
-
-    async def _run_clocks(self, port, phase, period):
-        half_period = get_sim_steps(period / 2.0, 'ns')
-        t = Timer(half_period)
-
-        if phase > 0:
-            await Timer(phase/360.0 * period, 'ns')
-        while True:
-            port.value = cocotb.handle.Immediate(1)
-            await t
-            port.value = cocotb.handle.Immediate(0)
-            await t
+        dut.index_rd_valid.value = 0
+        dut.index_rd_data.value = 0
+        dut.seg_rd_idx.value = 0
+        self.index_reads = 0
+        sdram = Path(os.getenv("TABLE_DIR") or ".")/"content_hex.mem"
+        self.sdram = [int(w, 16) for w in sdram.read_text().split()] if sdram.exists() else []
+        cocotb.start_soon(self.serve_index())
 
     async def reset(self):
         self.dut.rst.setimmediatevalue(1)
@@ -40,62 +34,313 @@ class TB:
         await RisingEdge(self.dut.clk)
         await RisingEdge(self.dut.clk)
 
+    async def serve_payload(self, payload):
+        """
+        Behaves like the tcp_incoming_buffer EBR in mac: words are read LSB
+        first, 2 cycles after payload_rd_en, from the start of the payload
+        every time payload_rd_en is raised.
+        """
+        payload = payload.ljust((len(payload) + 3) // 4 * 4 + 64, b"\x00")
+        words = [int.from_bytes(payload[i:i+4], "little")
+                 for i in range(0, len(payload), 4)]
+        pipe = [(0, 0), (0, 0)]
+        ptr = 0
+        while True:
+            await FallingEdge(self.dut.clk)
+            valid, data = pipe.pop(0)
+            self.dut.i_payload_valid.value = valid
+            self.dut.i_payload_data.value = data
+            if self.dut.payload_rd_en.value == 1:
+                pipe.append((1, words[min(ptr, len(words) - 1)]))
+                ptr += 1
+            else:
+                pipe.append((0, 0))
+                ptr = 0
+
+    async def serve_index(self):
+        """
+        Behaves like sdram_ctrl for index reads: one word per grant, several
+        cycles after the address is taken, while index_rd_en is held.
+        """
+        latency = 0
+        while True:
+            await FallingEdge(self.dut.clk)
+            self.dut.index_rd_valid.value = 0
+            if latency == 0 and self.dut.index_rd_en.value == 1:
+                ad = int(self.dut.index_rd_ad.value)
+                latency = 10
+            elif latency > 1:
+                latency -= 1
+            elif latency == 1:
+                self.dut.index_rd_valid.value = 1
+                self.dut.index_rd_data.value = self.sdram[ad] if ad < len(self.sdram) else 0
+                latency = -3
+            elif latency < 0:
+                # precharge before the next grant
+                latency += 1
+
+    async def request(self, payload):
+        """
+        Returns (cycles from the end of the request to res_valid, res_err,
+        res_payload_addr, res_payload_size). The request ends with the path
+        when there is no HTTP version, else with the headers or the payload.
+        """
+        path_end = min(payload.index(c, 4) for c in b" \r\n?" if c in payload[4:])
+        if payload[path_end] in b"\r\n":
+            end = path_end
+        elif b"\r\n\r\n" in payload:
+            end = payload.index(b"\r\n\r\n") + 3
+        else:
+            end = len(payload) - 1
+        end_word = end // 4
+        server = cocotb.start_soon(self.serve_payload(payload))
+        self.dut.tcp_payload_size.value = len(payload)
+        # tcp_arbiter pulses valid for 1 cycle
+        self.dut.tcp_payload_valid.value = 1
+        words_seen = 0
+        end_cycle = None
+        cycle = 0
+        index_rd_en = 0
+        while self.dut.res_valid.value != 1:
+            await RisingEdge(self.dut.clk)
+            self.dut.tcp_payload_valid.value = 0
+            cycle += 1
+            if self.dut.index_rd_en.value == 1 and not index_rd_en:
+                self.index_reads += 1
+            index_rd_en = int(self.dut.index_rd_en.value)
+            if self.dut.i_payload_valid.value == 1:
+                if words_seen == end_word:
+                    end_cycle = cycle
+                words_seen += 1
+            assert cycle < 200
+        res = (None if end_cycle is None else cycle - end_cycle, int(self.dut.res_err.value),
+               int(self.dut.res_payload_addr.value), int(self.dut.res_payload_size.value))
+        server.cancel()
+        self.dut.i_payload_valid.value = 0
+        await RisingEdge(self.dut.clk)
+        await RisingEdge(self.dut.clk)
+        return res
+
 
 @cocotb.test()
 async def http_decode(dut):
     tb = TB(dut)
-    payload = bytes("GET 0\r\n", "ascii")
+    dut.tcp_payload_valid.value = 0
+    dut.i_payload_valid.value = 0
     await tb.reset()
-    for i in range(len(payload)):
-        dut.i_payload_valid.value = 1
-        dut.i_payload_data.value = payload[i]
-        await RisingEdge(dut.clk)
+    latency, err, _, _ = await tb.request(b"GET /0\r\n")
+    # CAM is empty
+    if os.getenv("ADDR_FILE") == "":
+        assert err == 1
+    else:
+        assert err == 0
+
 
+@cocotb.test()
+async def http_decode_full_path(dut):
+    if os.getenv("ADDR_FILE") == "":
+        return
+    tb = TB(dut)
+    dut.tcp_payload_valid.value = 0
     dut.i_payload_valid.value = 0
-    await RisingEdge(dut.clk)
-    await RisingEdge(dut.clk)
-    await RisingEdge(dut.clk)
-    await RisingEdge(dut.clk)
-    assert dut.res_valid.value == 1
-    # CAM is empty
-    print(os.getenv("ADDR_FILE"))
+    await tb.reset()
+    latencies = set()
+    # sizes of the responses built from pages/
+    for req, size in [(b"GET /0\r\n", 0x5a0), (b"GET /0.html\r\n", 0x5a0),
+                      (b"GET /1\n", 0x5366), (b"GET /1.html\r\n", 0x5366)]:
+        latency, err, addr, res_size = await tb.request(req)
+        assert err == 0, req
+        assert res_size == size, req
+        assert addr != 0, req
+        latencies.add(latency)
+
+    for req in [b"GET /2\r\n", b"GET /\r\n", b"GET /0.htm\r\n",
+                b"GET /a/path/that/is/much/longer/than/any/page/0.html\r\n"]:
+        index_reads = tb.index_reads
+        latency, err, _, _ = await tb.request(req)
+        assert err == 1, req
+        # slots missing from http_entry are read from SDRAM
+        if tb.index_reads == index_reads:
+            latencies.add(latency)
+
+    # lookup takes the same time for every cached path
+    assert len(latencies) == 1
+
+    # the lookup overlaps with the headers
+    for req, size in [(b"GET /0.html HTTP/1.1\r\n\r\n", 0x5a0),
+                      (b"GET /1?x=1 HTTP/1.1\r\nHost: 105.105.105.105:8080\r\n\r\n", 0x5366)]:
+        latency, err, _, res_size = await tb.request(req)
+        assert err == 0, req
+        assert res_size == size, req
+        assert latency <= max(latencies), req
+
+    # paths longer than MAX_PATH_WORDS are never looked up
+    latency, err, _, _ = await tb.request(b"GET /" + b"a" * 300 + b"\r\n")
+    assert err == 1
+
+
+@cocotb.test()
+async def http_decode_accept_encoding(dut):
+    if os.getenv("ADDR_FILE") == "":
+        return
+    tb = TB(dut)
+    dut.tcp_payload_valid.value = 0
+    dut.i_payload_valid.value = 0
+    await tb.reset()
+    # sizes of the identity and gzip responses built from pages/
+    for req, size in [
+        (b"GET /1 HTTP/1.1\r\nHost: 105.105.105.105:8080\r\n"
+         b"Accept-Encoding: gzip, deflate, br\r\n\r\n", 0xe54),
+        (b"GET /1 HTTP/1.1\r\naccept-encoding: br, GZIP\r\nHost: a\r\n\r\n", 0xe54),
+        (b"GET /1 HTTP/1.1\r\nAccept-Encoding: deflate\r\nX-Gzip: gzip\r\n\r\n", 0x5366),
+        (b"GET /1 HTTP/1.1\r\n\r\nAccept-Encoding: gzip\r\n", 0x5366),
+        (b"GET /1\r\nAccept-Encoding: gzip\r\n\r\n", 0x5366),
+        # no blank line, the headers end with the payload
+        (b"GET /0 HTTP/1.1\nReferer: http://105.105.105.105:8080/0\nAccept-Encoding: gzip, deflate",
+         0x302),
+    ]:
+        latency, err, _, res_size = await tb.request(req)
+        assert err == 0, req
+        assert res_size == size, req
+
+    latency, err, _, _ = await tb.request(b"GET /2 HTTP/1.1\r\nAccept-Encoding: gzip\r\n\r\n")
+    assert err == 1
+
+
+@cocotb.test()
+async def http_decode_keep_alive(dut):
+    tb = TB(dut)
+    dut.tcp_payload_valid.value = 0
+    dut.i_payload_valid.value = 0
+    await tb.reset()
+    # only HTTP/1.1 keeps the connection, unless the client asks to close it
+    for req, close in [
+        (b"GET /0\r\n", 1),
+        (b"GET /0 HTTP/1.0\r\nConnection: keep-alive\r\n\r\n", 1),
+        (b"GET /0 HTTP/1.1\r\nHost: 105.105.105.105:8080\r\n\r\n", 0),
+        (b"GET /0 HTTP/1.1\r\nConnection: close\r\n\r\n", 1),
+        (b"GET /0 HTTP/1.1\r\nconnection: Keep-Alive, CLOSE\r\nHost: a\r\n\r\n", 1),
+        (b"GET /0 HTTP/1.1\r\nConnection: keep-alive\r\nX-Close: close\r\n\r\n", 0),
+        # a 404 does not end the connection either
+        (b"GET /2 HTTP/1.1\r\n\r\n", 0),
+    ]:
+        await tb.request(req)
+        assert int(dut.res_close.value) == close, req
+
+
+def ones_comp(a, b):
+    s = a + b
+    return (s & 0xFFFF) + (s >> 16)
+
+
+@cocotb.test()
+async def http_decode_segment_checksums(dut):
     if os.getenv("ADDR_FILE") == "":
-        assert dut.res_err.value == 1
+        return
+    tb = TB(dut)
+    dut.tcp_payload_valid.value = 0
+    dut.i_payload_valid.value = 0
+    dut.seg_rd_idx.value = 0
+    await tb.reset()
+    # checksum of every response, keyed by address
+    page_checksums = {}
+    for addrs, lengths in [("addrs.mem", "lengths.mem"), ("gzip_addrs.mem", "gzip_lengths.mem")]:
+        tables = Path(os.environ["TABLE_DIR"])
+        for a, l in zip((tables/addrs).read_text().split(), (tables/lengths).read_text().split()):
+            page_checksums[int(a, 16) & 0x7FFFF] = int(l, 16) >> 16
+
+    segs = set()
+    for req in [b"GET /0\r\n", b"GET /1\r\n", b"GET /1 HTTP/1.1\r\nAccept-Encoding: gzip\r\n\r\n"]:
+        _, err, addr, size = await tb.request(req)
+        assert err == 0, req
+        seg = int(dut.res_payload_seg.value)
+        # index 0 is the 404 page
+        assert seg != 0, req
+        segs.add(seg)
+        # the segments sum up to the checksum of the whole page
+        total = 0
+        for i in range((size + 1439) // 1440):
+            dut.seg_rd_idx.value = seg + i
+            await RisingEdge(dut.clk)
+            await RisingEdge(dut.clk)
+            total = ones_comp(total, int(dut.seg_checksum.value))
+        assert total == page_checksums[addr], req
+    assert len(segs) == 3
+
+
+@cocotb.test()
+async def http_decode_index(dut):
+    if os.getenv("ADDR_FILE") == "":
+        return
+    tb = TB(dut)
+    dut.tcp_payload_valid.value = 0
+    dut.i_payload_valid.value = 0
+    await tb.reset()
+    misses = 0
+    for i in range(32):
+        req = f"GET /x{i}\r\n".encode()
+        before = tb.index_reads
+        _, err, _, _ = await tb.request(req)
+        assert err == 1, req
+        misses += tb.index_reads - before
+        # the slot read from SDRAM is now cached
+        before = tb.index_reads
+        _, err, _, _ = await tb.request(req)
+        assert err == 1, req
+        assert tb.index_reads == before, req
+
+    if os.getenv("SLOT_BITS") == "9":
+        assert misses == 0
     else:
-        assert dut.res_err.value == 0
+        assert misses > 0
+
+    # pages evicted from http_entry come back from the index
+    for req, size in [(b"GET /0\r\n", 0x5a0), (b"GET /1.html\r\n", 0x5366),
+                      (b"GET /1 HTTP/1.1\r\nAccept-Encoding: gzip\r\n\r\n", 0xe54)]:
+        _, err, _, res_size = await tb.request(req)
+        assert err == 0, req
+        assert res_size == size, req
+
+
+TABLES = ["addrs.mem", "lengths.mem", "route_keys.mem", "route_seeds.mem", "route_disp.mem",
+          "gzip_addrs.mem", "gzip_lengths.mem", "seg_checksums.mem"]
 
 
-@pytest.mark.parametrize("addr_file,size_file", [("", ""), ("addrs.mem", "lengths.mem")])
-def test_http_decode(addr_file, size_file):
+# index/ is built with "content_gen.py -entries 1024", half the slots are
+# only in the SDRAM index
+@pytest.mark.parametrize("table_dir,slot_bits", [(None, 9), (".", 9), ("index", 10)])
+def test_http_decode(table_dir, slot_bits):
     sim = os.getenv("SIM", "verilator")
 
     source_folder = "../../rtl"
     sources = [
+        f"{source_folder}/crc32.sv",
+        f"{source_folder}/ram_sp.sv",
+        f"{source_folder}/http_entry.sv",
         f"{source_folder}/http_decode.sv",
         "./test_http_decode.sv",
     ]
 
-    addr_file_abs = Path(addr_file).resolve()
-    size_file_abs = Path(size_file).resolve()
-    assert addr_file_abs.exists() and size_file_abs.exists()
-    runner = get_runner(sim)
-    runner.build(
-        sources=sources,
-        hdl_toplevel="test_http_decode",
-        waves=True,
-        verbose=True,
-        includes=[f"{source_folder}/"],
-        parameters={"HTTP_ADDR_FILE": f'"{addr_file_abs}"',
-                    "HTTP_SIZE_FILE": f'"{size_file_abs}"', },
-        build_args=["--threads", "8", "--trace-fst",
-                    "--trace-structs"] if sim == "verilator" else [],
-        timescale=("1ns", "1ps"),
-    )
-
-    runner.test(waves=True,
-                verbose=True,
-                parameters={"HTTP_ADDR_FILE": f'{addr_file_abs}',
-                            "HTTP_SIZE_FILE": f'{size_file_abs}'},
-                extra_env={"ADDR_FILE": addr_file,
-                           "SIZE_FILE": size_file},
-                hdl_toplevel="test_http_decode", test_module="test_http_decode")
+    params = ["HTTP_ADDR_FILE", "HTTP_SIZE_FILE", "HTTP_KEY_FILE", "HTTP_SEED_FILE",
+              "HTTP_DISP_FILE", "HTTP_GZIP_ADDR_FILE", "HTTP_GZIP_SIZE_FILE", "HTTP_SEG_FILE"]
+    files_abs = {k: str((Path(table_dir)/f).resolve()) if table_dir else ""
+                 for k, f in zip(params, TABLES)}
+    assert all(Path(v).exists() for v in files_abs.values() if v)
+    # tables are loaded at run time, configurations with the same slot
+    # count share a model
+    plusargs = [f"+{k}={v}" for k, v in files_abs.items() if v]
+    build_dir = f"sim_build_{'empty' if table_dir is None else slot_bits}"
+    run_profiled(
+        sim,
+        dict(sources=sources,
+             hdl_toplevel="test_http_decode",
+             includes=[f"{source_folder}/"],
+             parameters={"HTTP_SLOT_BITS": slot_bits},
+             build_args=["--threads", "8"] if sim == "verilator" else [],
+             timescale=("1ns", "1ps")),
+        dict(plusargs=plusargs,
+             extra_env={"ADDR_FILE": files_abs["HTTP_ADDR_FILE"],
+                        "TABLE_DIR": str(Path(table_dir).resolve()) if table_dir else "",
+                        "SLOT_BITS": str(slot_bits)},
+             hdl_toplevel="test_http_decode", test_module="test_http_decode"),
+        build_dir=build_dir)
@@ -1,28 +1,64 @@
-module test_http #(
-    parameter string HTTP_ADDR_FILE,
-    parameter string HTTP_SIZE_FILE
+module test_http_decode #(
+    parameter string HTTP_ADDR_FILE = "",
+    parameter string HTTP_SIZE_FILE = "",
+    parameter string HTTP_KEY_FILE = "",
+    parameter string HTTP_SEED_FILE = "",
+    parameter string HTTP_DISP_FILE = "",
+    parameter string HTTP_GZIP_ADDR_FILE = "",
+    parameter string HTTP_GZIP_SIZE_FILE = "",
+    parameter string HTTP_SEG_FILE = "",
+    parameter int HTTP_SLOT_BITS
 ) (
     input clk,
     input rst,
+    input tcp_payload_valid,
+    input [15:0] tcp_payload_size,
     input i_payload_valid,
-    input [7:0] i_payload_data,
+    input [31:0] i_payload_data,
+    output reg payload_rd_en,
     output reg res_valid,
     output reg res_err,
     output reg [15:0] res_payload_size,
-    output reg [18:0] res_payload_addr
+    output reg [18:0] res_payload_addr,
+    output reg [9:0] res_payload_seg,
+    output reg res_close,
+    input [9:0] seg_rd_idx,
+    output [15:0] seg_checksum,
+    output reg index_rd_en,
+    output reg [18:0] index_rd_ad,
+    input index_rd_valid,
+    input [31:0] index_rd_data
 );
   http_decode #(
       .HTTP_ADDR_FILE(HTTP_ADDR_FILE),
-      .HTTP_SIZE_FILE(HTTP_SIZE_FILE)
+      .HTTP_SIZE_FILE(HTTP_SIZE_FILE),
+      .HTTP_KEY_FILE(HTTP_KEY_FILE),
+      .HTTP_SEED_FILE(HTTP_SEED_FILE),
+      .HTTP_DISP_FILE(HTTP_DISP_FILE),
+      .HTTP_GZIP_ADDR_FILE(HTTP_GZIP_ADDR_FILE),
+      .HTTP_GZIP_SIZE_FILE(HTTP_GZIP_SIZE_FILE),
+      .HTTP_SEG_FILE(HTTP_SEG_FILE),
+      .HTTP_SLOT_BITS(HTTP_SLOT_BITS)
   ) http_dec (
       .clk(clk),
       .rst(rst),
+      .tcp_payload_valid(tcp_payload_valid),
+      .tcp_payload_size(tcp_payload_size),
       .i_payload_valid(i_payload_valid),
       .i_payload_data(i_payload_data),
+      .payload_rd_en(payload_rd_en),
 
       .res_valid(res_valid),
       .res_err(res_err),
       .res_payload_size(res_payload_size),
-      .res_payload_addr(res_payload_addr)
+      .res_payload_addr(res_payload_addr),
+      .res_payload_seg(res_payload_seg),
+      .res_close(res_close),
+      .seg_rd_idx(seg_rd_idx),
+      .seg_checksum(seg_checksum),
+      .index_rd_en(index_rd_en),
+      .index_rd_ad(index_rd_ad),
+      .index_rd_valid(index_rd_valid),
+      .index_rd_data(index_rd_data)
   );
 endmodule
@@ -1,14 +1,19 @@
 import pytest
 import cocotb
 import os
-from pathlib import Path
-from cocotb.triggers import RisingEdge, with_timeout
-from cocotb.clock import Timer
-from cocotb.utils import get_sim_steps
-from cocotb_tools.runner import get_runner
+from cocotb.triggers import RisingEdge, with_timeout, Timer
+from common.checkpoint import warm
+from common.clocks import start_clock
+from common.integration import HTTP_TABLES, TOPLEVEL, content_plusargs, integration_build_kwargs
+from common.profiles import run_profiled
+from sdram.model import SdramModel
 from cocotbext.eth import RgmiiPhy
 from scapy.all import Raw, RandString, Ether, TCP, IP
 from tcp.utils import TCPIntegrated, TCP_client_sim, PacketGen, TCP_rst_client
+from tcp.pcap import PcapngWriter
+from tcp.replay import PcapReplay
+from tcp.load import LoadClient, LoadGen
+from tcp.latency import LatencyMonitor
 
 LOC_MAC_ADDR = "DEADBEEFCAFE"
 MAC_SRC = "b025aa3306fe"
@@ -18,29 +23,27 @@ dst_mac = ":".join([LOC_MAC_ADDR[i:i+2]
                     for i in range(0, len(LOC_MAC_ADDR)-1, 2)])
 src_mac = ":".join([MAC_SRC[i:i+2]
                     for i in range(0, len(MAC_SRC)-1, 2)])
+# sdram_ctrl takes about 22 cycles a word, the tests waiting fixed times
+# are sized for the single cycle reads of sdram_dummy
+SLOW_SDRAM = os.getenv("TB_SDRAM") == "model"
 
 
 class TB:
     def __init__(self, dut):
         self.dut = dut
 
-        cocotb.start_soon(self._run_clocks(dut.clk, 0, 8))
-        cocotb.start_soon(self._run_clocks(dut.clk90, 90, 8))
+        start_clock(dut.clk, 8)
+        start_clock(dut.clk90, 8, phase=90)
         dut.rst.value = cocotb.handle.Immediate(1)
         self.rgmii_phy = RgmiiPhy(dut.phy_txd, dut.phy_txctl, dut.phy_txc,
                                   dut.phy_rxd, dut.phy_rxctl, dut.phy_rxc, dut.rst, speed=1000e6)
-
-    async def _run_clocks(self, port, phase, period):
-        half_period = get_sim_steps(period / 2.0, 'ns')
-        t = Timer(half_period)
-
-        if phase > 0:
-            await Timer(phase/360.0 * period, 'ns')
-        while True:
-            port.value = cocotb.handle.Immediate(1)
-            await t
-            port.value = cocotb.handle.Immediate(0)
-            await t
+        # built with TB_SDRAM=model, sdram_ctrl reads the content from the
+        # SDRAM model and any timing violation fails the test
+        self.sdram = None
+        if hasattr(dut, "sdram_dq_in"):
+            self.sdram = SdramModel(dut, strict=True)
+            if "HTTP_CONTENT_FILE" in cocotb.plusargs:
+                self.sdram.load_hex(cocotb.plusargs["HTTP_CONTENT_FILE"])
 
     async def reset(self):
         self.dut.rst.setimmediatevalue(1)
@@ -54,33 +57,80 @@ class TB:
         self.dut.rst.value = 0
         await RisingEdge(self.dut.clk)
         await RisingEdge(self.dut.clk)
+        if self.sdram is not None:
+            # power-up delay, refresh and MRS of sdram_ctrl, about 200 us
+            await with_timeout(RisingEdge(self.dut.m.boot_done), 400, "us")
+
+
+async def connect(tb):
+    """
+    A client with a connection open to the server after reset. The model
+    is checkpointed once connected, so later runs skip reset and handshake.
+    """
+    gen = LoadGen(tb, dst_mac, src_mac, server_ip, server_port, clients=1, check=True)
+    gen.mux.start()
+    client = LoadClient(gen, gen.client_ip(0), 5000)
+
+    async def connected():
+        await tb.reset()
+        tb.dut.tcp_echo_en.value = 0
+        await client.connect()
+        # the handshake's ACK has to be through the HDL before it is saved
+        await tb.rgmii_phy.rx.wait()
+        await Timer(2, "us")
+        return {"snd_nxt": client.snd_nxt, "rcv_nxt": client.rcv_nxt}
+
+    state = await warm("connected", connected, tb.dut.clk)
+    client.snd_nxt = state["snd_nxt"]
+    client.rcv_nxt = state["rcv_nxt"]
+    return client
+
+
+async def fetch(client, path):
+    """
+    Body of the 200 response to 'path', the connection is kept open.
+    """
+    head, _, body = (await client.request(path, close=False)).partition(b"\r\n\r\n")
+    assert head.startswith(b"HTTP/1.1 200"), head
+    return body
 
 
 @cocotb.test()
 async def http_integration_small_page(dut):
     tb = TB(dut)
-
-    await tb.reset()
-    tb.dut.tcp_echo_en.value = 0
-    client_ref = []
-    client_ip = "192.168.1.1"
-    client_port = 5000
-    gen = PacketGen(client_ip, client_port)
-    tcp = TCPIntegrated(tb, False, dst_mac, src_mac)
-    cocotb.start_soon(cocotb.task.bridge(TCP_client_sim)(
-        tcp, client_ref, False, server_ip, server_port, client_ip, client_port, external_fd={"tcp": gen}))
-    await Timer(5000, "ns")
-    assert tcp.recv_count == 1
-    gen.from_bench.put(Raw("GET /0\r\n"))
-    await Timer(50, "us")
-    assert tcp.recv_count == 5
+    client = await connect(tb)
     with open("../pages/0.html", "rb") as f:
-        assert bytes(tcp.payload) == f.read().rjust(32, b'\x00')
+        assert await fetch(client, "/0") == f.read()
 
 
 @cocotb.test()
 async def http_integration_big_page(dut):
     tb = TB(dut)
+    client = await connect(tb)
+    with open("../pages/1.html", "rb") as f:
+        assert await fetch(client, "/1") == f.read()
+    assert client.stats.retransmits == 0 and client.stats.out_of_order == 0
+
+
+def split_responses(stream):
+    """
+    The responses in 'stream', each cut after its Content-Length body.
+    """
+    responses = []
+    while stream:
+        head, sep, rest = bytes(stream).partition(b"\r\n\r\n")
+        assert sep, f"unterminated headers: {head[:64]!r}"
+        length = [int(line.split(b":")[1]) for line in head.split(b"\r\n")
+                  if line.lower().startswith(b"content-length:")]
+        assert length, f"no Content-Length: {head[:64]!r}"
+        responses.append((head, rest[:length[0]]))
+        stream = rest[length[0]:]
+    return responses
+
+
+@cocotb.test(skip=SLOW_SDRAM)
+async def http_pipelined_keep_alive(dut):
+    tb = TB(dut)
 
     await tb.reset()
     tb.dut.tcp_echo_en.value = 0
@@ -93,14 +143,20 @@ async def http_integration_big_page(dut):
         tcp, client_ref, False, server_ip, server_port, client_ip, client_port, external_fd={"tcp": gen}))
     await Timer(5000, "ns")
     assert tcp.recv_count == 1
-    gen.from_bench.put(Raw("GET /1\r\n"))
-    await Timer(300, "us")
-    with open("../pages/1.html", "rb") as f:
-        assert bytes(tcp.payload) == f.read().rjust(32, b'\x00')
-    assert tcp.recv_count == 19
+    # the first response is not a whole number of words, word padding sent
+    # after it would be read by the client as the start of the second
+    gen.from_bench.put(Raw("GET /1 HTTP/1.1\r\nConnection: keep-alive\r\n\r\n"))
+    gen.from_bench.put(Raw("GET /0 HTTP/1.1\r\nConnection: keep-alive\r\n\r\n"))
+    await Timer(400, "us")
+    responses = split_responses(tcp.stream)
+    assert len(responses) == 2
+    for (head, body), name in zip(responses, ("1.html", "0.html")):
+        assert head.startswith(b"HTTP/1.1 200")
+        with open(f"../pages/{name}", "rb") as f:
+            assert body == f.read()
 
 
-@cocotb.test()
+@cocotb.test(skip=SLOW_SDRAM)
 async def http_no_path(dut):
     tb = TB(dut)
 
@@ -128,10 +184,12 @@ Accept-Encoding: gzip, deflate"""))
     await Timer(20000, "ns")
     client_ref[0].stop(wait=False)
     await Timer(5000, "ns")
-    assert tcp.recv_count == 5
+    # the HTTP/1.1 connection stays open after the 404 until the client
+    # closes it: SYN-ACK, ACK, 404, FIN-ACK
+    assert tcp.recv_count == 4
 
 
-@cocotb.test()
+@cocotb.test(skip=SLOW_SDRAM)
 async def http_no_path_during_normal(dut):
     tb = TB(dut)
 
@@ -164,10 +222,12 @@ Accept-Encoding: gzip, deflate"""))
     await Timer(20000, "ns")
     client_ref[1].stop(wait=False)
     await Timer(5000, "ns")
-    assert tcp.recv_count == 10
+    # five frames for the HTTP/0.9 request, which closes, and four for the
+    # HTTP/1.1 one, which stays open after the 404
+    assert tcp.recv_count == 9
 
 
-@cocotb.test()
+@cocotb.test(skip=SLOW_SDRAM)
 async def http_tcp_rst(dut):
     tb = TB(dut)
 
@@ -193,6 +253,64 @@ async def http_tcp_rst(dut):
     await Timer(5000, "ns")
 
 
+def write_browser_capture(path):
+    # what a browser talking to some other server on port 80 looks like
+    client = IP(src="10.1.1.2", dst="10.0.0.80")
+    server = IP(src="10.0.0.80", dst="10.1.1.2")
+    frames = [
+        (0, client / TCP(sport=41000, dport=80, flags="S", seq=100)),
+        (20000, server / TCP(sport=80, dport=41000, flags="SA", seq=7000, ack=101)),
+        (40000, client / TCP(sport=41000, dport=80, flags="A", seq=101, ack=7001)),
+        (60000, client / TCP(sport=41000, dport=80, flags="PA", seq=101, ack=7001) /
+         Raw("GET /0 HTTP/1.1\r\nHost: 10.0.0.80\r\n\r\n")),
+    ]
+    writer = PcapngWriter(path)
+    for t, pkt in frames:
+        writer.write(bytes(Ether(src="02:00:00:00:00:01", dst="02:00:00:00:00:02") / pkt), t)
+    writer.close()
+
+
+@cocotb.test()
+async def http_replay(dut):
+    tb = TB(dut)
+
+    await tb.reset()
+    tb.dut.tcp_echo_en.value = 0
+    path = os.environ.get("REPLAY_PCAP")
+    if path is None:
+        path = "replay.pcapng"
+        write_browser_capture(path)
+    replay = PcapReplay(tb, path, dst_mac, src_mac, server_ip, server_port, time_scale=0.5,
+                        max_gap_ns=100000)
+    await replay.run()
+    await Timer(50, "us")
+    assert replay.received
+    with open("../pages/0.html", "rb") as f:
+        page = f.read()
+    for response in replay.responses().values():
+        assert page in response
+
+
+@cocotb.test(skip=SLOW_SDRAM)
+async def http_load(dut):
+    tb = TB(dut)
+
+    await tb.reset()
+    tb.dut.tcp_echo_en.value = 0
+    # the HDL has a single TCB for now, so one client at a time
+    load = LoadGen(tb, dst_mac, src_mac, server_ip, server_port, mix={"/0": 3, "/1": 1},
+                   clients=1, arrival="closed", think_ns=2000, requests_per_conn=2)
+    latency = LatencyMonitor(dut.mac_instance)
+    report = await load.run(200)
+    assert report["completed"] > 0
+    assert report["completed"] == report["requests"]
+    assert report["timeouts"] == 0 and report["resets"] == 0
+    latency.stop()
+    latency.log()
+    latency.check()
+    assert latency.export()["requests"] == report["completed"]
+
+
 @cocotb.test(skip=True)
 async def http_integration_stop_during_payload(dut):
     pass
@@ -200,75 +318,10 @@ async def http_integration_stop_during_payload(dut):
 
 def test_http_integration():
     sim = os.getenv("SIM", "verilator")
+    tables = content_plusargs(".")
+    # every table content_gen.py writes except the SDRAM image is committed
+    assert len(tables) >= len(HTTP_TABLES) - 1
 
-    source_folder = "../../rtl"
-    sources = [
-        "../../config.vlt",
-        "./test_http_integration.sv",
-        f"{source_folder}/utils.sv",
-        f"{source_folder}/cache.sv",
-        f"{source_folder}/http_decode.sv",
-        f"{source_folder}/http_entry.sv",
-        f"{source_folder}/mac_encode.sv",
-        f"{source_folder}/ram_wrap.sv",
-        f"{source_folder}/slab_allocator.sv",
-        f"{source_folder}/ram_sp.sv",
-        f"{source_folder}/sdram_dummy.sv",
-        f"{source_folder}/mac_decode.sv",
-        f"{source_folder}/synchronizer.sv",
-        f"{source_folder}/ebr.sv",
-        f"{source_folder}/tcp.sv",
-        f"{source_folder}/mac.sv",
-        f"{source_folder}/mac_tx.sv",
-        f"{source_folder}/oddr.sv",
-        f"{source_folder}/iddr.sv",
-        f"{source_folder}/lfsr_rng.sv",
-        f"{source_folder}/ip_encode.sv",
-        f"{source_folder}/tcp_encode.sv",
-        f"{source_folder}/tcp_arbiter.sv",
-        f"{source_folder}/tcp_sm.sv",
-        f"{source_folder}/tcp_decode.sv",
-        f"{source_folder}/ip_decode.sv",
-        f"{source_folder}/arp_decode.sv",
-        f"{source_folder}/arp_encode.sv",
-        f"{source_folder}/rgmii_rcv.sv",
-        f"{source_folder}/rgmii_tx.sv",
-        f"{source_folder}/clk_divider.sv",
-        f"{source_folder}/delay.sv",
-        f"{source_folder}/fifo.sv",
-        f"{source_folder}/pulse_stretcher.sv",
-        f"{source_folder}/to_ack_fifo.sv",
-        f"{source_folder}/tcb.sv",
-        f"{source_folder}/crc32.sv"]
-
-    addr_file = "./addrs.mem"
-    size_file = "./lengths.mem"
-    content_file = "./content_hex.mem"
-    addr_file_abs = Path(addr_file).resolve()
-    size_file_abs = Path(size_file).resolve()
-    content_file_abs = Path(content_file).resolve()
-    assert addr_file_abs.exists() and size_file_abs.exists()
-
-    runner = get_runner(sim)
-    runner.build(
-        sources=sources,
-        hdl_toplevel="test_http_integration",
-        waves=True,
-        verbose=True,
-        includes=[f"{source_folder}/"],
-        parameters={"HTTP_ADDR_FILE": f'"{addr_file_abs}"',
-                    "HTTP_SIZE_FILE": f'"{size_file_abs}"',
-                    "HTTP_CONTENT_FILE": f'"{content_file_abs}"',
-                    },
-        build_args=["--threads", "8", "--trace-fst",
-                    "--trace-structs", "--bbox-unsup",
-                    "-y", "/home/bawj/lscc/diamond/3.14/cae_library/simulation/verilog/ecp5u/",
-                    "-y", "/home/bawj/lscc/diamond/3.14/cae_library/simulation/vhdl/ecp5u/", "--timing"
-                    ] if sim == "verilator" else [
-            "-y/home/bawj/lscc/diamond/3.14/cae_library/simulation/verilog/ecp5u/"],
-        timescale=("1ns", "1ps"),
-    )
-
-    runner.test(waves=True,
-                verbose=True,
-                hdl_toplevel="test_http_integration", test_module="test_http_integration")
+    # savable, the page tests restore the model after the handshake
+    run_profiled(sim, dict(integration_build_kwargs(sim, sdram_model=None), savable=True),
+                 dict(plusargs=tables, hdl_toplevel=TOPLEVEL, test_module="test_http_integration"))
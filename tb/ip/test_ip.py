@@ -7,9 +7,9 @@ import cocotb
 import socket
 from scapy.all import IP
 from cocotb.runner import get_runner
-from cocotb.clock import Clock
 from cocotb.triggers import RisingEdge
 from cocotb.binary import BinaryValue
+from common.clocks import start_clock
 
 LOC_MAC_ADDR = "DEADBEEFCAFE"
 LP_MAC_ADDR = "FEEDBABEFACE"
@@ -20,7 +20,7 @@ class TB:
 
         self.log = logging.getLogger("cocotb.tb")
         self.log.setLevel(logging.DEBUG)
-        cocotb.start_soon(Clock(dut.clk, 8, units='ns').start())
+        start_clock(dut.clk, 8)
 
     async def reset(self, signal):
         signal.setimmediatevalue(0)
@@ -3,9 +3,9 @@ import cocotb
 import os
 from cocotbext.eth import GmiiFrame, RgmiiPhy
 from cocotb.triggers import RisingEdge, with_timeout, ReadWrite, SimTimeoutError
-from cocotb.clock import Clock, Timer
-from cocotb.utils import get_sim_time, get_sim_steps
-from cocotb_tools.runner import get_runner
+from cocotb.utils import get_sim_time
+from common.clocks import start_clock
+from common.profiles import run_profiled
 from scapy.all import Raw, RandString, Ether, TCP, IP
 import itertools
 import logging
@@ -25,27 +25,15 @@ class TB:
         self.log.setLevel(logging.DEBUG)
 
         if speed_100:
-            cocotb.start_soon(Clock(dut.clk, 40, units='ns').start())
-            cocotb.start_soon(self._run_clocks(dut.clk90, 90, 40))
+            start_clock(dut.clk, 40)
+            start_clock(dut.clk90, 40, phase=90)
         else:
-            cocotb.start_soon(self._run_clocks(dut.clk, 0, 8))
-            cocotb.start_soon(self._run_clocks(dut.clk90, 90, 8))
+            start_clock(dut.clk, 8)
+            start_clock(dut.clk90, 8, phase=90)
         dut.rst.value = cocotb.handle.Immediate(1)
         self.rgmii_phy = RgmiiPhy(dut.phy_txd, dut.phy_txctl, dut.phy_txc,
                                   dut.phy_rxd, dut.phy_rxctl, dut.phy_rxc, dut.rst, speed=100e6 if speed_100 else 1000e6)
 
-    async def _run_clocks(self, port, phase, period):
-        half_period = get_sim_steps(period / 2.0, 'ns')
-        t = Timer(half_period)
-
-        if phase > 0:
-            await Timer(phase/360.0 * period, 'ns')
-        while True:
-            port.value = cocotb.handle.Immediate(1)
-            await t
-            port.value = cocotb.handle.Immediate(0)
-            await t
-
     async def reset(self):
         self.dut.rst.setimmediatevalue(1)
         await RisingEdge(self.dut.clk)
@@ -202,23 +190,14 @@ def test_simple_dff_runner(speed_100):
         f"{source_folder}/clk_divider.sv",
         f"{source_folder}/crc32.sv"]
 
-    runner = get_runner(sim)
-    runner.build(
-        sources=sources,
-        hdl_toplevel="test_mac",
-        always=True,
-        clean=True,
-        waves=True,
-        verbose=True,
-        defines={"SPEED_100M": "True"} if speed_100 else {},
-        includes=[f"{source_folder}/"],
-        build_args=["--threads", "8", "--trace-fst",
-                    "--trace-structs"] if sim == "verilator" else [
-            "-y/home/bawj/lscc/diamond/3.14/cae_library/simulation/verilog/ecp5u/"],
-        timescale=("1ns", "1ps"),
-    )
-
-    runner.test(waves=True,
-                verbose=True,
-                extra_env={"SPEED_100M": "True"} if speed_100 else {},
-                hdl_toplevel="test_mac", test_module="test_mac")
+    run_profiled(
+        sim,
+        dict(sources=sources,
+             hdl_toplevel="test_mac",
+             defines={"SPEED_100M": "True"} if speed_100 else {},
+             includes=[f"{source_folder}/"],
+             build_args=["--threads", "8"] if sim == "verilator" else [
+                 "-y/home/bawj/lscc/diamond/3.14/cae_library/simulation/verilog/ecp5u/"],
+             timescale=("1ns", "1ps")),
+        dict(extra_env={"SPEED_100M": "True"} if speed_100 else {},
+             hdl_toplevel="test_mac", test_module="test_mac"))
@@ -5,9 +5,9 @@ import pytest
 
 import cocotb
 from cocotb.runner import get_runner
-from cocotb.clock import Clock
 from cocotb.triggers import RisingEdge, with_timeout, First
 from cocotbext.eth import GmiiFrame, RgmiiSource
+from common.clocks import start_clock
 
 class TB:
     def __init__(self, dut, speed_100):
@@ -15,8 +15,8 @@ class TB:
 
         self.log = logging.getLogger("cocotb.tb")
         self.log.setLevel(logging.DEBUG)
-        cocotb.start_soon(Clock(dut.clk, 8 if speed_100 else 40, units='ns').start())
-        cocotb.start_soon(Clock(dut.phy_rxc, 8 if speed_100 else 40, units='ns').start())
+        start_clock(dut.clk, 8 if speed_100 else 40)
+        start_clock(dut.phy_rxc, 8 if speed_100 else 40)
         self.source = RgmiiSource(dut.phy_rxd, dut.phy_rxctl, dut.phy_rxc, dut.rst)
         self.source.mii_mode = speed_100 is not None
 
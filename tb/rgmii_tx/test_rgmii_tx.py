@@ -5,10 +5,10 @@ import logging
 
 import cocotb
 from cocotb.runner import get_runner
-from cocotb.clock import Clock
 from cocotb.triggers import RisingEdge
 from cocotbext.eth import GmiiFrame, RgmiiSink
 from cocotb.binary import BinaryValue
+from common.clocks import start_clock
 
 class TB:
     def __init__(self, dut, speed_100):
@@ -16,7 +16,7 @@ class TB:
 
         self.log = logging.getLogger("cocotb.tb")
         self.log.setLevel(logging.DEBUG)
-        cocotb.start_soon(Clock(dut.clk, 8, units='ns').start())
+        start_clock(dut.clk, 8)
         self.sink = RgmiiSink(dut.phy_txd, dut.phy_txctl, dut.phy_txc, dut.rst)
         self.sink.mii_mode = speed_100 is not None
 
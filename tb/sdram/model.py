@@ -0,0 +1,266 @@
+"""
+Behavioral model of the SDRAM chip behind sdram_ctrl.
+
+The model decodes the commands on the SDRAM pins at each rising edge of the
+clock, answers READs after the CAS latency set by the last MRS and stores
+WRITEs. Its contents can be preloaded through a backdoor, from a $readmemh
+file such as content_hex.mem or a binary image, with no simulated copy.
+
+Each command is checked against the timing of the part: tRCD from ACTIVATE
+to READ/WRITE, tRP from PRECHARGE to ACTIVATE/REFRESH, tRAS from ACTIVATE
+to PRECHARGE, tRFC after REFRESH and the interval between refreshes, along
+with the bank state (ACTIVATE to an open bank, access to a closed one).
+sdram_ctrl holds its command outputs for the whole state, so a command
+repeated on consecutive cycles is taken as one, issued on its first cycle.
+
+Verilator does not take drivers of a top level inout from outside, so the
+wrapper puts the model on the data bus as a second tristate driver,
+'<prefix>dq_in' enabled by '<prefix>dq_in_en', and exposes the resolved
+bus as '<prefix>dq'.
+"""
+from array import array
+from pathlib import Path
+
+import cocotb
+from cocotb.triggers import RisingEdge
+from cocotb.utils import get_sim_time
+
+# (ras_n, cas_n, we_n)
+COMMANDS = {
+    (1, 1, 1): "NOP",
+    (0, 1, 1): "ACTIVATE",
+    (1, 0, 1): "READ",
+    (1, 0, 0): "WRITE",
+    (0, 1, 0): "PRECHARGE",
+    (0, 0, 1): "REFRESH",
+    (0, 0, 0): "MRS",
+    (1, 1, 0): "BURST_STOP",
+}
+BANKS = 4
+ROW_BITS = 11
+COL_BITS = 8
+# words per bank, addressed as row << COL_BITS | col like the controller's
+BANK_WORDS = 1 << (ROW_BITS + COL_BITS)
+
+
+class SdramTiming:
+    """
+    Timing of the part in ns. The defaults are those sdram_ctrl is written
+    against, with refreshes due every 64 ms / 4096 rows.
+    """
+
+    def __init__(self, t_rcd=18, t_rp=18, t_ras=42, t_rfc=55, t_refi=15_625):
+        self.t_rcd = t_rcd
+        self.t_rp = t_rp
+        self.t_ras = t_ras
+        self.t_rfc = t_rfc
+        self.t_refi = t_refi
+
+
+class Bank:
+    def __init__(self):
+        self.row = None
+        self.last_row = None
+        self.activated = None
+        self.precharged = None
+        self.accessed = False
+
+
+class SdramModel:
+    """
+    Attaches to the pins '<prefix>ras_n', '<prefix>cas_n', '<prefix>we_n',
+    '<prefix>ba', '<prefix>addr' and the data bus of 'dut', sampled on
+    '<prefix>clk'. 'cas_latency' applies until an MRS is seen, e.g. after a
+    checkpoint restore. Commands before the first PRECHARGE are not checked,
+    as the model may be attached at power-up or in the middle of a request.
+    With 'strict' the first violation fails the test, otherwise they are
+    collected in 'violations'.
+    """
+
+    def __init__(self, dut, prefix="sdram_", timing=None, cas_latency=3, strict=False):
+        self.timing = timing or SdramTiming()
+        self.cas_latency = cas_latency
+        self.strict = strict
+        self.mem = array("I", bytes(4 * BANKS * BANK_WORDS))
+        self.banks = [Bank() for _ in range(BANKS)]
+        self.violations = []
+        self.counts = {cmd: 0 for cmd in COMMANDS.values()}
+        # requests that found their row open, that had to open it, and of
+        # those, the ones reopening the row last closed in the bank
+        self.row_hits = 0
+        self.row_misses = 0
+        self.row_reopens = 0
+        self.refresh_intervals = []
+        self._last_refresh = None
+        self._last_cmd = None
+        self._synced = False
+        self._reads = {}
+        self._cycle = 0
+        self._pins = [getattr(dut, prefix + name) for name in ("ras_n", "cas_n", "we_n")]
+        self._ba = getattr(dut, prefix + "ba")
+        self._addr = getattr(dut, prefix + "addr")
+        self._dq = getattr(dut, prefix + "dq")
+        self._dq_in = getattr(dut, prefix + "dq_in")
+        self._dq_in_en = getattr(dut, prefix + "dq_in_en")
+        self._dq_in_en.value = 0
+        self._task = cocotb.start_soon(self._run(getattr(dut, prefix + "clk")))
+
+    def stop(self):
+        self._task.cancel()
+
+    # backdoor
+
+    def load_hex(self, path, bank=0, base=0):
+        """
+        Loads a $readmemh file of 32 bit words, such as content_hex.mem.
+        """
+        index = base
+        for line in Path(path).read_text().splitlines():
+            for token in line.split("//")[0].split():
+                if token.startswith("@"):
+                    index = base + int(token[1:], 16)
+                    continue
+                self.poke(index, int(token.replace("_", ""), 16), bank)
+                index += 1
+        return index - base
+
+    def load_binary(self, image, bank=0, base=0):
+        """
+        Loads little endian 32 bit words from 'image', bytes or a path.
+        """
+        if not isinstance(image, (bytes, bytearray)):
+            image = Path(image).read_bytes()
+        words = array("I")
+        words.frombytes(bytes(image) + bytes(-len(image) % 4))
+        if array("I", [1]).tobytes() != b"\x01\x00\x00\x00":
+            words.byteswap()
+        start = bank * BANK_WORDS + base
+        self.mem[start:start + len(words)] = words
+        return len(words)
+
+    def peek(self, address, bank=0):
+        return self.mem[bank * BANK_WORDS + address]
+
+    def poke(self, address, value, bank=0):
+        self.mem[bank * BANK_WORDS + address] = value
+
+    # checks
+
+    def _violation(self, message):
+        message = f"{get_sim_time('ns'):.0f} ns: {message}"
+        if self.strict:
+            raise AssertionError(message)
+        self.violations.append(message)
+        cocotb.log.warning(f"sdram: {message}")
+
+    def _since(self, then, now, limit, what):
+        if then is not None and now - then < limit:
+            self._violation(f"{what} after {now - then:.0f} ns, needs {limit} ns")
+
+    def _refresh_busy(self, now, cmd):
+        self._since(self._last_refresh, now, self.timing.t_rfc, f"{cmd} during tRFC,")
+
+    async def _run(self, clk):
+        while True:
+            await RisingEdge(clk)
+            self._cycle += 1
+            # values before the edge, what the chip samples
+            try:
+                key = tuple(int(p.value) for p in self._pins)
+                ba, addr = int(self._ba.value), int(self._addr.value)
+            except ValueError:
+                continue
+            cmd = COMMANDS[key]
+            if cmd == "READ":
+                self._reads[self._cycle + self.cas_latency - 1] = self._word(ba, addr)
+            if cmd == "WRITE":
+                self._write(ba, addr)
+            data = self._reads.pop(self._cycle, None)
+            if data is not None:
+                self._dq_in.value = data
+            self._dq_in_en.value = data is not None
+            issued = (cmd, ba, addr)
+            self._synced |= cmd == "PRECHARGE"
+            if self._synced and cmd != "NOP" and issued != self._last_cmd:
+                self._issue(cmd, ba, addr, get_sim_time("ns"))
+            self._last_cmd = issued
+
+    def _word(self, ba, addr):
+        bank = self.banks[ba]
+        if bank.row is None:
+            return 0
+        return self.mem[ba * BANK_WORDS + (bank.row << COL_BITS | (addr & 0xFF))]
+
+    def _write(self, ba, addr):
+        bank = self.banks[ba]
+        if bank.row is None or not self._dq.value.is_resolvable:
+            return
+        self.mem[ba * BANK_WORDS + (bank.row << COL_BITS | (addr & 0xFF))] = int(self._dq.value)
+
+    def _issue(self, cmd, ba, addr, now):
+        t = self.timing
+        bank = self.banks[ba]
+        self.counts[cmd] += 1
+        if cmd == "ACTIVATE":
+            self._refresh_busy(now, cmd)
+            if bank.row is not None:
+                self._violation(f"ACTIVATE to bank {ba} with row {bank.row} open")
+            self._since(bank.precharged, now, t.t_rp, "ACTIVATE")
+            bank.row, bank.activated, bank.accessed = addr, now, False
+        elif cmd in ("READ", "WRITE"):
+            self._refresh_busy(now, cmd)
+            if bank.row is None:
+                self._violation(f"{cmd} to bank {ba} with no open row")
+                return
+            self._since(bank.activated, now, t.t_rcd, cmd)
+            if bank.accessed:
+                self.row_hits += 1
+            else:
+                self.row_misses += 1
+                self.row_reopens += bank.row == bank.last_row
+            bank.accessed = True
+        elif cmd == "PRECHARGE":
+            self._refresh_busy(now, cmd)
+            # A10 precharges every bank
+            for b in (self.banks if addr & (1 << 10) else [bank]):
+                if b.row is not None:
+                    self._since(b.activated, now, t.t_ras, "PRECHARGE")
+                    b.last_row, b.row = b.row, None
+                b.precharged = now
+        elif cmd == "REFRESH":
+            self._refresh_busy(now, cmd)
+            for i, b in enumerate(self.banks):
+                if b.row is not None:
+                    self._violation(f"REFRESH with row {b.row} open in bank {i}")
+                self._since(b.precharged, now, t.t_rp, "REFRESH")
+            if self._last_refresh is not None:
+                interval = now - self._last_refresh
+                self.refresh_intervals.append(interval)
+                if interval > t.t_refi:
+                    self._violation(f"refresh interval of {interval:.0f} ns, max {t.t_refi} ns")
+            self._last_refresh = now
+        elif cmd == "MRS":
+            self._refresh_busy(now, cmd)
+            if any(b.row is not None for b in self.banks):
+                self._violation("MRS with a row open")
+            self.cas_latency = (addr >> 4) & 0x7
+
+    def report(self):
+        requests = self.row_hits + self.row_misses
+        return {
+            "commands": {cmd: n for cmd, n in self.counts.items() if n and cmd != "NOP"},
+            "requests": requests,
+            "row_hits": self.row_hits,
+            "row_misses": self.row_misses,
+            "row_reopens": self.row_reopens,
+            "hit_rate": self.row_hits / requests if requests else 0.0,
+            "max_refresh_interval_ns": max(self.refresh_intervals, default=None),
+            "violations": len(self.violations),
+        }
+
+    def log(self):
+        r = self.report()
+        cocotb.log.info(f"sdram: {r['requests']} requests, {r['row_hits']} row hits, "
+                        f"{r['row_misses']} misses ({r['row_reopens']} of an already open row), "
+                        f"{r['violations']} timing violations")
+        return r
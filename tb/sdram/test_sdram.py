@@ -1,32 +1,22 @@
 import pytest
 import cocotb
 import os
+import random
 from pathlib import Path
-from cocotb.triggers import RisingEdge, with_timeout, ReadWrite
-from cocotb.clock import Clock, Timer
-from cocotb.utils import get_sim_steps
-from cocotb_tools.runner import get_runner
+from cocotb.triggers import RisingEdge, with_timeout, ReadWrite, Timer
+from common.clocks import start_clock
+from common.checkpoint import warm
+from common.profiles import run_profiled
+from sdram.model import SdramModel
 
 
 class TB:
     def __init__(self, dut):
         self.dut = dut
 
-        cocotb.start_soon(self._run_clocks(dut.clk, 0, 8))
+        start_clock(dut.clk, 8)
         dut.rst.value = cocotb.handle.Immediate(1)
 
-    async def _run_clocks(self, port, phase, period):
-        half_period = get_sim_steps(period / 2.0, 'ns')
-        t = Timer(half_period)
-
-        if phase > 0:
-            await Timer(phase/360.0 * period, 'ns')
-        while True:
-            port.value = cocotb.handle.Immediate(1)
-            await t
-            port.value = cocotb.handle.Immediate(0)
-            await t
-
     async def reset(self):
         self.dut.rst.setimmediatevalue(1)
         await RisingEdge(self.dut.clk)
@@ -40,11 +30,35 @@ class TB:
         await RisingEdge(self.dut.clk)
         await RisingEdge(self.dut.clk)
 
+    async def boot(self):
+        """
+        Reset, power-up delay and the refresh and MRS sequence of the
+        controller, about 200 us.
+        """
+        await self.reset()
+        await with_timeout(RisingEdge(self.dut.m.mrs_done), 400, "us")
+        return {}
+
+    async def write(self, ad, data):
+        self.dut.wr_ad.value = ad
+        self.dut.wr_data.value = data
+        self.dut.wr_req.value = 1
+        await with_timeout(RisingEdge(self.dut.wr_granted), 20, "us")
+        self.dut.wr_req.value = 0
+
+    async def read(self, ad):
+        self.dut.rd_ad.value = ad
+        self.dut.rd_req.value = 1
+        await with_timeout(RisingEdge(self.dut.rd_granted), 20, "us")
+        self.dut.rd_req.value = 0
+        await with_timeout(RisingEdge(self.dut.rd_valid), 1, "us")
+        return int(self.dut.rd_data.value)
+
 
 @cocotb.test()
 async def sdram_ctrl(dut):
     tb = TB(dut)
-    await tb.reset()
+    await warm("booted", tb.boot, dut.clk)
     dut.wr_req.value = 1
     dut.wr_ad.value = 0x7CAFE
     await with_timeout(RisingEdge(dut.wr_granted), 400, "us")
@@ -74,6 +88,113 @@ async def sdram_ctrl(dut):
     await Timer(500, "ns")
 
 
+@cocotb.test()
+async def sdram_model(dut):
+    """
+    Reads of preloaded content and of writes through the controller,
+    checked against the SDRAM model, over a few refresh intervals.
+    """
+    tb = TB(dut)
+    dut.wr_req.value = 0
+    dut.rd_req.value = 0
+    await warm("booted", tb.boot, dut.clk)
+    model = SdramModel(dut)
+    rng = random.Random(0)
+    image = rng.randbytes(4 * 1024)
+    model.load_binary(image, base=0x100)
+    for ad in [0x100, 0x101, 0x1FF, 0x2FF, 0x4FF, 0x100]:
+        assert await tb.read(ad) == model.peek(ad), hex(ad)
+
+    written = {}
+    for _ in range(16):
+        ad = rng.choice([0x7CA00, 0x7CB00]) | rng.randrange(256)
+        written[ad] = rng.getrandbits(32)
+        await tb.write(ad, written[ad])
+    for ad, data in written.items():
+        assert model.peek(ad) == data, hex(ad)
+        assert await tb.read(ad) == data, hex(ad)
+
+    await Timer(40, "us")
+    report = model.log()
+    model.stop()
+    assert report["commands"]["REFRESH"] >= 2
+    assert not model.violations, model.violations
+    assert report["requests"] == 6 + 16 + len(written)
+
+
+@cocotb.test()
+async def sdram_write_data_latched(dut):
+    """
+    The word written is wr_data at grant, not what the requester drives by
+    the time the WRITE goes out.
+    """
+    tb = TB(dut)
+    dut.wr_req.value = 0
+    dut.rd_req.value = 0
+    await warm("booted", tb.boot, dut.clk)
+    model = SdramModel(dut)
+    dut.wr_ad.value = 0x123
+    dut.wr_data.value = 0xCAFEF00D
+    dut.wr_req.value = 1
+    await with_timeout(RisingEdge(dut.wr_granted), 20, "us")
+    dut.wr_req.value = 0
+    dut.wr_data.value = 0xDEADBEEF
+    await Timer(1, "us")
+    model.stop()
+    assert model.peek(0x123) == 0xCAFEF00D, hex(model.peek(0x123))
+
+
+@cocotb.test()
+async def sdram_precharge_after_idle(dut):
+    """
+    A request after a long idle still waits tRP between PRECHARGE and
+    ACTIVATE.
+    """
+    tb = TB(dut)
+    dut.wr_req.value = 0
+    dut.rd_req.value = 0
+    await warm("booted", tb.boot, dut.clk)
+    model = SdramModel(dut)
+    await tb.read(0x100)
+    await Timer(5, "us")
+    await tb.read(0x200)
+    model.stop()
+    t_rp = [v for v in model.violations if v.endswith(f"needs {model.timing.t_rp} ns")]
+    assert not t_rp, t_rp
+
+
+@cocotb.test()
+async def sdram_refresh_interval(dut):
+    """
+    Refreshes come at least every 15.6 us while idle.
+    """
+    tb = TB(dut)
+    await warm("booted", tb.boot, dut.clk)
+    model = SdramModel(dut)
+    await Timer(4 * model.timing.t_refi + 1000, "ns")
+    model.stop()
+    assert len(model.refresh_intervals) >= 3
+    assert max(model.refresh_intervals) <= model.timing.t_refi, model.refresh_intervals
+
+
+@cocotb.test()
+async def sdram_refresh_trfc(dut):
+    """
+    Requests behind a refresh wait tRFC. The refresh is one command, not one
+    at each end of the wait.
+    """
+    tb = TB(dut)
+    dut.wr_req.value = 0
+    dut.rd_req.value = 0
+    await warm("booted", tb.boot, dut.clk)
+    model = SdramModel(dut)
+    while len(model.refresh_intervals) < 2:
+        await tb.read(0x100)
+    model.stop()
+    t_rfc = [v for v in model.violations if v.endswith(f"needs {model.timing.t_rfc} ns")]
+    assert not t_rfc, t_rfc
+
+
 def test_sdram():
     sim = os.getenv("SIM", "verilator")
 
@@ -83,19 +204,12 @@ def test_sdram():
         "./test_sdram.sv",
     ]
 
-    runner = get_runner(sim)
-    runner.build(
-        sources=sources,
-        hdl_toplevel="test_sdram",
-        waves=True,
-        verbose=True,
-        includes=[f"{source_folder}/"],
-        build_args=["--threads", "8", "--trace-fst",
-                    "--trace-structs"] if sim == "verilator" else [],
-        timescale=("1ns", "1ps"),
-    )
-
-    runner.test(waves=True,
-                verbose=True,
-                hdl_toplevel="test_sdram", test_module="test_sdram")
-
+    run_profiled(
+        sim,
+        dict(sources=sources,
+             hdl_toplevel="test_sdram",
+             includes=[f"{source_folder}/"],
+             build_args=["--threads", "8"] if sim == "verilator" else [],
+             timescale=("1ns", "1ps"),
+             savable=True),
+        dict(hdl_toplevel="test_sdram", test_module="test_sdram"))
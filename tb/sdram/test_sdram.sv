@@ -17,8 +17,13 @@ module test_sdram (
     output wire sdram_ras_n,
     output wire sdram_clk,
     output wire [31:0] sdram_dq,
+    // driven by the SDRAM model while it returns read data
+    input wire [31:0] sdram_dq_in,
+    input wire sdram_dq_in_en,
     output wire [10:0] sdram_addr
 );
+  assign sdram_dq = sdram_dq_in_en ? sdram_dq_in : 32'hzzzzzzzz;
+
   sdram_ctrl m (
       .clk(clk),
       .rst(rst),
@@ -2,31 +2,18 @@ import pytest
 import cocotb
 import os
 from pathlib import Path
-from cocotb.triggers import RisingEdge, with_timeout, ReadWrite
-from cocotb.clock import Clock, Timer
-from cocotb.utils import get_sim_steps
+from cocotb.triggers import RisingEdge, with_timeout, ReadWrite, Timer
 from cocotb_tools.runner import get_runner
+from common.clocks import start_clock
 
 
 class TB:
     def __init__(self, dut):
         self.dut = dut
 
-        cocotb.start_soon(self._run_clocks(dut.clk, 0, 8))
+        start_clock(dut.clk, 8)
         dut.rst.value = cocotb.handle.Immediate(1)
 
-    async def _run_clocks(self, port, phase, period):
-        half_period = get_sim_steps(period / 2.0, 'ns')
-        t = Timer(half_period)
-
-        if phase > 0:
-            await Timer(phase/360.0 * period, 'ns')
-        while True:
-            port.value = cocotb.handle.Immediate(1)
-            await t
-            port.value = cocotb.handle.Immediate(0)
-            await t
-
     async def reset(self):
         self.dut.rst.setimmediatevalue(1)
         await RisingEdge(self.dut.clk)
@@ -4,9 +4,9 @@ import hashlib
 
 import cocotb
 from cocotb.runner import get_runner
-from cocotb.clock import Timer, Clock
 from cocotb.binary import BinaryValue
 from cocotb.triggers import RisingEdge
+from common.clocks import start_clock
 
 tv = [0x61626380, 0x00000000, 0x00000000, 0x00000000,
       0x00000000, 0x00000000, 0x00000000, 0x00000000,
@@ -29,7 +29,7 @@ class TB:
 
         self.log = logging.getLogger("cocotb.tb")
         self.log.setLevel(logging.DEBUG)
-        cocotb.start_soon(Clock(dut.clk, 8, units='ns').start())
+        start_clock(dut.clk, 8)
 
     async def reset(self):
         self.dut.rst.value = 1
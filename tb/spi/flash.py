@@ -0,0 +1,145 @@
+"""
+Byte-granular model of the SPI flash that holds the bitstream and the
+content image.
+
+The flash image is memory mapped, so a full content image can be read by
+the simulated flash2sdram copy without loading it. The pins are handled by
+spi_flash_port.sv in the wrapper: it shifts in the instruction and the
+address and shifts out blocks of data, so Python only wakes up on the
+instruction, the address and once per block instead of on every sclk edge.
+
+Supported instructions, as in the W25Q128JV datasheet:
+
+  0x03 read             address, data on io[1]
+  0x0B fast read        address, 8 dummy clocks, data on io[1]
+  0x6B fast read quad   address, 8 dummy clocks, data on io[3:0]
+  0x9F JEDEC ID         the ID bytes, repeated
+
+Reads wrap around at the end of the flash, and bytes past the end of the
+image read as erased (0xFF).
+"""
+import mmap
+from pathlib import Path
+
+import cocotb
+from cocotb.triggers import FallingEdge, First, RisingEdge, ValueChange
+
+READ = 0x03
+FAST_READ = 0x0B
+FAST_READ_QUAD = 0x6B
+JEDEC_ID = 0x9F
+
+# instruction: (dummy clocks, quad)
+READS = {
+    READ: (0, False),
+    FAST_READ: (8, False),
+    FAST_READ_QUAD: (8, True),
+}
+
+
+class SpiFlash:
+    """
+    Attaches to the spi_flash_port signals '<prefix>hdr', '<prefix>cmd_valid',
+    '<prefix>addr_valid', '<prefix>arm', '<prefix>quad', '<prefix>lead',
+    '<prefix>next_block' and '<prefix>block_req' of 'dut', with chip select
+    on 'cs'. 'image' is a path, mapped read only, or bytes. 'size' is the
+    flash size in bytes, 16 MiB by default.
+    """
+
+    def __init__(self, dut, image=b"", prefix="flash_", cs="cs", size=1 << 24,
+                 jedec_id=b"\xef\x40\x18"):
+        self.size = size
+        self.jedec_id = bytes(jedec_id)
+        # (instruction, address or None) of every transaction
+        self.transactions = []
+        self.blocks = 0
+        self._file = None
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            self.image = memoryview(bytes(image))
+        else:
+            self._file = open(Path(image), "rb")
+            self.image = memoryview(mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ))
+        self._cs = getattr(dut, cs)
+        self._hdr = getattr(dut, prefix + "hdr")
+        self._cmd_valid = getattr(dut, prefix + "cmd_valid")
+        self._addr_valid = getattr(dut, prefix + "addr_valid")
+        self._arm = getattr(dut, prefix + "arm")
+        self._quad = getattr(dut, prefix + "quad")
+        self._lead = getattr(dut, prefix + "lead")
+        self._next_block = getattr(dut, prefix + "next_block")
+        self._block_req = getattr(dut, prefix + "block_req")
+        self.block_bytes = len(self._next_block) // 8
+        self._arm.value = 0
+        self._quad.value = 0
+        self._lead.value = 0
+        self._task = cocotb.start_soon(self._run())
+
+    def stop(self):
+        self._task.cancel()
+        if self._file is not None:
+            self.image.release()
+            self._file.close()
+
+    def read(self, address, length):
+        """
+        'length' bytes from 'address', as a read instruction returns them.
+        """
+        out = bytearray()
+        while len(out) < length:
+            address %= self.size
+            chunk = bytes(self.image[address:address + length - len(out)])
+            if not chunk:
+                chunk = b"\xff" * min(length - len(out), self.size - address)
+            out += chunk
+            address += len(chunk)
+        return bytes(out)
+
+    def _schedule(self, cmd, address):
+        """
+        The data of a transaction, one block at a time.
+        """
+        n = self.block_bytes
+        if cmd == JEDEC_ID:
+            ids = self.jedec_id * (n // len(self.jedec_id) + 2)
+            offset = 0
+            while True:
+                yield ids[offset:offset + n]
+                offset = (offset + n) % len(self.jedec_id)
+        while True:
+            yield self.read(address, n)
+            address += n
+
+    async def _run(self):
+        while True:
+            await FallingEdge(self._cs)
+            await self._transaction()
+            self._arm.value = 0
+
+    async def _transaction(self):
+        end = RisingEdge(self._cs)
+        if await First(RisingEdge(self._cmd_valid), end) is end:
+            return
+        cmd = int(self._hdr.value) & 0xFF
+        address = None
+        if cmd in READS:
+            if await First(RisingEdge(self._addr_valid), end) is end:
+                self.transactions.append((cmd, None))
+                return
+            address = int(self._hdr.value) & 0xFFFFFF
+        self.transactions.append((cmd, address))
+        if cmd not in READS and cmd != JEDEC_ID:
+            cocotb.log.warning(f"flash: unsupported instruction {cmd:#04x}")
+            await end
+            return
+
+        dummy, quad = READS.get(cmd, (0, False))
+        blocks = self._schedule(cmd, address)
+        self._next_block.value = int.from_bytes(next(blocks), "big")
+        self._lead.value = dummy
+        self._quad.value = quad
+        # data starts on the next falling edge, the one after the last
+        # address bit
+        self._arm.value = 1
+        while await First(ValueChange(self._block_req), end) is not end:
+            self.blocks += 1
+            self._next_block.value = int.from_bytes(next(blocks), "big")
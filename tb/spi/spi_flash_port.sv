@@ -0,0 +1,76 @@
+`default_nettype none
+/**
+* Pin side of the SPI flash model in flash.py.
+*
+* Shifts in the instruction and address on rising sclk, raising cmd_valid
+* after 8 bits and addr_valid after 32, and shifts data out on falling
+* sclk, one bit on io[1] or, with quad, one nibble on io[3:0].
+* Data comes in blocks of BLOCK_BYTES written by Python to next_block, so
+* Python only wakes up once per block: after arm, lead falling edges are
+* skipped (dummy clocks), then next_block is taken and block_req toggles to
+* ask for the following one.
+*/
+module spi_flash_port #(
+    parameter int BLOCK_BYTES = 64
+) (
+    input wire sclk,
+    input wire cs_n,
+    input wire mosi,
+    output wire [3:0] io,
+
+    // instruction in hdr[7:0] on cmd_valid, address in hdr[23:0] on addr_valid
+    output reg [31:0] hdr,
+    output wire cmd_valid,
+    output wire addr_valid,
+
+    input wire arm,
+    input wire quad,
+    input wire [7:0] lead,
+    input wire [BLOCK_BYTES*8-1:0] next_block,
+    output reg block_req = 0
+);
+  localparam int BITS = BLOCK_BYTES * 8;
+
+  reg [5:0] hdr_bits;
+  assign cmd_valid  = hdr_bits >= 'd8;
+  assign addr_valid = hdr_bits == 'd32;
+
+  always @(posedge sclk or posedge cs_n) begin
+    if (cs_n) begin
+      hdr_bits <= '0;
+    end else if (hdr_bits != 'd32) begin
+      hdr <= {hdr[30:0], mosi};
+      hdr_bits <= hdr_bits + 'd1;
+    end
+  end
+
+  reg [BITS-1:0] cur = '0;
+  reg [$clog2(BITS):0] left = '0;
+  reg [7:0] wait_n;
+  reg started, loaded;
+  wire [2:0] step = quad ? 'd4 : 'd1;
+  assign io = quad ? cur[BITS-1-:4] : {2'b0, cur[BITS-1], 1'b0};
+
+  always @(negedge sclk or posedge cs_n) begin
+    if (cs_n) begin
+      started <= 0;
+      loaded  <= 0;
+      wait_n  <= '0;
+    end else if (arm) begin
+      started <= 1;
+      if (!started && lead != 0) begin
+        wait_n <= lead - 'd1;
+      end else if (started && wait_n != 0) begin
+        wait_n <= wait_n - 'd1;
+      end else if (!loaded || left == step) begin
+        cur <= next_block;
+        left <= BITS;
+        loaded <= 1;
+        block_req <= ~block_req;
+      end else begin
+        cur  <= cur << step;
+        left <= left - step;
+      end
+    end
+  end
+endmodule
@@ -1,18 +1,26 @@
 import os
+import random
+import tempfile
+from pathlib import Path
+
 import cocotb
-from cocotb_tools.runner import get_runner
-from cocotb.clock import Clock, Timer
-from cocotb.utils import get_sim_steps
-from cocotb.triggers import RisingEdge, FallingEdge, with_timeout, First
-from cocotbext.spi import SpiSlaveBase, SpiBus, SpiConfig, SpiFrameError
+from cocotb.triggers import RisingEdge, Timer, with_timeout
+
+from common.clocks import start_clock
+from common.profiles import run_profiled
+from spi.flash import FAST_READ, FAST_READ_QUAD, JEDEC_ID, READ, SpiFlash
+
+# top.sv
+OFFSET_IN_FLASH = 0x40000
+CONTENT_HEADER_BYTES = 0x1000
 
 
 class TB:
-    def __init__(self, dut):
+    def __init__(self, dut, sclk_en=None):
         self.dut = dut
 
-        cocotb.start_soon(self._run_clocks(dut.clk, 0, 8))
-        cocotb.start_soon(self._run_clocks(dut.sclk, 90, 8))
+        start_clock(dut.clk, 8)
+        self.sclk = start_clock(dut.sclk, 8, phase=90, enable=sclk_en)
 
     async def reset(self):
         self.dut.rst.setimmediatevalue(1)
@@ -27,165 +35,165 @@ class TB:
         await RisingEdge(self.dut.clk)
         await RisingEdge(self.dut.clk)
 
-    async def _run_clocks(self, port, phase, period, en_sig=None):
-        half_period = get_sim_steps(period / 2.0, 'ns')
-        t = Timer(half_period)
-
-        if phase > 0:
-            await Timer(phase/360.0 * period, 'ns')
-        while True:
-            if (en_sig is not None and en_sig.value == 0):
-                await t
-                await t
-            else:
-                port.value = cocotb.handle.Immediate(1)
-                await t
-                port.value = cocotb.handle.Immediate(0)
-                await t
-
-
-class WinbondRAM(SpiSlaveBase):
-    _config = SpiConfig(
-        word_width=8,     # all parameters optional
-        sclk_freq=125e6,   # these are the defaults
-        cpol=False,
-        cpha=False,
-        msb_first=True,
-        data_output_idle=0,
-        cs_active_low=True  # optional (assumed True)
-    )
-
-    def __init__(self, bus, mem=None):
-        self.values = {"inst": 0, "addr": 0}
-        self.mem = mem
-        super().__init__(bus)
-
-    async def get_values(self):
-        await self.idle.wait()
-        return self.values
-
-    async def _byte_2_bit(self, frame_end, b):
-        for i in range(self._config.word_width):
-            self._miso.value = bool(
-                b & (1 << (self._config.word_width - 1 - i)))
-            s = First(await First(FallingEdge(self._sclk), frame_end))
-            t = First(await Timer(1.5, unit="ns"), frame_end)
-            assert frame_end not in (
-                s, t), "SPI ended in the middle of transaction"
-
-    async def _transaction(self, frame_start, frame_end) -> None:
-        await frame_start
-        self.idle.clear()
-        if bool(self._sclk.value):
-            raise SpiFrameError(
-                "sclk should be low at chip select edge")
-
-        self.values["inst"] = int(await self._shift(8))
-        if (self.values["inst"] != 0x9f):
-            self.values["addr"] = int(await self._shift(24))
-            starting_val = self.mem[self.values["addr"]]
-        # FIXME: the behavior does not match the data sheet. MISO only changes
-        # 1 cycle after the last MOSI bit. workaround here:
-        await FallingEdge(self._sclk)
-
-        counter = 0
-        if (self.values["inst"] != 0x9f):
-            while await First(cocotb.start_soon(self._byte_2_bit(frame_end, starting_val+counter)), frame_end) != frame_end:
-                counter += 1
-                pass
-        else:
-            await self._byte_2_bit(frame_end, 0xDE)
-            await frame_end
-
 
-@cocotb.test()
-async def spi_meta(dut):
-    tb = TB(dut)
-    await tb.reset()
-    spi_bus = SpiBus.from_entity(dut, cs_name="cs")
-    spi_slave = WinbondRAM(spi_bus)
+async def start(dut, inst, addr, size, addr_en=1):
     await RisingEdge(dut.clk)
     dut.i_en.value = 1
-    dut.i_inst.value = 0x9f
-    dut.i_addr.value = 0
-    dut.i_addr_en.value = 0
-    dut.i_size.value = 1
+    dut.i_inst.value = inst
+    dut.i_addr.value = addr
+    dut.i_addr_en.value = addr_en
+    dut.i_size.value = size
     await RisingEdge(dut.clk)
     dut.i_en.value = 0
     await RisingEdge(dut.clk)
     await RisingEdge(dut.clk)
-    trans = cocotb.start_soon(spi_slave.get_values())
-    while True:
-        vals = await First(RisingEdge(dut.o_valid), trans.complete)
-        print(vals)
-        if isinstance(vals, RisingEdge):
-            assert int(dut.o_data.value) == 0xDE
-        else:
-            assert trans.result()["inst"] == 0x9f
-            assert trans.result()["addr"] == dut.i_addr.value
-            break
+
+
+async def collect(dut, size):
+    """
+    'size' bytes from spi_master. The last ones come out after chip select
+    goes back up.
+    """
+    async def run():
+        data = []
+        while len(data) < size:
+            await RisingEdge(dut.o_valid)
+            data.append(int(dut.o_data.value))
+        return data
+    return await with_timeout(run(), 64 * (size + 8), "ns")
+
+
+@cocotb.test()
+async def spi_meta(dut):
+    tb = TB(dut)
+    flash = SpiFlash(dut, jedec_id=b"\xde")
+    await tb.reset()
+    await start(dut, JEDEC_ID, 0, 1, addr_en=0)
+    data = await collect(dut, 1)
+    assert data == [0xDE]
+    assert flash.transactions == [(JEDEC_ID, None)]
 
 
 @cocotb.test()
 async def spi_read(dut):
-    inst = 0x03
-    addr = 0
+    tb = TB(dut)
+    image = bytes(range(0xDE, 0xDE + 10))
+    flash = SpiFlash(dut, image)
+    await tb.reset()
+    await start(dut, READ, 0, 10)
+    data = await collect(dut, 10)
+    assert bytes(data) == image
+    assert flash.transactions == [(READ, 0)]
+
 
+@cocotb.test()
+async def spi_fast_read(dut):
     tb = TB(dut)
+    image = random.Random(1).randbytes(512)
+    flash = SpiFlash(dut, image)
     await tb.reset()
-    spi_bus = SpiBus.from_entity(dut, cs_name="cs")
-    mem = {0: 0xDE}
-    spi_slave = WinbondRAM(spi_bus, mem)
-    await RisingEdge(dut.clk)
-    dut.i_en.value = 1
-    dut.i_inst.value = inst
-    dut.i_addr.value = addr
-    dut.i_addr_en.value = 1
-    dut.i_size.value = 10
-    await RisingEdge(dut.clk)
-    dut.i_en.value = 0
-    await RisingEdge(dut.clk)
-    await RisingEdge(dut.clk)
-    trans = cocotb.start_soon(spi_slave.get_values())
-    counter = 0
-    while True:
-        vals = await First(RisingEdge(dut.o_valid), trans.complete)
-        if isinstance(vals, RisingEdge):
-            assert int(dut.o_data.value) == mem[0] + counter
-            counter += 1
-        else:
-            assert trans.result()["inst"] == inst
-            assert trans.result()["addr"] == addr
-            assert counter == 10
-            break
-
-
-def test_simple_dff_runner():
+    # spi_master does not know about dummy clocks and returns them as the
+    # first byte
+    await start(dut, FAST_READ, 0x1F0, 33)
+    data = await collect(dut, 33)
+    assert bytes(data[1:]) == image[0x1F0:] + b"\xff" * 16
+    assert flash.transactions == [(FAST_READ, 0x1F0)]
+
+
+@cocotb.test()
+async def spi_quad_read(dut):
+    tb = TB(dut)
+    image = random.Random(2).randbytes(256)
+    flash = SpiFlash(dut, image)
+    await tb.reset()
+    await start(dut, FAST_READ_QUAD, 0x10, 8)
+    # spi_master only reads io[1], sample the four lines here
+    await RisingEdge(dut.flash_addr_valid)
+    for _ in range(8):
+        await RisingEdge(dut.sclk)
+    nibbles = []
+    for _ in range(2 * 16):
+        await RisingEdge(dut.sclk)
+        nibbles.append(int(dut.flash_io.value))
+    data = bytes(hi << 4 | lo for hi, lo in zip(nibbles[::2], nibbles[1::2]))
+    assert data == image[0x10:0x20]
+    await RisingEdge(dut.cs)
+    assert flash.transactions == [(FAST_READ_QUAD, 0x10)]
+
+
+@cocotb.test()
+async def spi_copy(dut):
+    """
+    flash2sdram's read of the content from a mapped image file.
+    """
+    tb = TB(dut)
+    size = int(os.getenv("TB_FLASH_BYTES", "16384"))
+    base = OFFSET_IN_FLASH + CONTENT_HEADER_BYTES
+    image = random.Random(3).randbytes(size)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "flash.bin"
+        path.write_bytes(b"\xff" * base + image)
+        flash = SpiFlash(dut, path)
+        await tb.reset()
+        await start(dut, READ, base, size)
+        data = await collect(dut, size)
+        flash.stop()
+    assert len(data) == size
+    assert bytes(data) == image
+    # a wakeup per block rather than two per bit
+    assert flash.blocks <= size // flash.block_bytes + 2
+
+
+@cocotb.test()
+async def spi_gated_clock(dut):
+    """
+    sclk stopped in the middle of a read picks up where it left off.
+    """
+    dut.sclk_en.value = 1
+    tb = TB(dut, sclk_en=dut.sclk_en)
+    image = random.Random(4).randbytes(64)
+    flash = SpiFlash(dut, image)
+    await tb.reset()
+    await start(dut, READ, 0, len(image))
+    await RisingEdge(dut.o_valid)
+    data = [int(dut.o_data.value)]
+    edges = 0
+
+    async def count():
+        nonlocal edges
+        while True:
+            await RisingEdge(dut.sclk)
+            edges += 1
+    counter = cocotb.start_soon(count())
+    await Timer(3, "ns")
+    dut.sclk_en.value = 0
+    await Timer(100, "ns")
+    # the cycle under way when the clock is gated still completes
+    assert edges <= 1, edges
+    assert int(dut.sclk.value) == 0
+    dut.sclk_en.value = 1
+    data += await collect(dut, len(image) - 1)
+    counter.cancel()
+    assert bytes(data) == image
+    # gating sclk does not end the transaction
+    assert flash.transactions == [(READ, 0)]
+
+
+def test_spi():
     sim = os.getenv("SIM", "verilator")
 
     source_folder = "../../rtl"
     sources = [
-        f"./test_spi.sv",
+        "./test_spi.sv",
+        "./spi_flash_port.sv",
         f"{source_folder}/spi_master.sv",
     ]
 
-    # if sim == "verilator":
-    #     sources.append("../../config.vlt")
-
-    runner = get_runner(sim)
-    runner.build(
-        sources=sources,
-        hdl_toplevel="test_spi",
-        waves=True,
-        verbose=True,
-        includes=[f"{source_folder}/"],
-        build_args=["--threads", "8", "--trace-fst",
-                    "--trace-structs", "--bbox-unsup",
-                    ] if sim == "verilator" else [
-            "-y/home/bawj/lscc/diamond/3.14/cae_library/simulation/verilog/ecp5u/"],
-        timescale=("1ns", "1ps"),
-    )
-
-    runner.test(waves=True,
-                verbose=True,
-                hdl_toplevel="test_spi", test_module="test_spi")
+    run_profiled(
+        sim,
+        dict(sources=sources,
+             hdl_toplevel="test_spi",
+             includes=[f"{source_folder}/"],
+             build_args=["--threads", "8", "--bbox-unsup"] if sim == "verilator" else [],
+             timescale=("1ns", "1ps")),
+        dict(hdl_toplevel="test_spi", test_module="test_spi"))
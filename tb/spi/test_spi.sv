@@ -1,7 +1,9 @@
 module test_spi (
     input  wire clk,
     input  wire sclk,
-    input  wire miso,
+    // gates sclk from the bench, like the USRMCLK output to the flash
+    input  wire sclk_en,
+    output wire miso,
     output wire cs,
     output wire mosi,
     output wire clken,
@@ -13,8 +15,38 @@ module test_spi (
     input [23:0] i_addr,
     input i_addr_en,
     output reg [7:0] o_data,
-    output reg o_valid
+    output reg o_valid,
+
+    // driven by SpiFlash in flash.py
+    output wire [3:0] flash_io,
+    output wire [31:0] flash_hdr,
+    output wire flash_cmd_valid,
+    output wire flash_addr_valid,
+    input wire flash_arm,
+    input wire flash_quad,
+    input wire [7:0] flash_lead,
+    input wire [64*8-1:0] flash_next_block,
+    output wire flash_block_req
 );
+  assign miso = flash_io[1];
+
+  spi_flash_port #(
+      .BLOCK_BYTES(64)
+  ) flash (
+      .sclk(sclk),
+      .cs_n(cs),
+      .mosi(mosi),
+      .io(flash_io),
+      .hdr(flash_hdr),
+      .cmd_valid(flash_cmd_valid),
+      .addr_valid(flash_addr_valid),
+      .arm(flash_arm),
+      .quad(flash_quad),
+      .lead(flash_lead),
+      .next_block(flash_next_block),
+      .block_req(flash_block_req)
+  );
+
   spi_master master (
       .clk(clk),
       .spi_sclk(sclk),
@@ -0,0 +1,157 @@
+"""
+Per-stage latency of requests through the RX -> HTTP -> TX pipeline.
+
+Each probe is a signal under the mac instance whose rising edge marks a
+request reaching a stage. A request opens at the first probe and takes,
+for every following probe, the first rising edge after it left the
+previous one. Frames that never make it to the second stage, such as the
+client's pure ACKs, are dropped when the next frame comes in. Edges with no
+request waiting for them (SYN-ACKs, ACKs, retransmissions) are ignored.
+
+Only signal changes wake the monitor, nothing runs on every clock.
+"""
+import json
+import os
+from pathlib import Path
+
+import cocotb
+from cocotb.triggers import RisingEdge
+from cocotb.utils import get_sim_time
+from tcp.load import percentile
+
+# (stage name, signal path relative to the mac instance)
+DEFAULT_PROBES = (
+    ("rx_sof", "phy_rxctl"),
+    ("tcp_payload_valid", "tcp_payload_valid"),
+    ("res_valid", "http_res_valid"),
+    ("upper_granted", "arb_upper_granted"),
+    # mac_tx starts the frame on tcp_outgoing_head, before the payload is
+    # fully read, or on tcp_outgoing_rdy for short payloads
+    ("tx_start", "tx.mac_encode_en"),
+    ("tx_sof", "mac_txen"),
+)
+# a full size frame with preamble and inter-frame gap at 1 Gb/s
+FRAME_NS = (1518 + 8 + 12) * 8
+
+
+def summarize(values, bin_ns):
+    """
+    Count, spread and a sparse histogram of latencies in ns, keyed by the
+    lower edge of each 'bin_ns' wide bin.
+    """
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+    histogram = {}
+    for v in values:
+        edge = int(v // bin_ns * bin_ns)
+        histogram[edge] = histogram.get(edge, 0) + 1
+    return {
+        "count": len(values),
+        "min": values[0],
+        "mean": sum(values) / len(values),
+        "p50": percentile(values, 50),
+        "p90": percentile(values, 90),
+        "p99": percentile(values, 99),
+        "max": values[-1],
+        "histogram": {"bin_ns": bin_ns, "counts": {str(k): c for k, c in histogram.items()}},
+    }
+
+
+class LatencyMonitor:
+    """
+    Timestamps 'probes' under 'mac' (the mac instance handle) for every
+    request. With 'path' or the TB_LATENCY environment variable set,
+    export() writes the report there as JSON.
+    """
+
+    def __init__(self, mac, probes=DEFAULT_PROBES, bin_ns=64, path=None):
+        self.mac = mac
+        self.stages = [name for name, _ in probes]
+        self.bin_ns = bin_ns
+        self.path = path or os.getenv("TB_LATENCY")
+        # requests by stage reached, each a list of timestamps in ns
+        self.requests = []
+        self._tasks = [cocotb.start_soon(self._watch(i, self._handle(sig)))
+                       for i, (_, sig) in enumerate(probes)]
+
+    def _handle(self, path):
+        handle = self.mac
+        for name in path.split("."):
+            handle = getattr(handle, name)
+        return handle
+
+    async def _watch(self, stage, signal):
+        while True:
+            await RisingEdge(signal)
+            self._edge(stage, get_sim_time("ns"))
+
+    def _edge(self, stage, now):
+        if stage == 0:
+            # a frame that stopped at the first stage was not a request
+            if self.requests and len(self.requests[-1]) == 1:
+                self.requests[-1] = [now]
+            else:
+                self.requests.append([now])
+            return
+        for times in self.requests:
+            if len(times) == stage and times[-1] <= now:
+                times.append(now)
+                return
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+
+    def complete(self):
+        """
+        Timestamps of the requests that went through every stage.
+        """
+        return [times for times in self.requests if len(times) == len(self.stages)]
+
+    def check(self, frame_ns=FRAME_NS):
+        """
+        Asserts that no stage of a complete request took negative time and
+        that the last one took less than 'frame_ns'. mac_encode puts the
+        frame on the pins right after mac_tx starts it, a longer last stage
+        matched a later frame.
+        """
+        for times in self.complete():
+            deltas = [b - a for a, b in zip(times, times[1:])]
+            assert all(d >= 0 for d in deltas), times
+            assert deltas[-1] < frame_ns, times
+
+    def report(self):
+        done = self.complete()
+        stages = {}
+        for i in range(1, len(self.stages)):
+            key = f"{self.stages[i - 1]}->{self.stages[i]}"
+            stages[key] = summarize([t[i] - t[i - 1] for t in done], self.bin_ns)
+        return {
+            "stages": self.stages,
+            "requests": len(done),
+            "incomplete": len(self.requests) - len(done),
+            "per_stage": stages,
+            "total": summarize([t[-1] - t[0] for t in done], self.bin_ns),
+            "timestamps_ns": done,
+        }
+
+    def log(self):
+        r = self.report()
+        cocotb.log.info(f"latency: {r['requests']} requests, {r['incomplete']} incomplete")
+        for key, s in list(r["per_stage"].items()) + [("total", r["total"])]:
+            if s["count"]:
+                cocotb.log.info(f"latency: {key:>36} p50 {s['p50']:.0f} ns, "
+                                f"p99 {s['p99']:.0f} ns, max {s['max']:.0f} ns")
+        return r
+
+    def export(self, path=None):
+        """
+        Writes the report as JSON to 'path' or the one given at
+        construction, if any. Returns the report.
+        """
+        r = self.report()
+        path = path or self.path
+        if path:
+            Path(path).write_text(json.dumps(r, indent=1))
+        return r
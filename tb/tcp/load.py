@@ -0,0 +1,398 @@
+"""
+Many concurrent HTTP clients against the mac top level.
+
+The scapy Automaton costs a thread per client, so these clients are plain
+coroutines speaking just enough TCP to fetch pages: handshake, request,
+cumulative acks, FIN. Frames from the HDL are read once by a FrameMux and
+handed out by client address. Everything the clients send goes through the
+PHY model's queue, which puts it on the wire at line rate.
+
+Sessions arrive as a Poisson or fixed-rate process, or with
+arrival="closed" every client starts its next session after its think time.
+Each session opens a connection, sends 'requests_per_conn' requests picked
+from 'mix' with think time in between and closes. Arrivals finding every
+client busy are counted as skipped, which is the number to watch when
+sizing the TCBs.
+"""
+import math
+import random
+
+import cocotb
+from cocotb.triggers import First, Timer
+from cocotb.utils import get_sim_time
+from cocotbext.eth import GmiiFrame
+from scapy.all import Ether, IP, TCP, Raw
+from tcp.pcap import INBOUND, OUTBOUND, open_capture
+from tcp.utils import SimQueue, check_checksums
+
+SEQ_MOD = 1 << 32
+WINDOW = 65535
+
+
+def percentile(values, p):
+    """
+    Nearest-rank percentile of 'values', None when empty.
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+async def get_frame(queue, timeout_ns):
+    """
+    Next frame of a SimQueue, or TimeoutError after 'timeout_ns'.
+    """
+    deadline = get_sim_time("ns") + timeout_ns
+    while queue.empty():
+        remain = deadline - get_sim_time("ns")
+        if remain < 1:
+            raise TimeoutError
+        queue.ready.clear()
+        await First(queue.ready.wait(), Timer(int(remain), "ns"))
+    return queue.get()
+
+
+class FrameMux:
+    """
+    Sole reader of the PHY TX side. Frames go to the queue registered for
+    their destination (ip, port), the rest are counted in 'unmatched'.
+    Fragments without a preamble, such as the end of a frame cut off by a
+    reset, are dropped and counted in 'runts'. With 'check' the FCS and the
+    IP and TCP checksums of every TCP frame are asserted.
+    """
+
+    def __init__(self, tb, dst_mac, src_mac, capture=None, check=False):
+        self.tb = tb
+        self.dst_mac = dst_mac
+        self.src_mac = src_mac
+        self.capture = open_capture(capture) if capture else None
+        self.check = check
+        self.queues = {}
+        self.unmatched = 0
+        self.runts = 0
+        self.frames_in = 0
+        self.frames_out = 0
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = cocotb.start_soon(self._run())
+
+    def register(self, addr):
+        self.queues[addr] = SimQueue()
+        return self.queues[addr]
+
+    def unregister(self, addr):
+        self.queues.pop(addr, None)
+
+    async def _run(self):
+        while True:
+            frame = await self.tb.rgmii_phy.tx.recv()
+            try:
+                data = frame.get_payload()
+            except ValueError:
+                self.runts += 1
+                continue
+            self.frames_in += 1
+            if self.capture is not None:
+                self.capture.write(data, get_sim_time("ns"), INBOUND)
+            pkt = Ether(data)
+            queue = None
+            if IP in pkt and TCP in pkt:
+                if self.check:
+                    check_checksums(frame, pkt.copy())
+                queue = self.queues.get((pkt[IP].dst, pkt[TCP].dport))
+            if queue is None:
+                self.unmatched += 1
+            else:
+                queue.put(pkt)
+
+    async def send(self, pkt):
+        data = bytes(Ether(dst=self.dst_mac, src=self.src_mac) / pkt)
+        self.frames_out += 1
+        if self.capture is not None:
+            self.capture.write(data, get_sim_time("ns"), OUTBOUND)
+        await self.tb.rgmii_phy.rx.send(GmiiFrame.from_payload(data))
+
+
+class LoadStats:
+    """
+    Counters of one run. Latencies are in simulated ns from the request
+    leaving the client to the first and last byte of its response.
+    """
+
+    def __init__(self):
+        self.start = None
+        self.end = None
+        self.sessions = 0
+        self.skipped = 0
+        self.requests = 0
+        self.completed = 0
+        self.goodput_bytes = 0
+        self.latency = []
+        self.ttfb = []
+        self.retransmits = 0
+        self.out_of_order = 0
+        self.syn_retries = 0
+        self.timeouts = 0
+        self.resets = 0
+
+    def report(self):
+        elapsed = (self.end - self.start) * 1e-9
+        return {
+            "elapsed_us": elapsed * 1e6,
+            "sessions": self.sessions,
+            "skipped": self.skipped,
+            "requests": self.requests,
+            "completed": self.completed,
+            "requests_per_s": self.completed / elapsed if elapsed else 0.0,
+            "goodput_bps": self.goodput_bytes * 8 / elapsed if elapsed else 0.0,
+            "latency_ns": {f"p{p}": percentile(self.latency, p) for p in (50, 90, 99, 100)},
+            "ttfb_ns": {f"p{p}": percentile(self.ttfb, p) for p in (50, 90, 99, 100)},
+            "retransmits": self.retransmits,
+            "out_of_order": self.out_of_order,
+            "syn_retries": self.syn_retries,
+            "timeouts": self.timeouts,
+            "resets": self.resets,
+        }
+
+    def log(self):
+        r = self.report()
+        cocotb.log.info(
+            f"load: {r['completed']}/{r['requests']} requests in {r['elapsed_us']:.1f} us, "
+            f"{r['requests_per_s']:.0f} req/s, {r['goodput_bps'] / 1e6:.1f} Mb/s goodput, "
+            f"{r['sessions']} sessions, {r['skipped']} skipped")
+        cocotb.log.info(f"load: latency ns {r['latency_ns']}, first byte ns {r['ttfb_ns']}")
+        cocotb.log.info(
+            f"load: {r['retransmits']} retransmitted and {r['out_of_order']} out of order segments, "
+            f"{r['syn_retries']} SYN retries, {r['timeouts']} timeouts, {r['resets']} resets")
+        return r
+
+
+class LoadClient:
+    """
+    One connection from 'ip':'port'. Raises TimeoutError or
+    ConnectionResetError, LoadGen counts them.
+    """
+
+    def __init__(self, gen, ip, port):
+        self.gen = gen
+        self.stats = gen.stats
+        self.ip = ip
+        self.port = port
+        self.queue = gen.mux.register((ip, port))
+        self.snd_nxt = gen.rng.randrange(SEQ_MOD)
+        self.rcv_nxt = None
+        self.peer_fin = False
+
+    def _segment(self, flags, payload=b""):
+        pkt = IP(src=self.ip, dst=self.gen.server_ip) / TCP(
+            sport=self.port, dport=self.gen.server_port, flags=flags, seq=self.snd_nxt,
+            ack=self.rcv_nxt or 0, window=WINDOW)
+        if payload:
+            pkt = pkt / Raw(payload)
+        return pkt
+
+    async def _recv(self):
+        pkt = await get_frame(self.queue, self.gen.timeout_ns)
+        if pkt[TCP].flags.R:
+            self.stats.resets += 1
+            raise ConnectionResetError
+        return pkt
+
+    async def connect(self):
+        for attempt in range(self.gen.syn_retries + 1):
+            if attempt:
+                self.stats.syn_retries += 1
+            await self.gen.mux.send(self._segment("S"))
+            try:
+                while True:
+                    pkt = await self._recv()
+                    if pkt[TCP].flags == "SA" and pkt[TCP].ack == (self.snd_nxt + 1) % SEQ_MOD:
+                        break
+            except TimeoutError:
+                continue
+            self.snd_nxt = (self.snd_nxt + 1) % SEQ_MOD
+            self.rcv_nxt = (pkt[TCP].seq + 1) % SEQ_MOD
+            await self.gen.mux.send(self._segment("A"))
+            return
+        raise TimeoutError
+
+    @staticmethod
+    def _payload(pkt):
+        # Ethernet padding of short frames is not payload
+        return bytes(pkt[TCP].payload)[:pkt[IP].len - pkt[IP].ihl * 4 - pkt[TCP].dataofs * 4]
+
+    def _take(self, pkt):
+        """
+        In-order payload of 'pkt', counting what is not.
+        """
+        data = self._payload(pkt)
+        if not data:
+            return b""
+        ahead = (pkt[TCP].seq - self.rcv_nxt) % SEQ_MOD
+        if ahead == 0:
+            self.rcv_nxt = (self.rcv_nxt + len(data)) % SEQ_MOD
+            return data
+        if ahead >= SEQ_MOD // 2:
+            self.stats.retransmits += 1
+        else:
+            self.stats.out_of_order += 1
+        return b""
+
+    async def request(self, path, close):
+        headers = dict(self.gen.headers)
+        if close:
+            headers["Connection"] = "close"
+        req = f"GET {path} HTTP/1.1\r\nHost: {self.gen.server_ip}\r\n"
+        req += "".join(f"{k}: {v}\r\n" for k, v in headers.items()) + "\r\n"
+        self.stats.requests += 1
+        sent = get_sim_time("ns")
+        await self.gen.mux.send(self._segment("PA", req.encode()))
+        self.snd_nxt = (self.snd_nxt + len(req)) % SEQ_MOD
+        response = bytearray()
+        length = None
+        while length is None or len(response) < length:
+            pkt = await self._recv()
+            data = self._take(pkt)
+            if data and not response:
+                self.stats.ttfb.append(get_sim_time("ns") - sent)
+            response += data
+            self.stats.goodput_bytes += len(data)
+            if pkt[TCP].flags.F and (pkt[TCP].seq + len(self._payload(pkt))) % SEQ_MOD == self.rcv_nxt:
+                self.rcv_nxt = (self.rcv_nxt + 1) % SEQ_MOD
+                self.peer_fin = True
+            if data or pkt[TCP].flags.F or pkt[TCP].seq != self.rcv_nxt:
+                await self.gen.mux.send(self._segment("A"))
+            if length is None and b"\r\n\r\n" in response:
+                head, _, _ = bytes(response).partition(b"\r\n\r\n")
+                length = len(head) + 4
+                for line in head.split(b"\r\n"):
+                    name, _, value = line.partition(b":")
+                    if name.strip().lower() == b"content-length":
+                        length += int(value)
+            if self.peer_fin:
+                break
+        self.stats.latency.append(get_sim_time("ns") - sent)
+        self.stats.completed += 1
+        return bytes(response)
+
+    async def close(self):
+        await self.gen.mux.send(self._segment("FA"))
+        self.snd_nxt = (self.snd_nxt + 1) % SEQ_MOD
+        while not self.peer_fin:
+            pkt = await self._recv()
+            if pkt[TCP].flags.F:
+                self.rcv_nxt = (pkt[TCP].seq + 1) % SEQ_MOD
+                self.peer_fin = True
+                await self.gen.mux.send(self._segment("A"))
+
+
+class LoadGen:
+    """
+    Load on 'server_ip':'server_port'. 'mix' maps paths to weights, 'rate'
+    is in sessions per second of simulated time, 'think_ns' is the mean
+    pause between requests and sessions of a client ("exponential" or
+    "fixed" in 'think'). 'headers' go on every request, e.g.
+    {"Accept-Encoding": "gzip"}. 'check' asserts the checksums of every
+    frame from the HDL, see FrameMux.
+    """
+
+    def __init__(self, tb, dst_mac, src_mac, server_ip, server_port, mix=None, clients=8,
+                 arrival="poisson", rate=100_000, think="exponential", think_ns=2000,
+                 requests_per_conn=1, headers=None, seed=0, timeout_us=200, syn_retries=2,
+                 first_port=10000, capture=None, check=False):
+        if arrival not in ("poisson", "fixed", "closed"):
+            raise ValueError(f"unknown arrival process {arrival}")
+        if think not in ("exponential", "fixed"):
+            raise ValueError(f"unknown think time distribution {think}")
+        self.mux = FrameMux(tb, dst_mac, src_mac, capture, check)
+        self.server_ip = server_ip
+        self.server_port = server_port
+        self.mix = mix or {"/0": 1}
+        self.clients = clients
+        self.arrival = arrival
+        self.rate = rate
+        self.think = think
+        self.think_ns = think_ns
+        self.requests_per_conn = requests_per_conn
+        self.headers = headers or {}
+        self.rng = random.Random(seed)
+        self.timeout_ns = timeout_us * 1000
+        self.syn_retries = syn_retries
+        self.next_port = first_port
+        self.stats = LoadStats()
+
+    def client_ip(self, index):
+        return f"192.168.{1 + index // 250}.{1 + index % 250}"
+
+    def _think(self):
+        if self.think == "fixed":
+            return self.think_ns
+        return self.rng.expovariate(1 / self.think_ns) if self.think_ns else 0
+
+    def _interarrival(self):
+        mean = 1e9 / self.rate
+        if self.arrival == "fixed":
+            return mean
+        return self.rng.expovariate(1 / mean)
+
+    async def _pause(self, ns):
+        if ns >= 1:
+            await Timer(int(ns), "ns")
+
+    async def session(self, index):
+        self.stats.sessions += 1
+        port = self.next_port
+        self.next_port = self.next_port + 1 if self.next_port < 65535 else 1024
+        client = LoadClient(self, self.client_ip(index), port)
+        try:
+            await client.connect()
+            paths = self.rng.choices(list(self.mix), weights=list(self.mix.values()),
+                                     k=self.requests_per_conn)
+            for i, path in enumerate(paths):
+                if i:
+                    await self._pause(self._think())
+                await client.request(path, close=i == len(paths) - 1)
+            await client.close()
+        except TimeoutError:
+            self.stats.timeouts += 1
+        except ConnectionResetError:
+            pass
+        finally:
+            self.mux.unregister((client.ip, client.port))
+
+    async def _closed_client(self, index, until):
+        while get_sim_time("ns") < until:
+            await self.session(index)
+            await self._pause(self._think())
+
+    async def run(self, duration_us):
+        """
+        Generates sessions for 'duration_us', waits for the ones in flight
+        and returns the report.
+        """
+        self.mux.start()
+        self.stats.start = get_sim_time("ns")
+        until = self.stats.start + duration_us * 1000
+        tasks = []
+        if self.arrival == "closed":
+            tasks = [cocotb.start_soon(self._closed_client(i, until)) for i in range(self.clients)]
+        else:
+            # client index -> its current session
+            running = {}
+            while True:
+                await self._pause(self._interarrival())
+                if get_sim_time("ns") >= until:
+                    break
+                idle = [i for i in range(self.clients) if i not in running or running[i].done()]
+                if not idle:
+                    self.stats.skipped += 1
+                    continue
+                running[idle[0]] = cocotb.start_soon(self.session(idle[0]))
+                tasks.append(running[idle[0]])
+        for task in tasks:
+            await task
+        self.stats.end = get_sim_time("ns")
+        return self.stats.log()
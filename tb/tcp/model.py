@@ -0,0 +1,444 @@
+"""
+Reference model of the TCP engine: tcp_arbiter, tcb, tcb_serializer,
+to_ack_fifo and tcp_sm for the single TCB of the HDL.
+
+The model works per packet rather than per cycle. Frames in and out are
+events, and the timers of the tcb (idle, FIN, retransmit) count cycles
+that advance() moves forward. It keeps the parts that decide what goes on
+the wire: the CONN_STATE transitions, sequence and ack bookkeeping, the
+to_send and to_ack queues, the segmentation of upper payloads and which
+pending packet the serializer picks first. It leaves out the pipeline
+latency in between.
+
+TcpModel runs standalone, e.g. through explore() which throws random
+client behaviour at it and checks invariants. TcpScoreboard follows the
+frames of a TCPIntegrated bench and checks each frame from the HDL against
+the model.
+"""
+import random
+from collections import deque
+
+from tcp.utils import TCP_PKG, ConnState
+
+FLAGS = TCP_PKG.enums["tcp_flags_t"][1]
+FIN, SYN, RST, PSH, ACK = (FLAGS[n] for n in ("FIN", "SYN", "RST", "PSH", "ACK"))
+SEQ_MOD = 1 << 32
+# payload bytes per segment, tcb_serializer
+SEGMENT = 1440
+# simulation values of the tcb and to_ack_fifo timers, in cycles
+FIN_TIMEOUT = 12500
+IDLE_TIMEOUT = 12500
+RETRANSMIT_TIMEOUT = 5000
+TO_SEND_DEPTH = 64
+TO_ACK_DEPTH = 32
+
+
+class Segment:
+    """
+    A packet from the HDL. 'size' is the payload size, 'close' marks the
+    last segment of a response that closes the connection.
+    """
+
+    def __init__(self, flags, seq, ack, size, close=False):
+        self.flags = flags
+        self.seq = seq
+        self.ack = ack
+        self.size = size
+        self.close = close
+
+    def fields(self):
+        return (self.flags, self.seq, self.ack, self.size)
+
+    def __repr__(self):
+        return f"{flag_names(self.flags)} seq={self.seq} ack={self.ack} len={self.size}"
+
+
+def flag_names(flags):
+    return "|".join(n for n, v in FLAGS.items() if flags & v) or "0"
+
+
+def sm_step(state, flags, seq, ack, payload_size, tcb_ack, expected_ack):
+    """
+    tcp_sm for one incoming packet, 'tcb_ack' being the ack number of the
+    last packet the TCB sent and 'expected_ack' the oldest ack it waits for.
+    Returns (state, send_ack, ack_op, seq_op, clear_ack, accept) with the
+    ack_op and seq_op encodings of the HDL: 1 loads, 2 adds.
+    """
+    is_syn = flags == SYN
+    has_ack, has_fin, has_rst = flags & ACK, flags & FIN, flags & RST
+    seq_match = seq == tcb_ack
+    ack_match = ack == expected_ack
+    send_ack = False
+    ack_op = seq_op = 0
+    clear_ack = accept = False
+    if state == ConnState.LISTEN:
+        if is_syn:
+            ack_op, seq_op, send_ack = 1, 1, True
+            state = ConnState.SYN_RECV
+    elif state == ConnState.SYN_RECV:
+        if is_syn:
+            pass
+        elif has_ack and seq_match and ack_match:
+            state = ConnState.ESTABLISHED
+            seq_op, clear_ack = 2, True
+        else:
+            state = ConnState.LISTEN
+    elif state == ConnState.ESTABLISHED:
+        if has_ack:
+            clear_ack = ack >= expected_ack
+        if payload_size and seq_match:
+            accept, ack_op, send_ack = True, 2, True
+        if has_rst:
+            state = ConnState.LISTEN
+        elif has_fin:
+            ack_op, send_ack = 1, True
+            state = ConnState.LASTACK
+    elif state == ConnState.LASTACK:
+        if has_rst or (ack_match and has_ack):
+            state = ConnState.LISTEN
+        else:
+            send_ack = True
+    elif state == ConnState.FINWAIT:
+        if has_rst:
+            state = ConnState.LISTEN
+        elif has_fin and has_ack:
+            state = ConnState.LISTEN
+            ack_op, seq_op, send_ack = 1, 2, True
+        elif has_ack:
+            clear_ack = ack >= expected_ack
+    else:
+        state = ConnState.LISTEN
+    return state, send_ack, ack_op, seq_op, clear_ack, accept
+
+
+class TcpModel:
+    """
+    The TCB and what surrounds it. Feed it with rx() and send(), move time
+    with advance() and collect what the HDL would transmit from 'sent'.
+    'isn' picks initial sequence numbers, the HDL takes them from an LFSR.
+    """
+
+    def __init__(self, echo=False, isn=None, rng=None):
+        self.echo = echo
+        self.rng = rng or random.Random()
+        self.isn = isn or (lambda: self.rng.randrange(SEQ_MOD))
+        self.now = 0
+        self.sent = deque()
+        # upper layer notifications, (payload_size, err)
+        self.payloads = deque()
+        self.reset()
+
+    def reset(self):
+        self.state = ConnState.LISTEN
+        self.peer = None
+        self.seq = 0
+        self.ack = 0
+        self.last_sent_ack = 0
+        self.expected_ack = 0
+        self.to_send = deque()
+        self.to_ack = deque()
+        self.ack_pending = False
+        self.close_serialized = False
+        self.fin_sent = False
+        self.last_rx = self.now
+        self.fin_since = None
+        self.to_ack_since = None
+
+    def _to_listen(self):
+        # state_rst flushes the queues of the tcb
+        self.state = ConnState.LISTEN
+        self.to_send.clear()
+        self.to_ack.clear()
+        self.ack_pending = False
+        self.close_serialized = False
+        self.fin_sent = False
+        self.fin_since = None
+        self.to_ack_since = None
+
+    def _flags(self, payload):
+        if self.state == ConnState.SYN_RECV:
+            return SYN | ACK
+        if self.state == ConnState.ESTABLISHED:
+            return ACK | PSH if payload else ACK
+        if self.state in (ConnState.LASTACK, ConnState.FINWAIT):
+            return ACK | FIN
+        return ACK
+
+    def _transmit(self, seg):
+        self.sent.append(seg)
+        self.last_sent_ack = seg.ack
+        if seg.flags != ACK:
+            if not self.to_ack and self.state == ConnState.ESTABLISHED:
+                self.expected_ack = (seg.seq + seg.size) % SEQ_MOD
+            self.to_ack.append(seg)
+            if self.to_ack_since is None:
+                self.to_ack_since = self.now
+
+    def _serialize(self):
+        """
+        Empties to_send and sends a pending pure ACK, in tcb order.
+        """
+        while self.to_send:
+            size, close = self.to_send.popleft()
+            seg = Segment(self._flags(True), self.seq, self.ack, size, close)
+            self.seq = (self.seq + size) % SEQ_MOD
+            self.close_serialized |= close
+            self._transmit(seg)
+            self.ack_pending = False
+        if self.ack_pending:
+            self.ack_pending = False
+            self._transmit(Segment(self._flags(False), self.seq, self.ack, 0))
+        if self.state in (ConnState.LASTACK, ConnState.SYN_RECV):
+            self.expected_ack = (self.seq + 1) % SEQ_MOD
+        self._check_close()
+
+    def _check_close(self):
+        if (self.state == ConnState.ESTABLISHED and not self.echo and self.close_serialized
+                and not self.to_ack and not self.to_send):
+            self.state = ConnState.FINWAIT
+        if self.state == ConnState.FINWAIT and not self.fin_sent:
+            self.fin_sent = True
+            self.fin_since = self.now
+            self._transmit(Segment(ACK | FIN, self.seq, self.ack, 0))
+
+    def _clear_acked(self, ack):
+        while self.to_ack:
+            head = self.to_ack[0]
+            # a FIN expects the peer to ack one past it
+            end = head.seq + (1 if head.flags == ACK | FIN else head.size)
+            if ack < end % SEQ_MOD:
+                break
+            self.to_ack.popleft()
+        self.to_ack_since = self.now if self.to_ack else None
+
+    def rx(self, flags, seq, ack, payload_size=0, peer=None):
+        """
+        A packet from the peer reaching the arbiter. Returns whether its
+        payload was accepted.
+        """
+        if self.state != ConnState.LISTEN and peer is not None and peer != self.peer:
+            # another peer while the only TCB is taken, dropped by the arbiter
+            return False
+        state, send_ack, ack_op, seq_op, clear_ack, accept = sm_step(
+            self.state, flags, seq, ack, payload_size, self.last_sent_ack, self.expected_ack)
+        self.peer = peer
+        self.last_rx = self.now
+        if clear_ack:
+            self._clear_acked(ack)
+        if ack_op == 1:
+            self.ack = (seq + 1) % SEQ_MOD
+        elif ack_op == 2:
+            self.ack = (seq + payload_size) % SEQ_MOD
+        if seq_op == 1:
+            self.seq = self.isn()
+        elif seq_op == 2:
+            self.seq = (self.seq + 1) % SEQ_MOD
+        left_listen = self.state != ConnState.LISTEN
+        self.state = state
+        if state == ConnState.LISTEN and left_listen:
+            self._to_listen()
+            if send_ack:
+                # the ACK of the peer's FIN still goes out after the flush
+                self._transmit(Segment(ACK, self.seq, self.ack, 0))
+            return accept
+        if payload_size:
+            self.payloads.append((payload_size, not accept))
+        self.ack_pending |= send_ack
+        if accept and self.echo:
+            self.send(min(payload_size, SEGMENT))
+        else:
+            self._serialize()
+        return accept
+
+    def send(self, size, close=False):
+        """
+        An upper layer payload of 'size' bytes, cut into segments.
+        """
+        while True:
+            chunk = min(size, SEGMENT)
+            size -= chunk
+            self.to_send.append((chunk, close and not size))
+            if not size:
+                break
+        assert len(self.to_send) <= TO_SEND_DEPTH, "to_send overflow"
+        self._serialize()
+
+    def advance(self, cycles):
+        """
+        Moves time on by 'cycles' and fires the timers that expire.
+        """
+        end = self.now + cycles
+        while True:
+            deadlines = []
+            if self.to_ack and self.to_ack_since is not None:
+                deadlines.append((self.to_ack_since + RETRANSMIT_TIMEOUT, self._retransmit))
+            if self.state == ConnState.ESTABLISHED and not self.echo and not self.to_send:
+                deadlines.append((self.last_rx + IDLE_TIMEOUT, self._idle))
+            if self.fin_since is not None:
+                deadlines.append((self.fin_since + FIN_TIMEOUT, self._fin_timeout))
+            due = [d for d in deadlines if d[0] <= end]
+            if not due:
+                break
+            when, fire = min(due, key=lambda d: d[0])
+            self.now = max(self.now, when)
+            fire()
+        self.now = end
+
+    def _retransmit(self):
+        # the head moves to the back of to_ack once it is sent again
+        seg = self.to_ack.popleft()
+        self.to_ack_since = self.now
+        self._transmit(seg)
+
+    def _idle(self):
+        self.state = ConnState.FINWAIT
+        self._check_close()
+
+    def _fin_timeout(self):
+        self._to_listen()
+
+    def check(self):
+        """
+        Invariants that hold between events.
+        """
+        assert self.state in (ConnState.LISTEN, ConnState.SYN_RECV, ConnState.ESTABLISHED,
+                              ConnState.FINWAIT, ConnState.LASTACK), self.state
+        assert len(self.to_ack) <= TO_ACK_DEPTH, "to_ack overflow"
+        if self.state == ConnState.LISTEN:
+            assert not self.to_send and not self.to_ack
+        # retransmits reorder to_ack, but nothing in it is ahead of seq
+        for seg in self.to_ack:
+            assert (self.seq - seg.seq) % SEQ_MOD < SEQ_MOD // 2, f"unacked {seg} past seq {self.seq}"
+
+
+class Client:
+    """
+    A client driving a TcpModel for explore(), with its own view of the
+    sequence numbers.
+    """
+
+    def __init__(self, model, rng):
+        self.model = model
+        self.rng = rng
+        self.seq = rng.randrange(SEQ_MOD)
+        self.ack = 0
+        self.peer = ("192.168.1.1", rng.randrange(1024, 65536))
+
+    def _drain(self):
+        for seg in self.model.sent:
+            end = seg.seq + seg.size + (1 if seg.flags & (SYN | FIN) else 0)
+            if (end - self.ack) % SEQ_MOD < SEQ_MOD // 2:
+                self.ack = end % SEQ_MOD
+        self.model.sent.clear()
+
+    def step(self):
+        m, r = self.model, self.rng
+        action = r.choice(("syn", "ack", "data", "data", "fin", "rst", "wait", "respond",
+                           "bad_seq", "stale_ack"))
+        if action == "syn":
+            m.rx(SYN, self.seq, 0, peer=self.peer)
+            self.seq = (self.seq + 1) % SEQ_MOD
+        elif action == "ack":
+            m.rx(ACK, self.seq, self.ack, peer=self.peer)
+        elif action == "data":
+            size = r.randrange(1, 1500)
+            if m.rx(ACK | PSH, self.seq, self.ack, size, peer=self.peer):
+                self.seq = (self.seq + size) % SEQ_MOD
+        elif action == "fin":
+            m.rx(ACK | FIN, self.seq, self.ack, peer=self.peer)
+            self.seq = (self.seq + 1) % SEQ_MOD
+        elif action == "rst":
+            m.rx(RST, self.seq, 0, peer=self.peer)
+        elif action == "wait":
+            m.advance(r.choice((10, 1000, RETRANSMIT_TIMEOUT, IDLE_TIMEOUT + 1)))
+        elif action == "respond":
+            if m.state == ConnState.ESTABLISHED:
+                m.send(r.randrange(1, 8000), close=r.random() < 0.3)
+        elif action == "bad_seq":
+            m.rx(ACK | PSH, (self.seq + r.randrange(1, 1000)) % SEQ_MOD, self.ack, 10,
+                 peer=self.peer)
+        else:
+            m.rx(ACK, self.seq, (self.ack - r.randrange(1, 1000)) % SEQ_MOD, peer=self.peer)
+        self._drain()
+        m.check()
+        return action
+
+
+def explore(scenarios, steps=50, seed=0, echo=False):
+    """
+    Runs 'scenarios' random client sequences of 'steps' actions. Returns
+    the (seed, actions, error) of each one that broke an invariant, to be
+    replayed against the HDL.
+    """
+    failures = []
+    for i in range(scenarios):
+        rng = random.Random(seed * 1_000_003 + i)
+        model = TcpModel(echo=echo, rng=rng)
+        client = Client(model, rng)
+        actions = []
+        try:
+            for _ in range(steps):
+                actions.append(client.step())
+        except AssertionError as e:
+            failures.append((seed * 1_000_003 + i, actions, str(e)))
+    return failures
+
+
+class TcpScoreboard:
+    """
+    Checks the frames of a bench against a TcpModel. observe() takes every
+    frame to and from the HDL with its time. The HDL's initial sequence
+    number is adopted from its SYN-ACK, it comes from an LFSR.
+    """
+
+    def __init__(self, echo=False, clock_ns=8, slack_cycles=512):
+        self.clock_ns = clock_ns
+        self.slack_cycles = slack_cycles
+        self._isn = None
+        self.model = TcpModel(echo=echo, isn=lambda: self._isn or 0)
+        self.checked = 0
+        self.mismatches = []
+
+    def _advance_to(self, time_ns):
+        cycles = int(time_ns // self.clock_ns) - self.model.now
+        if cycles > 0:
+            self.model.advance(cycles)
+
+    def observe(self, to_hdl, pkt, time_ns):
+        """
+        'pkt' is a scapy packet with IP and TCP layers.
+        """
+        from scapy.all import IP, TCP
+        if TCP not in pkt:
+            return
+        self._advance_to(time_ns)
+        tcp = pkt[TCP]
+        size = pkt[IP].len - pkt[IP].ihl * 4 - tcp.dataofs * 4
+        if to_hdl:
+            self.model.rx(int(tcp.flags), tcp.seq, tcp.ack, size, (pkt[IP].src, tcp.sport))
+            return
+        if int(tcp.flags) == SYN | ACK and self.model.state == ConnState.SYN_RECV:
+            # take the LFSR's value and redo the sequence numbers from it
+            self._isn = tcp.seq
+            self.model.seq = tcp.seq
+            for seg in list(self.model.sent) + list(self.model.to_ack):
+                if seg.flags == SYN | ACK:
+                    seg.seq = tcp.seq
+            self.model.expected_ack = (tcp.seq + 1) % SEQ_MOD
+        if not self.model.sent:
+            # a timer of the HDL fired a little earlier than the model's
+            self.model.advance(self.slack_cycles)
+        actual = (int(tcp.flags), tcp.seq, tcp.ack, size)
+        if not self.model.sent:
+            self.mismatches.append((time_ns, None, actual))
+            return
+        seg = self.model.sent.popleft()
+        self.checked += 1
+        if seg.fields() != actual:
+            self.mismatches.append((time_ns, seg.fields(), actual))
+
+    def assert_clean(self):
+        def fmt(s):
+            return "nothing" if s is None else f"{flag_names(s[0])} seq={s[1]} ack={s[2]} len={s[3]}"
+        assert not self.mismatches, "\n".join(
+            f"{t:.0f} ns: expected {fmt(e)}, HDL sent {fmt(a)}" for t, e, a in self.mismatches)
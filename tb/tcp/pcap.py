@@ -0,0 +1,149 @@
+"""
+pcapng capture of simulated Ethernet traffic.
+
+Frames are stamped with simulator time in nanoseconds and handed to a
+background thread that appends them to the file, so the bench only pays for
+building the block. The result opens in Wireshark or tshark.
+"""
+import atexit
+import queue
+import struct
+import threading
+from pathlib import Path
+
+LINKTYPE_ETHERNET = 1
+# epb_flags direction bits
+INBOUND = 1
+OUTBOUND = 2
+
+_SHB = 0x0A0D0D0A
+_IDB = 0x00000001
+_EPB = 0x00000006
+_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+_OPT_END = 0
+_OPT_COMMENT = 1
+_IF_NAME = 2
+_IF_TSRESOL = 9
+_EPB_FLAGS = 2
+
+
+def _pad(data):
+    return data + b"\x00" * (-len(data) % 4)
+
+
+def _option(code, value):
+    return struct.pack("<HH", code, len(value)) + _pad(value)
+
+
+def _block(block_type, body):
+    length = 12 + len(body)
+    return struct.pack("<II", block_type, length) + body + struct.pack("<I", length)
+
+
+def section_header(comment=None):
+    opts = _option(_OPT_COMMENT, comment.encode()) if comment else b""
+    if opts:
+        opts += _option(_OPT_END, b"")
+    # section length unknown, the file is written as a stream
+    return _block(_SHB, struct.pack("<IHHq", _BYTE_ORDER_MAGIC, 1, 0, -1) + opts)
+
+
+def interface_description(name, snaplen=65535, linktype=LINKTYPE_ETHERNET):
+    # timestamps are in units of 10^-9 s
+    opts = _option(_IF_NAME, name.encode()) + _option(_IF_TSRESOL, b"\x09") + _option(_OPT_END, b"")
+    return _block(_IDB, struct.pack("<HHI", linktype, 0, snaplen) + opts)
+
+
+def enhanced_packet(frame, time_ns, interface=0, direction=None):
+    frame = bytes(frame)
+    opts = b""
+    if direction is not None:
+        opts = _option(_EPB_FLAGS, struct.pack("<I", direction)) + _option(_OPT_END, b"")
+    body = struct.pack("<IIIII", interface, (time_ns >> 32) & 0xFFFFFFFF, time_ns & 0xFFFFFFFF,
+                       len(frame), len(frame)) + _pad(frame) + opts
+    return _block(_EPB, body)
+
+
+class PcapngWriter:
+    """
+    Streams frames to 'path' from a background thread. Blocks are queued as
+    bytes and written in batches, call close() (or rely on the atexit hook)
+    to flush the tail.
+    """
+
+    def __init__(self, path, interface="rgmii0", comment=None):
+        self.path = Path(path)
+        self.frames = 0
+        self._queue = queue.SimpleQueue()
+        self._file = open(self.path, "wb", buffering=1 << 20)
+        self._file.write(section_header(comment) + interface_description(interface))
+        self._thread = threading.Thread(target=self._drain, name=f"pcapng {self.path.name}",
+                                        daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, frame, time_ns, direction=None):
+        """
+        Queue 'frame' (bytes, no FCS needed) seen at simulator time 'time_ns'.
+        """
+        self.frames += 1
+        self._queue.put(enhanced_packet(frame, int(time_ns), direction=direction))
+
+    def _drain(self):
+        while True:
+            block = self._queue.get()
+            batch = [block]
+            # write whatever else is already queued in one go
+            try:
+                while True:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            done = None in batch
+            self._file.write(b"".join(b for b in batch if b is not None))
+            if done:
+                self._file.close()
+                return
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+
+_captures = {}
+
+
+def open_capture(path):
+    """
+    Shared writer for 'path', so every socket of a test lands in one file.
+    """
+    path = str(Path(path).resolve())
+    if path not in _captures:
+        _captures[path] = PcapngWriter(path)
+    return _captures[path]
+
+
+def read_pcapng(path):
+    """
+    (time_ns, direction, frame) of every enhanced packet block in 'path',
+    assuming a single interface with nanosecond timestamps.
+    """
+    data = Path(path).read_bytes()
+    pos = 0
+    while pos + 12 <= len(data):
+        block_type, length = struct.unpack_from("<II", data, pos)
+        if block_type == _EPB:
+            _, hi, lo, cap_len, _ = struct.unpack_from("<IIIII", data, pos + 8)
+            frame = data[pos + 28:pos + 28 + cap_len]
+            direction = None
+            opt = pos + 28 + cap_len + (-cap_len % 4)
+            while opt < pos + length - 4:
+                code, olen = struct.unpack_from("<HH", data, opt)
+                if code == _EPB_FLAGS:
+                    direction = struct.unpack_from("<I", data, opt + 4)[0] & 3
+                if code == _OPT_END:
+                    break
+                opt += 4 + olen + (-olen % 4)
+            yield (hi << 32 | lo, direction, frame)
+        pos += length
@@ -0,0 +1,184 @@
+"""
+Replays the client side of a real capture into the RgmiiPhy of a testbench.
+
+Frames sent to the server of the capture are rewritten to the testbench's
+MAC and IP addresses and sent with their original spacing, scaled by
+'time_scale'. The server in the capture picked its own initial sequence
+number, so acknowledgements are shifted by the difference to the one the
+HDL sends in its SYN-ACK. That matches as long as the HDL sends the same
+number of bytes as the original server, otherwise it sees stale acks and
+retransmits, which is worth knowing about too.
+
+Every frame the HDL sends is kept, and written to 'capture' if given, so
+responses can be diffed against the capture with tcp_streams.
+"""
+import cocotb
+from cocotb.triggers import Event, Timer, with_timeout
+from cocotb.utils import get_sim_time
+from cocotbext.eth import GmiiFrame
+from scapy.all import Ether, IP, TCP, PcapReader
+from tcp.pcap import INBOUND, OUTBOUND, open_capture
+
+SEQ_MOD = 1 << 32
+
+
+def load_frames(path):
+    """
+    (time_ns, Ether) of every TCP/IPv4 frame in a pcap or pcapng file.
+    """
+    frames = []
+    with PcapReader(str(path)) as reader:
+        for pkt in reader:
+            if Ether in pkt and IP in pkt and TCP in pkt:
+                frames.append((int(pkt.time * 1_000_000_000), pkt[Ether]))
+    return frames
+
+
+def find_server(frames):
+    """
+    (ip, port) the first SYN of the capture was sent to.
+    """
+    for _, pkt in frames:
+        if pkt[TCP].flags == "S":
+            return pkt[IP].dst, pkt[TCP].dport
+    raise ValueError("no SYN in capture, pass server=(ip, port)")
+
+
+def tcp_streams(frames, src_port):
+    """
+    Payload sent from 'src_port' to each peer (ip, port), in sequence order
+    with retransmissions dropped. 'frames' are (time_ns, Ether) or
+    (time_ns, bytes).
+    """
+    segments = {}
+    for _, pkt in frames:
+        if not isinstance(pkt, Ether):
+            pkt = Ether(pkt)
+        if TCP not in pkt or pkt[TCP].sport != src_port:
+            continue
+        data = bytes(pkt[TCP].payload)
+        # Ethernet padding of short frames is not payload
+        data = data[:pkt[IP].len - pkt[IP].ihl * 4 - pkt[TCP].dataofs * 4]
+        if data:
+            segments.setdefault((pkt[IP].dst, pkt[TCP].dport), {})[pkt[TCP].seq] = data
+    return {peer: b"".join(d for _, d in sorted(segs.items())) for peer, segs in segments.items()}
+
+
+class PcapReplay:
+    """
+    Replay of the client frames of 'path' towards 'server_ip':'server_port'.
+    'server' picks the server of the capture, by default the destination of
+    its first SYN. 'max_gap_ns' clips idle periods after scaling.
+    """
+
+    def __init__(self, tb, path, dst_mac, src_mac, server_ip, server_port, time_scale=1.0,
+                 server=None, client_ip=None, max_gap_ns=None, capture=None, ack_timeout_us=200):
+        self.tb = tb
+        self.frames = load_frames(path)
+        self.server = server or find_server(self.frames)
+        self.dst_mac = dst_mac
+        self.src_mac = src_mac
+        self.server_ip = server_ip
+        self.server_port = server_port
+        self.time_scale = time_scale
+        self.client_ip = client_ip
+        self.max_gap_ns = max_gap_ns
+        self.ack_timeout_us = ack_timeout_us
+        self.capture = open_capture(capture) if capture else None
+        self.sent = []
+        self.received = []
+        # client (ip, port) -> initial sequence number of the server
+        self._orig_isn = {}
+        self._hdl_isn = {}
+        self._hdl_isn_known = {}
+        for _, pkt in self.frames:
+            if self._from_server(pkt) and pkt[TCP].flags == "SA":
+                self._orig_isn.setdefault(self._client(pkt[IP].dst, pkt[TCP].dport), pkt[TCP].seq)
+
+    def _from_server(self, pkt):
+        return (pkt[IP].src, pkt[TCP].sport) == self.server
+
+    def _to_server(self, pkt):
+        return (pkt[IP].dst, pkt[TCP].dport) == self.server
+
+    def _client(self, ip, port):
+        return (self.client_ip or ip, port)
+
+    def rewrite(self, pkt):
+        """
+        Copy of client frame 'pkt' addressed to the testbench, without the
+        ack shift.
+        """
+        ip = pkt[IP].copy()
+        ip.src = self.client_ip or ip.src
+        ip.dst = self.server_ip
+        ip[TCP].dport = self.server_port
+        del ip.chksum
+        del ip[TCP].chksum
+        return Ether(dst=self.dst_mac, src=self.src_mac) / ip
+
+    async def _monitor(self):
+        while True:
+            frame = await self.tb.rgmii_phy.tx.recv()
+            data = frame.get_payload()
+            now = get_sim_time("ns")
+            self.received.append((now, data))
+            if self.capture is not None:
+                self.capture.write(data, now, INBOUND)
+            pkt = Ether(data)
+            if TCP in pkt and pkt[TCP].flags == "SA":
+                client = (pkt[IP].dst, pkt[TCP].dport)
+                self._hdl_isn[client] = pkt[TCP].seq
+                self._hdl_isn_known.setdefault(client, Event()).set()
+
+    async def _shift_ack(self, pkt, client):
+        if not pkt[TCP].flags.A or client not in self._orig_isn:
+            return
+        if client not in self._hdl_isn:
+            known = self._hdl_isn_known.setdefault(client, Event())
+            await with_timeout(known.wait(), self.ack_timeout_us, "us")
+        pkt[TCP].ack = (pkt[TCP].ack - self._orig_isn[client] + self._hdl_isn[client]) % SEQ_MOD
+
+    async def run(self):
+        """
+        Sends every client frame, returns once the last one is on the wire.
+        Frames from the HDL keep being collected afterwards.
+        """
+        cocotb.start_soon(self._monitor())
+        start = get_sim_time("ns")
+        offset = 0
+        prev = None
+        for t, pkt in self.frames:
+            if not self._to_server(pkt):
+                continue
+            if prev is not None:
+                gap = (t - prev) * self.time_scale
+                if self.max_gap_ns is not None:
+                    gap = min(gap, self.max_gap_ns)
+                offset += gap
+            prev = t
+            wait = start + offset - get_sim_time("ns")
+            if wait >= 1:
+                await Timer(int(wait), "ns")
+            out = self.rewrite(pkt)
+            await self._shift_ack(out, self._client(pkt[IP].src, pkt[TCP].sport))
+            data = bytes(out)
+            now = get_sim_time("ns")
+            self.sent.append((now, data))
+            if self.capture is not None:
+                self.capture.write(data, now, OUTBOUND)
+            await self.tb.rgmii_phy.rx.send(GmiiFrame.from_payload(data))
+
+    def responses(self):
+        """
+        Bytes the HDL sent to each client, to diff with
+        tcp_streams(self.frames, server port of the capture).
+        """
+        return tcp_streams(self.received, self.server_port)
+
+    def original_responses(self):
+        """
+        Bytes the server of the capture sent, keyed like responses().
+        """
+        streams = tcp_streams(self.frames, self.server[1])
+        return {self._client(ip, port): data for (ip, port), data in streams.items()}
@@ -7,9 +7,9 @@ from scapy.layers.inet import TCP, IP
 from scapy.packet import Raw
 from scapy.volatile import RandString
 from cocotb.runner import get_runner
-from cocotb.clock import Clock
 from cocotb.triggers import RisingEdge, with_timeout, ReadWrite
 from cocotb.binary import BinaryValue
+from common.clocks import start_clock
 
 
 class TB:
@@ -18,8 +18,8 @@ class TB:
 
         self.log = logging.getLogger("cocotb.tb")
         self.log.setLevel(logging.DEBUG)
-        cocotb.start_soon(Clock(dut.clk, 8, units='ns').start())
-        cocotb.start_soon(Clock(dut.sys_clk, 8, units='ns').start())
+        start_clock(dut.clk, 8)
+        start_clock(dut.sys_clk, 8)
 
     async def reset(self, signal):
         signal.setimmediatevalue(0)
@@ -1,12 +1,12 @@
 import pytest
 import cocotb
 import os
-from pathlib import Path
-from cocotb.triggers import RisingEdge, with_timeout
-from cocotb.clock import Clock, Timer
-from cocotb.utils import get_sim_steps
-from cocotb_tools.runner import get_runner
+from cocotb.triggers import RisingEdge, with_timeout, Timer
+from common.clocks import start_clock
+from common.integration import TOPLEVEL, integration_build_kwargs
+from common.profiles import run_profiled
 from scapy.all import Raw, RandString, Ether, TCP, IP
+from tcp.model import TcpScoreboard
 from tcp.utils import TCPIntegrated, TCP_client_sim, PacketGen, PayloadLossyClient, TCP_rst_client, SynAckLossyClient
 from cocotbext.eth import GmiiFrame, RgmiiPhy
 
@@ -27,27 +27,15 @@ class TB:
         self.dut = dut
 
         if speed_100:
-            cocotb.start_soon(Clock(dut.clk, 40, units='ns').start())
-            cocotb.start_soon(self._run_clocks(dut.clk90, 90, 40))
+            start_clock(dut.clk, 40)
+            start_clock(dut.clk90, 40, phase=90)
         else:
-            cocotb.start_soon(self._run_clocks(dut.clk, 0, 8))
-            cocotb.start_soon(self._run_clocks(dut.clk90, 90, 8))
+            start_clock(dut.clk, 8)
+            start_clock(dut.clk90, 8, phase=90)
         dut.rst.value = cocotb.handle.Immediate(1)
         self.rgmii_phy = RgmiiPhy(dut.phy_txd, dut.phy_txctl, dut.phy_txc,
                                   dut.phy_rxd, dut.phy_rxctl, dut.phy_rxc, dut.rst, speed=100e6 if speed_100 else 1000e6)
 
-    async def _run_clocks(self, port, phase, period):
-        half_period = get_sim_steps(period / 2.0, 'ns')
-        t = Timer(half_period)
-
-        if phase > 0:
-            await Timer(phase/360.0 * period, 'ns')
-        while True:
-            port.value = cocotb.handle.Immediate(1)
-            await t
-            port.value = cocotb.handle.Immediate(0)
-            await t
-
     async def reset(self):
         self.dut.rst.setimmediatevalue(1)
         await RisingEdge(self.dut.clk)
@@ -124,6 +112,32 @@ async def tcp_integration_full(dut):
     await Timer(5000, "ns")
 
 
+@cocotb.test()
+async def tcp_model_lockstep(dut):
+    """
+    Every frame of an echo connection checked against the reference model.
+    """
+    speed_100 = os.getenv("SPEED_100M", None)
+    tb = TB(dut, speed_100 is not None)
+
+    await tb.reset()
+    tb.dut.tcp_echo_en.value = 1
+    client_ref = []
+    gen = PacketGen(client_ip, client_port)
+    scoreboard = TcpScoreboard(echo=True, clock_ns=40 if speed_100 else 8)
+    tcp = TCPIntegrated(tb, True, dst_mac, src_mac, scoreboard=scoreboard)
+    cocotb.start_soon(cocotb.task.bridge(TCP_client_sim)(
+        tcp, client_ref, False, server_ip, server_port, client_ip, client_port, external_fd={"tcp": gen}))
+    await Timer(5000, "ns")
+    for size in (21, 1, 300, 64):
+        gen.from_bench.put(Raw(RandString(size=size)))
+        await Timer(5000, "ns")
+    client_ref[0].stop(wait=False)
+    await Timer(10000, "ns")
+    scoreboard.assert_clean()
+    assert scoreboard.checked > 0
+
+
 @cocotb.test()
 async def tcp_connect_multi(dut):
     speed_100 = os.getenv("SPEED_100M", None)
@@ -274,65 +288,6 @@ def check(b, payload):
 def test_simple_dff_runner(speed_100):
     sim = os.getenv("SIM", "verilator")
 
-    source_folder = "../../rtl"
-    sources = [
-        "../../config.vlt",
-        "./test_tcp_integration.sv",
-        f"{source_folder}/utils.sv",
-        f"{source_folder}/cache.sv",
-        f"{source_folder}/http_decode.sv",
-        f"{source_folder}/http_entry.sv",
-        f"{source_folder}/mac_encode.sv",
-        f"{source_folder}/ram_wrap.sv",
-        f"{source_folder}/slab_allocator.sv",
-        f"{source_folder}/ram_sp.sv",
-        f"{source_folder}/sdram_dummy.sv",
-        f"{source_folder}/mac_decode.sv",
-        f"{source_folder}/synchronizer.sv",
-        f"{source_folder}/ebr.sv",
-        f"{source_folder}/tcp.sv",
-        f"{source_folder}/mac.sv",
-        f"{source_folder}/mac_tx.sv",
-        f"{source_folder}/oddr.sv",
-        f"{source_folder}/iddr.sv",
-        f"{source_folder}/lfsr_rng.sv",
-        f"{source_folder}/ip_encode.sv",
-        f"{source_folder}/tcp_encode.sv",
-        f"{source_folder}/tcp_arbiter.sv",
-        f"{source_folder}/tcp_sm.sv",
-        f"{source_folder}/tcp_decode.sv",
-        f"{source_folder}/ip_decode.sv",
-        f"{source_folder}/arp_decode.sv",
-        f"{source_folder}/arp_encode.sv",
-        f"{source_folder}/rgmii_rcv.sv",
-        f"{source_folder}/rgmii_tx.sv",
-        f"{source_folder}/clk_divider.sv",
-        f"{source_folder}/delay.sv",
-        f"{source_folder}/fifo.sv",
-        f"{source_folder}/pulse_stretcher.sv",
-        f"{source_folder}/tcb.sv",
-        f"{source_folder}/crc32.sv"]
-
-    runner = get_runner(sim)
-    runner.build(
-        sources=sources,
-        hdl_toplevel="test_tcp_integration",
-        always=True,
-        clean=True,
-        waves=True,
-        verbose=True,
-        defines={"SPEED_100M": "True"} if speed_100 else {},
-        includes=[f"{source_folder}/"],
-        build_args=["--threads", "8", "--trace-fst",
-                    "--trace-structs", "--bbox-unsup",
-                    "-y", "/home/bawj/lscc/diamond/3.14/cae_library/simulation/verilog/ecp5u/",
-                    "-y", "/home/bawj/lscc/diamond/3.14/cae_library/simulation/vhdl/ecp5u/", "--timing"
-                    ] if sim == "verilator" else [
-            "-y/home/bawj/lscc/diamond/3.14/cae_library/simulation/verilog/ecp5u/"],
-        timescale=("1ns", "1ps"),
-    )
-
-    runner.test(waves=True,
-                verbose=True,
-                extra_env={"SPEED_100M": "True"} if speed_100 else {},
-                hdl_toplevel="test_tcp_integration", test_module="test_tcp_integration")
+    run_profiled(sim, integration_build_kwargs(sim, speed_100),
+                 dict(extra_env={"SPEED_100M": "True"} if speed_100 else {},
+                      hdl_toplevel=TOPLEVEL, test_module="test_tcp_integration"))
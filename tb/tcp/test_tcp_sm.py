@@ -4,9 +4,9 @@ from utils import *
 from scapy.all import Raw, RandString
 
 import cocotb
-from cocotb_tools.runner import get_runner
-from cocotb.clock import Clock, Timer
-from cocotb.triggers import RisingEdge, with_timeout, ReadWrite
+from common.clocks import start_clock
+from common.profiles import run_profiled
+from cocotb.triggers import RisingEdge, with_timeout, ReadWrite, Timer
 
 
 class TB(TCPSimSock):
@@ -14,7 +14,7 @@ class TB(TCPSimSock):
         self.dut = dut
         self.log = logging.getLogger("cocotb.tb")
         self.log.setLevel(logging.DEBUG)
-        cocotb.start_soon(Clock(dut.clk, 8, units='ns').start())
+        start_clock(dut.clk, 8)
         super().__init__(self.dut.clk, self.dut.tcp_arb_rdy,
                          self.dut.packet, self.dut.tcp_packet_rx, self.dut.pkt_tx_en, self.dut.pkt_to_send)
 
@@ -73,7 +73,7 @@ async def tcp_tcb_creation(dut):
     payload = Raw(RandString(size=120))
     packet = IP() / TCP(sport=5000) / payload
     packet.show2()
-    sv_packet = TcpPacketSV.from_scapy(packet, 2)
+    sv_packet = TcpPacketSV.from_scapy(packet)
     tb.dut.packet.value = sv_packet.to_binaryvalue()
     tb.dut.tcp_packet_rx.value = 1
     await RisingEdge(tb.dut.clk)
@@ -82,10 +82,7 @@ async def tcp_tcb_creation(dut):
     await RisingEdge(tb.dut.clk)
 
     assert tb.dut.sm_reject_payload.value == 1
-    decoder = TcbDecoder(
-        buff_width=2,
-        buff_size=4
-    )
+    decoder = TcbDecoder()
     tcb = decoder.from_signal(tb.dut.tcb_sm.value)
     # check that a new TCB is created with expected parameters
     assert tcb["peer_addr"] == sv_packet.peer_addr
@@ -128,19 +125,19 @@ def test_tcp_sm():
         f"{source_folder}/pulse_gen.sv",
         "test_tcp_sm.sv"]
 
-    runner = get_runner(sim)
-    runner.build(
-        sources=sources,
-        hdl_toplevel="test_tcp_sm",
-        waves=True,
-        verbose=True,
-        includes=[f"{source_folder}/"],
-        build_args=["--threads", "8", "--trace-fst",
-                    "--trace-structs"] if sim == "verilator" else [],
-        # build_args=["-y/home/bawj/lscc/diamond/3.14/cae_library/simulation/verilog/ecp5u/"],
-        timescale=("1ns", "1ps"),
-    )
-
-    runner.test(waves=True,
-                verbose=True,
-                hdl_toplevel="test_tcp_sm", test_module="test_tcp_sm,")
+    run_profiled(
+        sim,
+        dict(sources=sources,
+             hdl_toplevel="test_tcp_sm",
+             includes=[f"{source_folder}/"],
+             build_args=["--threads", "8"] if sim == "verilator" else [],
+             timescale=("1ns", "1ps")),
+        dict(hdl_toplevel="test_tcp_sm", test_module="test_tcp_sm,"))
+
+
+def test_tcp_model_explore():
+    from tcp.model import explore
+    for echo in (False, True):
+        failures = explore(int(os.getenv("TB_MODEL_SCENARIOS", "2000")),
+                           seed=int(os.getenv("TB_SEED", "0")), echo=echo)
+        assert not failures, failures[:5]
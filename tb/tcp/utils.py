@@ -1,47 +1,200 @@
 from scapy.layers.http import HTTP
 from cocotbext.eth import GmiiFrame
 from cocotb.types import LogicArray
-from multiprocessing import Queue
-from cocotb.triggers import RisingEdge, ReadWrite, with_timeout
+from collections import deque
+from queue import Empty
+from cocotb.triggers import RisingEdge, ReadWrite, with_timeout, Event, First
 from scapy.automaton import ATMT
 import socket
 import cocotb
 from cocotb.clock import Timer
+from cocotb.utils import get_sim_time
+from tcp.pcap import INBOUND, OUTBOUND, open_capture
 import asyncio
+import functools
+import os
+import re
+from pathlib import Path
 from scapy.all import Raw, Ether, TCP, IP, TCP_client, Padding, RandString
 
 
+def signal_int(value):
+    """
+    Integer of a packed signal value, whichever type the simulator handed out.
+    """
+    if hasattr(value, "to_unsigned"):
+        return value.to_unsigned()
+    if hasattr(value, "buff"):
+        # BinaryValue, buff is MSB first and padded on the left to whole bytes
+        return int.from_bytes(value.buff, "big")
+    return int(value)
+
+
+class StructCodec:
+    """
+    Packs and unpacks a SystemVerilog packed struct as one integer.
+
+    'fields' are listed MSB first like the typedef, either (name, width) or
+    (name, codec, count) for a packed array of structs, whose element 0 is
+    the one at the MSB end. Shifts and masks are worked out once here, a
+    value is then sliced with a single shift and mask per field instead of
+    bit by bit.
+    """
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.width = 0
+        for f in fields:
+            self.width += f[1].width * f[2] if isinstance(f[1], StructCodec) else f[1]
+        # (name, shift, mask, codec or None, count)
+        self._table = []
+        shift = self.width
+        for f in fields:
+            if isinstance(f[1], StructCodec):
+                codec, count = f[1], f[2]
+                shift -= codec.width * count
+                shifts = tuple(shift + codec.width * (count - 1 - i) for i in range(count))
+                self._table.append((f[0], shifts, (1 << codec.width) - 1, codec))
+            else:
+                shift -= f[1]
+                self._table.append((f[0], shift, (1 << f[1]) - 1, None))
+
+    def unpack(self, value):
+        """
+        Dict of the fields of 'value', an int, bytes (MSB first) or signal value.
+        """
+        if isinstance(value, (bytes, bytearray)):
+            value = int.from_bytes(value, "big")
+        elif not isinstance(value, int):
+            value = signal_int(value)
+        out = {}
+        for name, shift, mask, codec in self._table:
+            if codec is None:
+                out[name] = (value >> shift) & mask
+            else:
+                out[name] = [codec.unpack((value >> sh) & mask) for sh in shift]
+        return out
+
+    def pack(self, fields):
+        """
+        Integer of 'fields', a dict or an object with the fields as
+        attributes. Missing fields are 0, values are truncated to their width.
+        """
+        get = fields.get if isinstance(fields, dict) else lambda n, d: getattr(fields, n, d)
+        value = 0
+        for name, shift, mask, codec in self._table:
+            if codec is None:
+                value |= (get(name, 0) & mask) << shift
+            else:
+                for sh, element in zip(shift, get(name, ())):
+                    value |= codec.pack(element) << sh
+        return value
+
+    def to_logic(self, fields):
+        return LogicArray.from_unsigned(self.pack(fields), self.width)
+
+
+RTL_DIR = Path(__file__).resolve().parents[2] / "rtl"
+
+_SV_COMMENT = re.compile(r"//[^\n]*|/\*.*?\*/", re.S)
+_SV_NUMBER = re.compile(r"(\d*)'([bodhBODH])([0-9a-fA-F_xXzZ]+)")
+_SV_DECL = re.compile(
+    r"localparam\s+(?:\w+\s+)?(?P<param>\w+)\s*=\s*(?P<value>[^;]+);"
+    r"|typedef\s+enum\s+(?:\w+\s*)?(?P<enum_dims>(?:\[[^\]]+\]\s*)*)\{(?P<members>[^}]*)\}\s*(?P<enum>\w+)\s*;"
+    r"|typedef\s+struct\s+packed\s*\{(?P<fields>.*?)\}\s*(?P<struct>\w+)\s*;", re.S)
+_SV_FIELD = re.compile(r"(?P<type>\w+)\s*(?P<dims>(?:\[[^\]]+\]\s*)*)(?P<name>\w+)")
+_SV_DIM = re.compile(r"\[([^:\]]+):([^\]]+)\]")
+
+
+class SvPackage:
+    """
+    localparams, enums and packed structs of a SystemVerilog package, with a
+    StructCodec per struct. Only the subset used by rtl/ is understood:
+    logic/reg/bit fields with packed dimensions, enum and struct typedefs of
+    the same package, and localparam expressions using $clog2.
+    """
+
+    def __init__(self, text):
+        self.params = {}
+        # name -> (width, {member: value})
+        self.enums = {}
+        self.structs = {}
+        for m in _SV_DECL.finditer(_SV_COMMENT.sub("", text)):
+            if m["param"]:
+                self.params[m["param"]] = self.eval(m["value"])
+            elif m["enum"]:
+                self.enums[m["enum"]] = (self._width(m["enum_dims"]), self._members(m["members"]))
+            else:
+                self.structs[m["struct"]] = StructCodec(
+                    [self._field(f) for f in m["fields"].split(";") if f.strip()])
+
+    def eval(self, expr):
+        expr = _SV_NUMBER.sub(lambda m: str(int(m[3].replace("_", ""),
+                                                {"b": 2, "o": 8, "d": 10, "h": 16}[m[2].lower()])), expr)
+        expr = expr.replace("$clog2", "clog2")
+        env = dict(self.params, clog2=lambda x: max(x - 1, 0).bit_length())
+        return int(eval(expr.strip(), {"__builtins__": {}}, env))
+
+    def _width(self, dims):
+        """
+        Bits of a set of packed dimensions, 1 for none.
+        """
+        width = 1
+        for msb, lsb in _SV_DIM.findall(dims or ""):
+            width *= abs(self.eval(msb) - self.eval(lsb)) + 1
+        return width
+
+    def _members(self, text):
+        members = {}
+        value = 0
+        for item in text.split(","):
+            name, _, init = item.partition("=")
+            if init.strip():
+                value = self.eval(init)
+            members[name.strip()] = value
+            value += 1
+        return members
+
+    def _field(self, text):
+        m = _SV_FIELD.search(text)
+        if m is None:
+            raise ValueError(f"cannot parse struct field '{text.strip()}'")
+        kind, dims = m["type"], m["dims"]
+        if kind in self.structs:
+            return (m["name"], self.structs[kind], self._width(dims))
+        if kind in self.enums:
+            return (m["name"], self.enums[kind][0] * self._width(dims))
+        if kind in ("logic", "reg", "bit", "wire"):
+            return (m["name"], self._width(dims))
+        raise ValueError(f"unknown type '{kind}' of field '{m['name']}'")
+
+
+@functools.lru_cache(maxsize=None)
+def _load_sv_package(path, mtime):
+    return SvPackage(Path(path).read_text())
+
+
+def load_sv_package(path):
+    """
+    SvPackage of 'path', parsed once per change of the file.
+    """
+    path = Path(path)
+    return _load_sv_package(str(path), path.stat().st_mtime_ns)
+
+
+TCP_PKG = load_sv_package(RTL_DIR / "tcp.sv")
+
+
 class TcpPacketSV:
     """
-    Python representation of SystemVerilog:
-      typedef struct packed {
-        logic [31:0] ip_source_addr;
-        logic [BUFF_WIDTH-1:0] payload_addr;
-        logic [15:0] payload_size;
-        logic [15:0] checksum;
-        logic [7:0]  flags;
-        logic [15:0] peer_port;
-        logic [15:0] window;
-        logic [31:0] ack_num;
-        logic [31:0] sequence_num;
-      } packet_t;
+    Python representation of tcp::packet_t, the layout is read from
+    rtl/tcp.sv.
     """
 
-    FIELD_LAYOUT = [
-        ("peer_addr", 32),
-        ("peer_port",      16),
-        ("payload_addr",   19),  # resolved at runtime
-        ("payload_size",   16),
-        ("checksum",       16),
-        ("flags",          8),
-        ("window",         16),
-        ("ack_num",        32),
-        ("sequence_num",   32),
-    ]
-
-    def __init__(self, buff_width):
-        self.buff_width = buff_width
+    CODEC = TCP_PKG.structs["packet_t"]
+    FIELD_LAYOUT = CODEC.fields
 
+    def __init__(self):
         # field defaults
         self.peer_addr = 0
         self.payload_addr = 0
@@ -56,9 +209,9 @@ class TcpPacketSV:
     # -------- construction helpers --------
 
     @classmethod
-    def from_scapy(cls, packet, buff_width, payload_addr=0, checksum=0):
+    def from_scapy(cls, packet, payload_addr=0, checksum=0):
         """Create SV packet_t from a Scapy IP/TCP packet."""
-        obj = cls(buff_width)
+        obj = cls()
 
         obj.peer_addr = int.from_bytes(
             socket.inet_aton(packet["IP"].src), "big"
@@ -76,32 +229,16 @@ class TcpPacketSV:
 
     # -------- packing logic --------
 
-    def _resolve_width(self, width):
-        return self.buff_width if width == "BUFF_WIDTH" else width
-
     def total_width(self):
-        return sum(self._resolve_width(w) for _, w in self.FIELD_LAYOUT)
+        return self.CODEC.width
 
     def pack_int(self):
         """Pack struct into a single integer (SV packed ordering)."""
-        value = 0
-        shift = self.total_width()
-
-        for field, width in self.FIELD_LAYOUT:
-            width = self._resolve_width(width)
-            shift -= width
-            field_val = getattr(self, field) & ((1 << width) - 1)
-            value |= field_val << shift
-
-        return value
+        return self.CODEC.pack(self)
 
     def to_binaryvalue(self):
-        """Return cocotb BinaryValue ready for dut.packet assignment."""
-        return LogicArray.from_unsigned(
-            self.pack_int(),
-            self.total_width(),
-            # packed structs map MSB→LSB; cocotb expects this
-        )
+        """Return cocotb LogicArray ready for dut.packet assignment."""
+        return self.CODEC.to_logic(self)
 
     # -------- debug --------
 
@@ -112,87 +249,27 @@ class TcpPacketSV:
 
 
 class ConnState:
-    LISTEN = 0
-    SYN_RECV = 1
-    ESTABLISHED = 2
-    FINWAIT = 3
-    FINWAIT2 = 4
-    CLOSEWAIT = 5
-    CLOSING = 6
-    LASTACK = 7
-    TIMEWAIT = 8
-    CLOSED = 9
-
-    _names = {
-        0: "LISTEN",
-        1: "SYN_RECV",
-        2: "ESTABLISHED",
-        3: "FINWAIT",
-        4: "FINWAIT2",
-        5: "CLOSEWAIT",
-        6: "CLOSING",
-        7: "LASTACK",
-        8: "TIMEWAIT",
-        9: "CLOSED",
-    }
+    """
+    tcp::CONN_STATE, one attribute per member e.g. ConnState.ESTABLISHED.
+    """
+    _names = {v: n for n, v in TCP_PKG.enums["CONN_STATE"][1].items()}
 
     @classmethod
     def name(cls, val):
         return cls._names.get(val, f"UNKNOWN({val})")
 
 
-class BitStreamReader:
-    """
-    MSB-first bit reader over BinaryValue.buff
-    Matches SystemVerilog packed struct layout.
-    """
-
-    def __init__(self, binary_value):
-        self.buff = binary_value.buff  # bytearray
-        self.total_bits = len(self.buff) * 8
-        # if the signal is not byte aligned e.g 180 bits, the buff attribute will include padded 0 bits
-        pad_bits = (len(self.buff) * 8) - len(binary_value.binstr)
-        self.bitpos = pad_bits  # MSB index
-
-    def read_bits(self, width):
-        """Read 'width' bits and return integer."""
-        value = 0
-        for _ in range(width):
-            byte_index = self.bitpos // 8
-            bit_index = 7 - (self.bitpos % 8)  # MSB-first
-
-            bit = (self.buff[byte_index] >> bit_index) & 1
-            value = (value << 1) | bit
-
-            self.bitpos += 1
-
-        return value
+for _name, _value in TCP_PKG.enums["CONN_STATE"][1].items():
+    setattr(ConnState, _name, _value)
 
 
 class PacketTDecoder:
-    def __init__(self, buff_width=2):
-        self.buff_width = buff_width
-
-    def unpack(self, reader: BitStreamReader):
-        pkt = {}
-
-        pkt["peer_addr"] = reader.read_bits(32)
-        pkt["peer_port"] = reader.read_bits(16)
-        pkt["payload_addr"] = reader.read_bits(19)
-        pkt["payload_size"] = reader.read_bits(16)
-        pkt["checksum"] = reader.read_bits(16)
-        pkt["flags"] = reader.read_bits(8)
-        pkt["window"] = reader.read_bits(16)
-        pkt["ack_num"] = reader.read_bits(32)
-        pkt["sequence_num"] = reader.read_bits(32)
-
-        return pkt
+    def unpack(self, value):
+        return TcpPacketSV.CODEC.unpack(value)
 
     def signal_to_scapy(self, signal_value):
-        reader = BitStreamReader(signal_value)
-        pkt = self.unpack(reader)
+        pkt = self.unpack(signal_value)
         peer_addr = socket.inet_ntoa(pkt["peer_addr"].to_bytes(4))
-        print(signal_value.buff)
         scap = IP(
             src="0.0.0.0",
             dst=peer_addr
@@ -207,43 +284,17 @@ class PacketTDecoder:
 
 
 class TcbDecoder:
-    def __init__(self, buff_width, buff_size):
-        self.buff_width = buff_width
-        self.buff_size = buff_size
-        self.packet_decoder = PacketTDecoder(buff_width)
+    def __init__(self):
+        self.codec = TCP_PKG.structs["tcb_t"]
 
     def from_signal(self, signal_value):
-        reader = BitStreamReader(signal_value)
-        tcb = {}
-
-        # base
-        tcb["peer_addr"] = reader.read_bits(32)
-        tcb["peer_port"] = reader.read_bits(16)
-        tcb["sequence_num"] = reader.read_bits(32)
-        tcb["ack_num"] = reader.read_bits(32)
-        tcb["window"] = reader.read_bits(16)
-
-        # to_be_sent
-        tcb["to_be_sent"] = [
-            self.packet_decoder.unpack(reader)
-            for _ in range(self.buff_size)
-        ]
-
-        tcb["to_be_sent_wr_ptr"] = reader.read_bits(self.buff_width + 1)
-        tcb["to_be_sent_rd_ptr"] = reader.read_bits(self.buff_width + 1)
-
-        # to_be_ack
-        tcb["to_be_ack"] = [
-            self.packet_decoder.unpack(reader)
-            for _ in range(self.buff_size)
-        ]
-
-        tcb["to_be_ack_wr_ptr"] = reader.read_bits(self.buff_width + 1)
-        tcb["to_be_ack_rd_ptr"] = reader.read_bits(self.buff_width + 1)
-
-        tcb["state"] = reader.read_bits(4)
-
-        return tcb
+        """
+        Fields of a tcb_t. A value wider than the struct is sliced from its
+        MSB end, like the bit reader this replaced.
+        """
+        value = signal_int(signal_value)
+        extra = len(signal_value) - self.codec.width
+        return self.codec.unpack(value >> extra if extra > 0 else value)
 
 
 class TCP_client_sim(TCP_client):
@@ -333,9 +384,42 @@ class SynAckLossyClient(TCP_client_sim):
         return super().master_filter(pkt)
 
 
+class SimQueue:
+    """
+    Frames between the bench and the scapy Automaton. The Automaton runs in a
+    bridged thread that only executes while the simulator is paused, so a
+    plain deque is enough. 'ready' is set by every put and is what select
+    waits on.
+    """
+
+    def __init__(self):
+        self._items = deque()
+        self.ready = Event()
+
+    def put(self, item, block=False):
+        self._items.append(item)
+        self.ready.set()
+
+    put_nowait = put
+
+    def get(self, block=False):
+        if not self._items:
+            raise Empty
+        return self._items.popleft()
+
+    get_nowait = get
+
+    def empty(self):
+        return not self._items
+
+
 class TCPSimSock:
+    # Automaton commands such as stop() go through a pipe that cannot wake
+    # select, it is looked at this often while no frame arrives
+    CMD_POLL_NS = 1000
+
     def __init__(self, sig_clk, sig_rdy=None, sig_pkt=None, sig_pkt_rx=None, sig_pkt_txen=None, sig_pkt_to_send=None):
-        self.from_hdl = Queue()
+        self.from_hdl = SimQueue()
         self.pkt_decoder = PacketTDecoder()
         self.sig_clk = sig_clk
         self.sig_rdy = sig_rdy
@@ -361,7 +445,7 @@ class TCPSimSock:
             await RisingEdge(self.sig_clk)
             await ReadWrite()
         cocotb.log.info("packet to HDL")
-        sv_packet = TcpPacketSV.from_scapy(pkt, 2)
+        sv_packet = TcpPacketSV.from_scapy(pkt)
         self.sig_pkt.value = sv_packet.to_binaryvalue()
         self.sig_pkt_rx.value = 1
         await self.reset_pkt_sent()
@@ -386,21 +470,17 @@ class TCPSimSock:
         assert False
         assert pkt.chksum != calculated_from_hdl
 
-    async def recv_pkt_from_hdl(self):
-        await RisingEdge(self.sig_clk)
+    def recv(self):
+        # the simulator is paused while the Automaton runs, no need to sync
         if self.from_hdl.empty():
             return None
         return self.from_hdl.get()
 
-    def recv(self):
-        return cocotb.task.resume(self.recv_pkt_from_hdl)()
-
-    @ staticmethod
-    def select(sockets, remain=None):
+    @staticmethod
+    def _ready(sockets):
         # first element is "cmdin" we are trying to return ourselves back to Automaton i.e. listen_socket
         new = []
         for s in sockets:
-
             if hasattr(s, "from_hdl") and s.from_hdl.empty():
                 continue
             if hasattr(s, "from_bench") and s.from_bench.empty():
@@ -411,14 +491,25 @@ class TCPSimSock:
                 if hasattr(s.rd, "empty") and s.rd.empty():
                     continue
             new.append(s)
+        return new
 
+    @staticmethod
+    def select(sockets, remain=None):
+        new = TCPSimSock._ready(sockets)
         if len(new) == 0:
-            cocotb.task.resume(TCPSimSock.move_sim_time)()
+            # sleep in simulator time until a frame is queued
+            cocotb.task.resume(TCPSimSock.wait_ready)(sockets)
+            new = TCPSimSock._ready(sockets)
         return new
 
-    @ staticmethod
-    async def move_sim_time():
-        await Timer(10, "ns")
+    @staticmethod
+    async def wait_ready(sockets):
+        events = [q.ready for s in sockets
+                  for q in (getattr(s, "from_hdl", None), getattr(s, "from_bench", None))
+                  if isinstance(q, SimQueue)]
+        for e in events:
+            e.clear()
+        await First(*(e.wait() for e in events), Timer(TCPSimSock.CMD_POLL_NS, "ns"))
 
     def close(self):
         self.closed = True
@@ -433,12 +524,45 @@ class TCPSimSock:
         pass
 
 
+def check_checksums(rx_frame, rx):
+    """
+    Asserts the FCS of 'rx_frame' and the IP and TCP checksums of 'rx', its
+    dissection. Returns 'rx' rebuilt with both checksums recomputed.
+    """
+    assert rx_frame.check_fcs()
+    actual_ip_chksum = rx[IP].chksum
+    actual_tcp_chksum = rx[TCP].chksum
+    del rx[TCP].chksum
+    del rx[IP].chksum
+    rx = rx.__class__(bytes(rx))
+    assert rx[IP].chksum == actual_ip_chksum
+    assert rx[TCP].chksum == actual_tcp_chksum
+    return rx
+
+
 class TCPIntegrated(TCPSimSock):
-    def __init__(self, tb, echo, dst_mac, src_mac, dont_read=False):
+    """
+    Frames to and from the HDL are kept in a short history and, with
+    'capture' or the TB_PCAP environment variable set to a path, appended to
+    a pcapng file. Their dissection is only logged when a check fails, or for
+    every frame with TB_DUMP_FRAMES set. A 'scoreboard'
+    (tcp.model.TcpScoreboard) sees every frame as well. 'payload' holds the
+    HTTP bodies received, 'stream' the TCP payloads as sent, headers included.
+    """
+    HISTORY = 16
+
+    def __init__(self, tb, echo, dst_mac, src_mac, dont_read=False, capture=None,
+                 scoreboard=None):
         self.tb = tb
+        self.scoreboard = scoreboard
+        self.history = deque(maxlen=self.HISTORY)
+        capture = capture or os.getenv("TB_PCAP")
+        self.capture = open_capture(capture) if isinstance(capture, (str, Path)) else capture
+        self.dump_frames = os.getenv("TB_DUMP_FRAMES") is not None
         self.last = None
         self.recv_count = 0
         self.payload = bytearray()
+        self.stream = bytearray()
         self.echo = echo
         self.dst_mac = dst_mac
         self.src_mac = src_mac
@@ -448,41 +572,65 @@ class TCPIntegrated(TCPSimSock):
     async def send_pkt_to_hdl(self, pkt):
         await RisingEdge(self.tb.dut.clk)
         await ReadWrite()
-        cocotb.log.info("packet to HDL")
         pkt = Ether(dst=self.dst_mac, src=self.src_mac) / pkt
-        cocotb.log.info(pkt.show2(dump=True))
-        test_frame = GmiiFrame.from_payload(bytes(pkt))
+        frame = bytes(pkt)
+        self._record(OUTBOUND, frame)
+        cocotb.log.info(f"packet to HDL: {pkt.summary()}")
+        test_frame = GmiiFrame.from_payload(frame)
         self.last = pkt
         await self.tb.rgmii_phy.rx.send(test_frame)
 
+    def _record(self, direction, frame):
+        now = get_sim_time("ns")
+        self.history.append((now, direction, frame))
+        if self.capture is not None:
+            self.capture.write(frame, now, direction)
+        if self.dump_frames:
+            cocotb.log.info(Ether(frame).show2(dump=True))
+        if self.scoreboard is not None:
+            self.scoreboard.observe(direction == OUTBOUND, Ether(frame), now)
+
+    def dump_history(self):
+        """
+        Dissection of the last HISTORY frames, oldest first.
+        """
+        out = []
+        for now, direction, frame in self.history:
+            arrow = "to HDL" if direction == OUTBOUND else "from HDL"
+            out.append(f"--- {now:.0f} ns {arrow}\n{Ether(frame).show2(dump=True)}")
+        return "\n".join(out)
+
     async def recv_async(self):
+        if self.dont_read:
+            return
         while True:
-            if self.dont_read:
-                await Timer(10, "ns")
-                continue
             rx_frame = await with_timeout(self.tb.rgmii_phy.tx.recv(), 150, "us")
+            self._record(INBOUND, rx_frame.get_payload())
             rx = Ether(rx_frame.get_payload())
-            cocotb.log.info("packet received from HDL")
+            cocotb.log.info(f"packet received from HDL: {rx.summary()}")
             self.recv_count += 1
-            cocotb.log.info(rx.show2(dump=True))
-            assert rx_frame.check_fcs()
-            actual_ip_chksum = rx[IP].chksum
-            actual_tcp_chksum = rx[TCP].chksum
-            del rx[TCP].chksum
-            del rx[IP].chksum
-            rx = rx.__class__(bytes(rx))
-            assert rx[IP].chksum == actual_ip_chksum
-            assert rx[TCP].chksum == actual_tcp_chksum
-            if self.echo:
-                if Padding in rx:
-                    del rx[Padding]
-                if Padding in self.last:
-                    del self.last[Padding]
-                assert not self.last[TCP].payload or self.last[TCP].payload == rx[TCP].payload, "Payload not echoed properly"
+            try:
+                rx = self.check_frame(rx_frame, rx)
+            except AssertionError:
+                cocotb.log.error(f"check failed, last frames:\n{self.dump_history()}")
+                raise
+            # port 8080 dissects as HTTP, so Raw is the body alone
+            size = rx[IP].len - 4 * rx[IP].ihl - 4 * rx[TCP].dataofs
+            self.stream.extend(bytes(rx[TCP].payload)[:size])
             if Raw in rx:
                 self.payload.extend(HTTP(rx[Raw].load).load)
             self.from_hdl.put(rx, block=False)
 
+    def check_frame(self, rx_frame, rx):
+        rx = check_checksums(rx_frame, rx)
+        if self.echo:
+            if Padding in rx:
+                del rx[Padding]
+            if Padding in self.last:
+                del self.last[Padding]
+            assert not self.last[TCP].payload or self.last[TCP].payload == rx[TCP].payload, "Payload not echoed properly"
+        return rx
+
 
 class PacketGen:
     """
@@ -492,7 +640,7 @@ class PacketGen:
     def __init__(self, ip, port):
         self.payload = Raw(RandString(size=20))
         self.sent = 0
-        self.from_bench = Queue()
+        self.from_bench = SimQueue()
 
     def recv(self, n=None):
         cocotb.log.info("Packet gen triggered")
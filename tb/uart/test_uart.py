@@ -6,8 +6,8 @@ import pytest
 import cocotb
 from cocotbext.uart import UartSink
 from cocotb_tools.runner import get_runner
-from cocotb.clock import Clock
 from cocotb.triggers import RisingEdge
+from common.clocks import start_clock
 
 
 class TB:
@@ -16,7 +16,7 @@ class TB:
 
         self.log = logging.getLogger("cocotb.tb")
         self.log.setLevel(logging.DEBUG)
-        cocotb.start_soon(Clock(dut.clk, 8, units='ns').start())
+        start_clock(dut.clk, 8)
 
     async def reset(self, signal):
         signal.setimmediatevalue(0)
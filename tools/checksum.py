@@ -0,0 +1,87 @@
+"""
+Ones' complement sums of page payloads, as consumed by the TCP encoder.
+
+The sum is taken over big-endian 16 bit words (RFC 1071) and is neither
+inverted nor combined with the pseudo header; tcp_encode does that in HDL.
+"""
+import hashlib
+import json
+import sys
+from pathlib import Path
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _fold(total):
+    while total > 0xFFFF:
+        total = (total & 0xFFFF) + (total >> 16)
+    return total
+
+
+def calc_tcp_checksum(b):
+    """
+    End-around carry sum of 'b'. An odd trailing byte is padded with zero.
+    """
+    if len(b) % 2 != 0:
+        b = bytes(b) + b"\x00"
+    if np is not None:
+        # uint64 accumulator cannot overflow below 2^48 bytes of input
+        return _fold(int(np.frombuffer(b, dtype=">u2").sum(dtype=np.uint64)))
+
+    # Sum native order words and swap the folded result, byte order does not
+    # matter for a ones' complement sum (RFC 1071 section 2.B)
+    total = _fold(sum(memoryview(b).cast("H")))
+    if sys.byteorder == "little":
+        total = ((total & 0xFF) << 8) | (total >> 8)
+    return total
+
+
+class ChecksumCache:
+    """
+    On-disk map of sha256(payload) -> checksum so that unchanged pages are
+    never summed twice across builds.
+    """
+
+    def __init__(self, path=".checksum_cache.json"):
+        self.path = Path(path) if path else None
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        if self.path is not None and self.path.exists():
+            try:
+                self.entries = json.loads(self.path.read_text())
+            except ValueError:
+                # corrupt cache is simply rebuilt
+                self.entries = {}
+
+    def checksum(self, b):
+        key = hashlib.sha256(b).hexdigest()
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            value = calc_tcp_checksum(b)
+            self.entries[key] = value
+        else:
+            self.hits += 1
+        return value
+
+    def checksum_all(self, blobs, map_fn=map):
+        """
+        Checksums of 'blobs' in order. Misses are summed through 'map_fn', which
+        must keep the order of its results, e.g. Executor.map.
+        """
+        keys = [hashlib.sha256(b).hexdigest() for b in blobs]
+        # dict keeps the first blob of each key, duplicates are summed once
+        missing = {k: b for k, b in zip(keys, blobs) if k not in self.entries}
+        self.entries.update(zip(missing, map_fn(calc_tcp_checksum, missing.values())))
+        self.misses += len(missing)
+        self.hits += len(keys) - len(missing)
+        return [self.entries[k] for k in keys]
+
+    def save(self):
+        if self.path is None:
+            return
+        self.path.write_text(json.dumps(self.entries, sort_keys=True))
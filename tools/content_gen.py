@@ -1,5 +1,19 @@
 import argparse
+import gzip
+import os
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import partial
 from pathlib import Path
+from checksum import ChecksumCache
+from delta import DEFAULT_SECTOR_SIZE, write_delta
+from image import HEADER_BYTES, SDRAM_ROW_BYTES, align, open_image, pack_header, write_hex
+from layout import load_profile, optimize, page_weights, report
+from manifest import Manifest
+from minify import minify_html
+from route_hash import build as build_routes, buckets_for, fingerprint
 
 
 def _align_32(size):
@@ -9,69 +23,288 @@ def _align_32(size):
         return size + 4 - (size % 4)
 
 
-def calc_tcp_checksum(b: bytearray):
-    if len(b) % 2 != 0:
-        b.append(0x00)
-    print(b)
-    temp = 0
-    for i in range(0, len(b), 2):
-        temp += int.from_bytes(b[i:i+2], 'big')
-        if temp > 0xFFFF:
-            temp &= 0xFFFF
-            temp += 1
+NOTFOUND_HTTP = "HTTP/1.1 404 Not Found\r\nContent-Length: "
+BASE_HTTP = "HTTP/1.1 200 OK\r\nContent-Length: "
+GZIP_HTTP = "HTTP/1.1 200 OK\r\nContent-Encoding: gzip\r\nVary: Accept-Encoding\r\nContent-Length: "
+# tcb_serializer splits payloads into segments of this many bytes
+SEGMENT_BYTES = 1440
+# entries of the segment checksum EBR in http_entry. Unlike the route index
+# it is not backed by SDRAM, so it caps the site at 1024 * SEGMENT_BYTES
+NUM_SEGMENTS = 1024
+# addrs.mem holds the first segment index above the 19 bit SDRAM address
+SEGMENT_SHIFT = 19
+# flash2sdram copies the whole image, index included, into these
+SDRAM_BYTES = (1 << SEGMENT_SHIFT) * 4
+# route slots held in the http_entry EBRs, the rest are read from SDRAM
+CACHE_LINES = 512
+# http_entry keeps 4 tag bits above the fingerprint
+MAX_SLOTS = CACHE_LINES << 4
+# words per slot in the SDRAM index: addr, length, key, gzip addr, gzip length
+INDEX_ENTRY_WORDS = 8
 
-    return temp
 
+def _response(res_code, data):
+    return bytearray(f"{res_code}{len(data)}\r\n\r\n", "ascii") + data
 
-NOTFOUND_HTTP = "HTTP/1.0 404 Not Found\r\nContent-Length: "
-BASE_HTTP = "HTTP/1.0 200 OK\r\nContent-Length: "
 
+def _pad_response(response):
+    """
+    'response' padded to whole words for the image. The padding is never
+    sent, lengths.mem and the checksums cover the response alone.
+    """
+    return response + b" " * (_align_32(len(response)) - len(response))
 
-def read_files(start_addr=0x00000000, num_entries=512):
+
+def page_body(p, minify=False):
+    """
+    Body served for page 'p'.
+    """
+    data = p.read_text()
+    if minify:
+        data = minify_html(data)
+    return bytes(data, "ascii")
+
+
+def compress_body(body):
+    """
+    gzip of 'body'. Fixed mtime keeps the bytes, and so the flash image,
+    identical across builds.
+    """
+    return gzip.compress(body, compresslevel=9, mtime=0)
+
+
+def page_routes(p):
+    """
+    Request targets served by page 'p'.
+    """
+    routes = [f"/{p.stem}", f"/{p.name}"]
+    if p.name == "index.html":
+        routes.insert(0, "/")
+    return routes
+
+
+def segments(data):
+    """
+    SEGMENT_BYTES slices of 'data', in the order tcb_serializer sends them.
+    """
+    return [data[i:i + SEGMENT_BYTES] for i in range(0, len(data), SEGMENT_BYTES)]
+
+
+@contextmanager
+def stage(stats, name):
+    """
+    Times the body of the with block as stage 'name'. The block sets the
+    'items' it processed on the yielded record.
+    """
+    record = {"stage": name, "items": 0}
+    start = time.perf_counter()
+    yield record
+    record["seconds"] = time.perf_counter() - start
+    stats.append(record)
+
+
+def print_stats(stats, jobs):
+    print(f"{'stage':<10}{'items':>8}{'seconds':>10}  ({jobs} jobs)")
+    for r in stats:
+        print(f"{r['stage']:<10}{r['items']:>8}{r['seconds']:>10.3f}")
+    print(f"{'total':<10}{'':>8}{sum(r['seconds'] for r in stats):>10.3f}")
+
+
+def read_files(start_addr=0x00000000, num_entries=512, cache_file=".checksum_cache.json",
+               flash_offset=0x40000, sector_size=DEFAULT_SECTOR_SIZE, full=False,
+               page_align=0x1000, profile=None, minify=False, jobs=None):
+    jobs = jobs or os.cpu_count() or 1
+    # Executor.map returns results in input order, so the output does not
+    # depend on the number of workers
+    with ProcessPoolExecutor(jobs) if jobs > 1 else _inline() as pool:
+        _build(start_addr, num_entries, cache_file, flash_offset, sector_size, full,
+               page_align, profile, minify, jobs, pool.map if pool else map)
+
+
+@contextmanager
+def _inline():
+    yield None
+
+
+def _build(start_addr, num_entries, cache_file, flash_offset, sector_size, full,
+           page_align, profile, minify, jobs, map_fn):
     root = Path(__file__).parent
-    count = 0
-    next_start_addr = start_addr or 0x00000000
+    start_addr = start_addr or 0x00000000
     num_entries = num_entries or 512
-    pages = sorted((Path.cwd()/"pages").resolve().glob('*.html'))
-    pages.insert(0, (root/"404.html").resolve())
-    with open("addrs.mem", "w") as fa:
-        with open("lengths.mem", "w") as fl:
-            with open("content.mem", "w", newline="") as fc:
-                with open("content_hex.mem", "w", newline="") as fh:
-                    for p in pages:
-                        assert count < num_entries
-
-                        data = p.read_text()
-
-                        res_code = NOTFOUND_HTTP if "404.html" == p.name else BASE_HTTP
-                        entire_data = f"{res_code}{len(data)}\r\n\r\n{data}"
-                        length = len(entire_data)
-                        padded_length_32 = int(
-                            _align_32(length))
-                        entire_data += " " * (padded_length_32 - length)
-                        data_bytes = bytearray(entire_data, "ascii")
-                        fc.write(entire_data)
-                        for i in range(0, len(data_bytes), 4):
-                            word = int.from_bytes(data_bytes[i:i+4], 'little')
-                            fh.write(f'{word:08X}\n')
-
-                        fa.write(f"{next_start_addr:09x}\n")
-
-                        length_data = f"{padded_length_32:04x}\n"
-                        checksum = calc_tcp_checksum(data_bytes)
-                        fl.write(f"0{checksum:04x}{length_data}")
-
-                        count += 1
-                        next_start_addr += int(padded_length_32/4)
-
-                    # pad the rest with zeroes
-                    for i in range(count, num_entries):
-                        fa.write(f"{0:09x}\n")
-                        fl.write(f"{0:09x}\n")
-                    # padding to 512 rows
-                    print(padded_length_32)
-                    for i in range(int(padded_length_32/4) + 1, num_entries):
-                        fh.write(f'{0:08X}\n')
+    assert num_entries & (num_entries - 1) == 0 and CACHE_LINES <= num_entries <= MAX_SLOTS
+    assert page_align % 4 == 0
+    stats = []
+
+    with stage(stats, "discover") as st:
+        pages = sorted((Path.cwd()/"pages").resolve().glob('*.html'))
+        pages.insert(0, (root/"404.html").resolve())
+        st["items"] = len(pages)
+
+    with stage(stats, "minify") as st:
+        bodies = list(map_fn(partial(page_body, minify=minify), pages))
+        st["items"] = len(pages)
+
+    with stage(stats, "compress") as st:
+        # the 404 is sent from a fixed address and never has a gzip variant
+        gz_bodies = list(map_fn(compress_body, bodies[1:]))
+        st["items"] = len(gz_bodies)
+
+    responses = {}
+    gzip_names = {}
+    for p, body, gz_body in zip(pages, bodies, [None, *gz_bodies]):
+        res_code = NOTFOUND_HTTP if "404.html" == p.name else BASE_HTTP
+        responses[p.name] = _response(res_code, body)
+        if gz_body is None:
+            continue
+        # only worth a slot in SDRAM if it ends up smaller on the wire
+        gz = _response(GZIP_HTTP, gz_body)
+        if len(gz) < len(responses[p.name]):
+            gzip_names[p.name] = f"{p.name}.gz"
+            responses[gzip_names[p.name]] = gz
+
+    # 404 comes first so mac can send its segments from index 0 on a miss
+    with stage(stats, "checksum") as st:
+        cache = ChecksumCache(cache_file)
+        slices = {name: segments(data) for name, data in responses.items()}
+        sums = iter(cache.checksum_all([b for name, data in responses.items()
+                                        for b in (data, *slices[name])], map_fn))
+        checksums = {}
+        seg_base = {}
+        seg_table = []
+        for name in responses:
+            checksums[name] = next(sums)
+            seg_base[name] = len(seg_table)
+            seg_table += [next(sums) for _ in slices[name]]
+        assert len(seg_table) <= NUM_SEGMENTS, f"{len(seg_table)} segments do not fit into {NUM_SEGMENTS}"
+        st["items"] = len(responses) + len(seg_table)
+
+    # word aligned copies for placement and the image
+    padded = {name: _pad_response(data) for name, data in responses.items()}
+
+    # 404 is not routed, mac sends it from address 0 on every lookup miss
+    routes = {r: p.name for p in pages[1:] for r in page_routes(p)}
+
+    with stage(stats, "layout") as st:
+        if profile:
+            # pages share SDRAM rows, sector alignment is given up for it
+            default = Manifest(start_addr=start_addr, align_words=page_align // 4)
+            default.pages = {}
+            default.place(padded)
+            page_align = 4
+        manifest = Manifest(start_addr=start_addr, align_words=page_align // 4)
+        content = Path("content.bin")
+        # without the previous image, pages the manifest says are unchanged
+        # would be left blank, so lay everything out again
+        if full or not content.exists():
+            manifest.pages = {}
+            manifest.loaded = False
+        # without a manifest the previous placement is unknown, rebuild everything
+        old_image = content.read_bytes() if manifest.loaded else None
+
+        if profile:
+            sizes = {name: len(data) for name, data in padded.items()}
+            weights = page_weights(load_profile(profile), routes, gzip_names)
+            dirty = manifest.assign(padded, optimize(sizes, weights, start_addr))
+            report({name: default.addr(name) for name in responses},
+                   {name: manifest.addr(name) for name in responses}, sizes, weights)
+        else:
+            dirty = manifest.place(padded)
+        print(f"{len(dirty)} of {len(responses)} pages changed")
+
+        seeds, disp, slots = build_routes(list(routes), slots=num_entries,
+                                          buckets=buckets_for(num_entries))
+        by_slot = {slot: path for path, slot in slots.items()}
+        st["items"] = len(responses)
+
+    def entry(name):
+        """
+        (addrs.mem, lengths.mem) values of response 'name', zero if None.
+        """
+        if name is None:
+            return 0, 0
+        data_bytes = responses[name]
+        return (seg_base[name] << SEGMENT_SHIFT | manifest.addr(name),
+                checksums[name] << 16 | len(data_bytes))
+
+    def slot_entry(slot):
+        path = by_slot.get(slot)
+        name = routes.get(path)
+        return (*entry(name), fingerprint(path) if path else 0, *entry(gzip_names.get(name)))
+
+    # every slot lives in an index after the content, http_entry caches
+    # CACHE_LINES of them and reads the others from SDRAM on a miss
+    index = b""
+    index_addr = manifest.end_addr()
+    if num_entries > CACHE_LINES:
+        index_addr = start_addr + align(index_addr - start_addr, SDRAM_ROW_BYTES // 4)
+        pad = (0,) * (INDEX_ENTRY_WORDS - 5)
+        index = b"".join(struct.pack(f"<{INDEX_ENTRY_WORDS}I", *slot_entry(s), *pad)
+                         for s in range(num_entries))
+    content_size = (index_addr - start_addr) * 4 + len(index)
+    assert start_addr * 4 + content_size <= SDRAM_BYTES, \
+        f"{content_size} bytes of content and index do not fit into SDRAM"
+    padding = content_size - len(index) - sum(len(data) for data in responses.values())
+    print(f"{content_size} bytes to copy to SDRAM, {padding} of them padding between pages")
+
+    with stage(stats, "emit") as st:
+        with open_image(content, HEADER_BYTES + content_size, keep=old_image is not None) as image:
+            for name in dirty:
+                offset = HEADER_BYTES + (manifest.addr(name) - start_addr) * 4
+                image[offset:offset + len(padded[name])] = padded[name]
+            offset = HEADER_BYTES + (index_addr - start_addr) * 4
+            image[offset:offset + len(index)] = index
+            body = memoryview(image)[HEADER_BYTES:]
+            image[:HEADER_BYTES] = pack_header(page_align, len(responses), body)
+            # SDRAM holds everything after the header
+            write_hex(body, "content_hex.mem", min_rows=num_entries)
+            body.release()
+
+            to_program = write_delta(old_image, image, flash_offset, sector_size=sector_size)
+            print(f"delta: {to_program} of {len(image)} bytes to program, see delta_offsets.txt")
+
+        # flash2sdram copies this many bytes after the header, top.sv takes
+        # it through DEF_CONTENT_BYTES
+        with open("content_bytes.txt", "w") as f:
+            f.write(f"{content_size}\n")
+
+        with open("seg_checksums.mem", "w") as f:
+            f.writelines(f"{c:05x}\n" for c in seg_table)
+
+        # the addrs.mem and lengths.mem words of the 404, mac sends it on
+        # every lookup miss
+        with open("notfound.mem", "w") as f:
+            f.writelines(f"{word:09x}\n" for word in entry("404.html"))
+
+        # the seeds are followed by the word address of the SDRAM index
+        with open("route_seeds.mem", "w") as f:
+            f.writelines(f"{word:08x}\n" for word in (*seeds, index_addr if index else 0))
+        disp_digits = ((num_entries.bit_length() - 1) + 3) // 4
+        with open("route_disp.mem", "w") as f:
+            f.writelines(f"{d:0{disp_digits}x}\n" for d in disp)
+
+        # cache line l starts out with the lowest used slot that maps to it, the
+        # slot bits above the line are its tag
+        used = sorted(slots.values())
+        lines = {}
+        for slot in reversed(used):
+            lines[slot % CACHE_LINES] = slot
+        with open("addrs.mem", "w") as fa, open("lengths.mem", "w") as fl, \
+                open("gzip_addrs.mem", "w") as fga, open("gzip_lengths.mem", "w") as fgl, \
+                open("route_keys.mem", "w") as fk:
+            for line in range(CACHE_LINES):
+                slot = lines.get(line, line)
+                addr, length, key, gzip_addr, gzip_length = slot_entry(slot)
+                fa.write(f"{addr:09x}\n")
+                fl.write(f"{length:09x}\n")
+                fk.write(f"{slot // CACHE_LINES << 32 | key:09x}\n")
+                fga.write(f"{gzip_addr:09x}\n")
+                fgl.write(f"{gzip_length:09x}\n")
+        st["items"] = len(dirty)
+
+    manifest.save()
+    cache.save()
+    print(f"checksum cache: {cache.hits} hits, {cache.misses} misses")
+    print_stats(stats, jobs)
 
 
 if __name__ == "__main__":
@@ -79,6 +312,32 @@ if __name__ == "__main__":
     parser.add_argument(
         "-start", help="Start address of Flash to write", type=int)
     parser.add_argument(
-        "-entries", help="Number of HTTP entries", type=int)
+        "-entries", help="Number of HTTP route slots, a power of two from 512 to 8192. Slots past "
+        "the 512 held in http_entry are read from an index in SDRAM, set HTTP_SLOT_BITS to match",
+        type=int)
+    parser.add_argument(
+        "-cache", help="Checksum cache file, empty string to disable",
+        default=".checksum_cache.json")
+    parser.add_argument(
+        "-flash", help="Offset of the content region in SPI flash (OFFSET_IN_FLASH)",
+        type=lambda x: int(x, 0), default=0x40000)
+    parser.add_argument(
+        "-sector", help="Flash erase size used to align the delta images",
+        type=lambda x: int(x, 0), default=DEFAULT_SECTOR_SIZE)
+    parser.add_argument(
+        "-full", help="Ignore content_manifest.json and lay out every page again",
+        action="store_true")
+    parser.add_argument(
+        "-align", help="Page alignment in bytes, the default keeps pages on flash sectors and SDRAM rows",
+        type=lambda x: int(x, 0), default=0x1000)
+    parser.add_argument(
+        "-profile", help="Request counts (JSON of path -> count, or an access log) to lay out SDRAM rows by")
+    parser.add_argument(
+        "-minify", help="Strip comments and collapse whitespace in pages before compressing",
+        action="store_true")
+    parser.add_argument(
+        "-jobs", help="Worker processes for minification, compression and checksums, "
+        "1 runs everything in this process. Defaults to the number of CPUs", type=int)
     args = parser.parse_args()
-    read_files(args.start, args.entries)
+    read_files(args.start, args.entries, args.cache, args.flash, args.sector, args.full,
+               args.align, args.profile, args.minify, args.jobs)
@@ -0,0 +1,72 @@
+"""
+Sector granular flash updates.
+
+Compares the previously flashed content image against the new one and writes
+only the erase sectors that differ, so that openFPGALoader can program each
+run with "-o <offset>" instead of rewriting the whole content region.
+"""
+from pathlib import Path
+
+# openFPGALoader erases in 64KiB blocks, anything smaller would wipe neighbours
+DEFAULT_SECTOR_SIZE = 0x10000
+ERASED = 0xFF
+
+
+def dirty_sectors(old, new, flash_offset, sector_size=DEFAULT_SECTOR_SIZE):
+    """
+    Returns the absolute flash addresses of sectors whose content changed.
+    'old' may be None when the flash content is unknown.
+    """
+    first = flash_offset // sector_size
+    last = (flash_offset + max(len(new), len(old or b"")) - 1) // sector_size
+    dirty = []
+    for sector in range(first, last + 1):
+        lo = max(sector * sector_size - flash_offset, 0)
+        hi = (sector + 1) * sector_size - flash_offset
+        if old is None or old[lo:hi] != new[lo:hi]:
+            dirty.append(sector * sector_size)
+    return dirty
+
+
+def _sector_bytes(new, flash_offset, sector_addr, sector_size):
+    lo = sector_addr - flash_offset
+    chunk = bytearray([ERASED]) * sector_size
+    data = new[lo:lo + sector_size]
+    chunk[:len(data)] = data
+    return chunk
+
+
+def write_delta(old, new, flash_offset, out_dir="delta", list_file="delta_offsets.txt",
+                sector_size=DEFAULT_SECTOR_SIZE):
+    """
+    Writes one image per run of contiguous dirty sectors into 'out_dir' and
+    lists "<flash offset> <file>" pairs in 'list_file'. Returns the number of
+    bytes that need programming.
+    """
+    if flash_offset % sector_size != 0:
+        # a partially covered leading sector would be erased with unknown data
+        raise ValueError(
+            f"flash offset {flash_offset:#x} is not aligned to {sector_size:#x}")
+    out = Path(out_dir)
+    out.mkdir(exist_ok=True)
+    for stale in out.glob("*.bin"):
+        stale.unlink()
+
+    runs = []
+    for sector_addr in dirty_sectors(old, new, flash_offset, sector_size):
+        if runs and runs[-1][-1] + sector_size == sector_addr:
+            runs[-1].append(sector_addr)
+        else:
+            runs.append([sector_addr])
+
+    total = 0
+    with open(list_file, "w") as fl:
+        for run in runs:
+            image = bytearray()
+            for sector_addr in run:
+                image += _sector_bytes(new, flash_offset, sector_addr, sector_size)
+            path = out / f"{run[0]:08x}.bin"
+            path.write_bytes(image)
+            fl.write(f"{run[0]:#08x} {path}\n")
+            total += len(image)
+    return total
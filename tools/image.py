@@ -0,0 +1,87 @@
+"""
+Packed binary content image.
+
+Layout of content.bin, which is programmed at OFFSET_IN_FLASH:
+
+  +----------------------+ 0
+  | header               |
+  +----------------------+ HEADER_BYTES
+  | page, aligned        | SDRAM word 0
+  | page, aligned        |
+  | ...                  |
+  +----------------------+
+
+The header fills one flash sector so the content behind it stays sector
+aligned. flash2sdram skips it, SDRAM word 0 is the first byte after it.
+"""
+import mmap
+import os
+import struct
+import zlib
+from array import array
+from pathlib import Path
+
+MAGIC = b"FWEB"
+VERSION = 1
+# one SPI flash erase sector
+HEADER_BYTES = 0x1000
+# 11 bit row, 8 bit column of 32 bit words
+SDRAM_ROW_BYTES = 256 * 4
+# magic, version, header bytes, page alignment, SDRAM row bytes, pages,
+# content bytes, crc32 of content
+HEADER_FORMAT = "<4sHHIIIII"
+
+
+def align(size, alignment):
+    return (size + alignment - 1) // alignment * alignment
+
+
+def pack_header(page_align, num_pages, content):
+    header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, HEADER_BYTES, page_align,
+                         SDRAM_ROW_BYTES, num_pages, len(content), zlib.crc32(content))
+    return header.ljust(HEADER_BYTES, b"\x00")
+
+
+def unpack_header(b):
+    magic, version, header_bytes, page_align, row_bytes, num_pages, content_bytes, crc = \
+        struct.unpack_from(HEADER_FORMAT, b)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not a content image")
+    return {
+        "header_bytes": header_bytes,
+        "page_align": page_align,
+        "sdram_row_bytes": row_bytes,
+        "num_pages": num_pages,
+        "content_bytes": content_bytes,
+        "crc32": crc,
+    }
+
+
+def open_image(path, size, keep=False):
+    """
+    Memory map 'path' resized to 'size' bytes. With 'keep' the existing bytes
+    are preserved so only changed pages need to be written.
+    """
+    fd = os.open(path, os.O_RDWR | os.O_CREAT)
+    try:
+        if not keep:
+            os.ftruncate(fd, 0)
+        os.ftruncate(fd, size)
+        return mmap.mmap(fd, size)
+    finally:
+        os.close(fd)
+
+
+def write_hex(content, path, min_rows=0):
+    """
+    $readmemh file of little endian 32 bit words, as loaded by sdram_dummy.
+    """
+    words = array("I")
+    if words.itemsize != 4:
+        raise RuntimeError("array('I') is not 32 bits on this platform")
+    words.frombytes(content[:len(content) - len(content) % 4])
+    if array("I", [1]).tobytes() != b"\x01\x00\x00\x00":
+        words.byteswap()
+    lines = [f"{w:08X}" for w in words]
+    lines += ["00000000"] * (min_rows - len(lines))
+    Path(path).write_text("\n".join(lines) + "\n" if lines else "")
@@ -0,0 +1,131 @@
+"""
+Access profile driven placement of pages in SDRAM.
+
+The cost of a layout is the expected number of row activations per request,
+for a controller that keeps the last row open and requests drawn from the
+profile independently:
+
+  cost = sum_p f_p * (rows(p) - P(first row of p is already open))
+
+where f_p is the share of requests for page p and the row left open is the
+last row of the previous page sent. Small pages never straddle a row, large
+pages start on a row boundary, and hot pages share rows with each other so a
+request often finds its row already open.
+
+sdram_ctrl only drives bank 0 and the 19 bit address has no bank bits, so
+only the row and column of a page can be chosen.
+"""
+import json
+import re
+from collections import Counter
+from pathlib import Path
+
+from image import SDRAM_ROW_BYTES
+
+ROW_WORDS = SDRAM_ROW_BYTES // 4
+_REQUEST = re.compile(rb'"(?:GET|HEAD) (\S+)')
+
+
+def load_profile(path):
+    """
+    Request counts by path. Either a JSON object of path -> count or an
+    access log with quoted request lines, e.g. nginx/apache combined format.
+    """
+    path = Path(path)
+    if path.suffix == ".json":
+        return Counter({k: int(v) for k, v in json.loads(path.read_text()).items()})
+    counts = Counter()
+    with open(path, "rb") as f:
+        for line in f:
+            m = _REQUEST.search(line)
+            if m:
+                counts[m.group(1).split(b"?")[0].decode("ascii", "replace")] += 1
+    return counts
+
+
+def page_weights(profile, routes, gzip_names, not_found="404.html"):
+    """
+    Share of requests served by each response. 'routes' maps request paths to
+    page names, unknown paths are the 404. Browsers accept gzip, so a page
+    with a gzip variant is counted against the variant.
+    """
+    weights = Counter()
+    for path, count in profile.items():
+        name = routes.get(path, not_found)
+        weights[gzip_names.get(name, name)] += count
+    total = sum(weights.values())
+    return {name: n / total for name, n in weights.items()} if total else {}
+
+
+def rows(addr, words):
+    """
+    First and last SDRAM row holding 'words' words from 'addr'.
+    """
+    return addr // ROW_WORDS, (addr + max(words, 1) - 1) // ROW_WORDS
+
+
+def expected_activations(placement, sizes, weights):
+    """
+    Row activations per request for 'placement' (name -> word address) of
+    responses of 'sizes' (name -> bytes).
+    """
+    span = {n: rows(placement[n], sizes[n] // 4) for n in placement}
+    open_row = Counter()
+    for n, f in weights.items():
+        open_row[span[n][1]] += f
+    cost = 0.0
+    for n, f in weights.items():
+        first, last = span[n]
+        cost += f * (last - first + 1 - open_row[first])
+    return cost
+
+
+def optimize(sizes, weights, start_addr=0, pinned=("404.html",)):
+    """
+    Returns name -> word address. Pages in 'pinned' keep their order at
+    'start_addr', mac sends the 404 from address 0.
+    """
+    placement = {}
+    # free words at the end of each row that has been started, row -> (next addr, heat)
+    open_rows = {}
+    end = start_addr
+
+    def put(name, addr, words):
+        nonlocal end
+        placement[name] = addr
+        first, last = rows(addr, words)
+        end = max(end, addr + words)
+        heat = open_rows.pop(last, (0, 0.0))[1] + weights.get(name, 0.0)
+        if (addr + words) % ROW_WORDS:
+            open_rows[last] = (addr + words, heat)
+
+    for name in pinned:
+        if name in sizes:
+            put(name, end, sizes[name] // 4)
+
+    # hottest first, larger first on ties so small pages fill the leftovers
+    order = sorted((n for n in sizes if n not in placement),
+                   key=lambda n: (-weights.get(n, 0.0), -sizes[n], n))
+    for name in order:
+        words = sizes[name] // 4
+        fits = [(r, a, h) for r, (a, h) in open_rows.items()
+                if words <= ROW_WORDS and (r + 1) * ROW_WORDS - a >= words]
+        if fits:
+            # join the hottest row, a cold page goes into the tightest gap
+            if weights.get(name, 0.0) > 0:
+                r, a, _ = max(fits, key=lambda x: (x[2], -x[0]))
+            else:
+                r, a, _ = min(fits, key=lambda x: ((x[0] + 1) * ROW_WORDS - x[1], x[0]))
+            put(name, a, words)
+        else:
+            # rows are never shared with a page that would straddle them
+            addr = -(-end // ROW_WORDS) * ROW_WORDS
+            put(name, addr, words)
+    return placement
+
+
+def report(old, new, sizes, weights):
+    before = expected_activations(old, sizes, weights)
+    after = expected_activations(new, sizes, weights)
+    print(f"row activations per request: {before:.3f} -> {after:.3f}")
+    return before, after
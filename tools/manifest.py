@@ -0,0 +1,132 @@
+"""
+Placement of pages in the content image that is stable across builds.
+
+Every page keeps the word address it was given the first time it was built as
+long as its padded response still fits into the slot. Pages that grow are
+moved into the first hole large enough, or appended at the end of the image,
+so a small edit only dirties the flash sectors of the page that changed.
+Pinned pages, the 404 that mac sends from address 0, always stay at the start
+address and push out whatever their growth overlaps.
+"""
+import hashlib
+import json
+from pathlib import Path
+
+
+class Manifest:
+    VERSION = 1
+
+    def __init__(self, path="content_manifest.json", start_addr=0, align_words=1):
+        self.path = Path(path)
+        self.start_addr = start_addr
+        self.align_words = align_words
+        # name -> {"addr": word address, "words": slot size, "sha256": digest}
+        self.pages = {}
+        self.loaded = False
+        if self.path.exists():
+            manifest = json.loads(self.path.read_text())
+            # a different base address or alignment invalidates every placement
+            if (manifest.get("version") == self.VERSION and manifest.get("start_addr") == start_addr
+                    and manifest.get("align_words", 1) == align_words):
+                self.pages = manifest["pages"]
+                self.loaded = True
+
+    @staticmethod
+    def digest(b):
+        return hashlib.sha256(b).hexdigest()
+
+    def end_addr(self):
+        return max((p["addr"] + p["words"] for p in self.pages.values()),
+                   default=self.start_addr)
+
+    def _align(self, words):
+        return (words + self.align_words - 1) // self.align_words * self.align_words
+
+    def _first_fit(self, words):
+        addr = self.start_addr
+        for p in sorted(self.pages.values(), key=lambda p: p["addr"]):
+            if p["addr"] - addr >= words:
+                return addr
+            addr = max(addr, self.start_addr + self._align(p["addr"] + p["words"] - self.start_addr))
+        return addr
+
+    def place(self, names_to_data, pinned=("404.html",)):
+        """
+        Assign a word address to every page in 'names_to_data' (name -> padded
+        bytes, in build order). Pages in 'pinned' are placed one after the
+        other from the start address. Returns the set of names whose bytes in
+        the image changed and must be rewritten.
+        """
+        dirty = set()
+        # forget pages that no longer exist so their slots can be reused
+        for name in list(self.pages):
+            if name not in names_to_data:
+                del self.pages[name]
+
+        addr = self.start_addr
+        for name in pinned:
+            if name not in names_to_data:
+                continue
+            data = names_to_data[name]
+            words = self._align(len(data) // 4)
+            digest = self.digest(data)
+            entry = self.pages.get(name)
+            if entry is not None and entry["addr"] == addr and words <= entry["words"]:
+                # keeps its slot and slack like any other page
+                words = entry["words"]
+                if entry["sha256"] != digest:
+                    entry["sha256"] = digest
+                    dirty.add(name)
+            else:
+                self.pages[name] = {"addr": addr, "words": words, "sha256": digest}
+                dirty.add(name)
+            addr += words
+        pinned_end = addr
+
+        relocate = []
+        for name, data in names_to_data.items():
+            if name in pinned:
+                continue
+            words = self._align(len(data) // 4)
+            digest = self.digest(data)
+            entry = self.pages.get(name)
+            if entry is None or words > entry["words"] or entry["addr"] < pinned_end:
+                self.pages.pop(name, None)
+                relocate.append((name, words, digest))
+            elif entry["sha256"] != digest:
+                # shrinking pages keep their slot and its slack
+                entry["sha256"] = digest
+                dirty.add(name)
+
+        for name, words, digest in relocate:
+            addr = self._first_fit(words)
+            self.pages[name] = {"addr": addr, "words": words, "sha256": digest}
+            dirty.add(name)
+        return dirty
+
+    def assign(self, names_to_data, placement):
+        """
+        Place every page at the word address given in 'placement' instead of
+        the first fit. Returns the names that must be rewritten.
+        """
+        dirty = set()
+        old, self.pages = self.pages, {}
+        for name, data in names_to_data.items():
+            digest = self.digest(data)
+            entry = old.get(name)
+            if entry is None or entry["addr"] != placement[name] or entry["sha256"] != digest:
+                dirty.add(name)
+            self.pages[name] = {"addr": placement[name], "words": self._align(len(data) // 4),
+                                "sha256": digest}
+        return dirty
+
+    def addr(self, name):
+        return self.pages[name]["addr"]
+
+    def save(self):
+        self.path.write_text(json.dumps({
+            "version": self.VERSION,
+            "start_addr": self.start_addr,
+            "align_words": self.align_words,
+            "pages": self.pages,
+        }, indent=2, sort_keys=True))
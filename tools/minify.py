@@ -0,0 +1,44 @@
+"""
+Conservative HTML and CSS minification.
+
+Comments are dropped and runs of whitespace collapse to one space, the
+markup itself is never rewritten. The contents of <pre>, <textarea> and
+<script> are kept verbatim and <style> blocks go through the CSS minifier.
+"""
+import re
+
+_RAW = re.compile(r"(<(pre|textarea|script)\b.*?</\2\s*>)", re.I | re.S)
+_STYLE = re.compile(r"(<style\b[^>]*>)(.*?)(</style\s*>)", re.I | re.S)
+# conditional comments are markup for old browsers, keep them
+_HTML_COMMENT = re.compile(r"<!--(?!\[if).*?-->", re.S)
+_SPACES = re.compile(r"\s+")
+
+_CSS_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+_CSS_PUNCT = re.compile(r"\s*([{};:,>])\s*")
+
+
+def minify_css(css):
+    css = _CSS_COMMENT.sub("", css)
+    css = _SPACES.sub(" ", css)
+    css = _CSS_PUNCT.sub(r"\1", css)
+    return css.replace(";}", "}").strip()
+
+
+def _minify_markup(html):
+    html = _HTML_COMMENT.sub("", html)
+    html = _STYLE.sub(lambda m: m.group(1) + minify_css(m.group(2)) + m.group(3), html)
+    return _SPACES.sub(" ", html)
+
+
+def minify_html(html):
+    # odd entries are the raw blocks captured by the split
+    parts = _RAW.split(html)
+    out = []
+    i = 0
+    while i < len(parts):
+        out.append(_minify_markup(parts[i]))
+        if i + 1 < len(parts):
+            out.append(parts[i + 1])
+        # skip the tag name group
+        i += 3
+    return "".join(out).strip()
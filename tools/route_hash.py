@@ -0,0 +1,110 @@
+"""
+Perfect hash from full URL paths to http_entry slots.
+
+http_decode streams the request target through CRC32 and resolves it in a
+fixed number of cycles, independent of the number of pages:
+
+  fp   = crc32(path)                      fingerprint, stored in the slot
+  h1   = mix(fp, seed1)[31:24]            one of BUCKETS displacement entries
+  h2   = mix(fp, seed2)[31:23]            9 bit slot before displacement
+  slot = h2 ^ disp[h1]
+
+with the bit ranges widening for larger tables. The table size is a power of
+two, at least the 512 entries cached in http_entry, so the hash is perfect
+but not minimal. Unused slots have a zero size and every lookup is verified
+against the stored fingerprint, unknown paths resolve to the 404.
+"""
+import random
+import zlib
+from collections import defaultdict
+
+MASK = 0xFFFFFFFF
+SLOTS = 512
+BUCKETS = 256
+# one 18 bit wide EBR of displacements
+MAX_BUCKETS = 1024
+
+
+def fingerprint(path):
+    return zlib.crc32(path.encode("ascii")) & MASK
+
+
+def mix(x, seed):
+    """
+    Three shift-add rounds, http_decode computes one round per cycle.
+    """
+    x ^= seed
+    x = (x + (x << 6)) & MASK
+    x ^= x >> 11
+    x = (x + (x << 3)) & MASK
+    x ^= x >> 15
+    x = (x + (x << 10)) & MASK
+    return x
+
+
+def _hashes(fp, seeds, slots, buckets):
+    h1 = mix(fp, seeds[0]) >> (32 - (buckets.bit_length() - 1))
+    h2 = mix(fp, seeds[1]) >> (32 - (slots.bit_length() - 1))
+    return h1, h2
+
+
+def _try_seeds(fps, seeds, slots, buckets):
+    groups = defaultdict(list)
+    for path, fp in fps.items():
+        h1, h2 = _hashes(fp, seeds, slots, buckets)
+        groups[h1].append((path, h2))
+
+    disp = [0] * buckets
+    taken = {}
+    # largest buckets first while the table is still empty, a bucket of one
+    # can always be displaced into any free slot
+    for h1, members in sorted(groups.items(), key=lambda g: (-len(g[1]), g[0])):
+        for d in range(slots):
+            chosen = {h2 ^ d for _, h2 in members}
+            if len(chosen) == len(members) and not chosen & taken.keys():
+                break
+        else:
+            return None
+        disp[h1] = d
+        for path, h2 in members:
+            taken[h2 ^ d] = path
+    return disp, {path: slot for slot, path in taken.items()}
+
+
+def buckets_for(slots):
+    """
+    Displacement entries used by http_decode for a table of 'slots'.
+    """
+    return min(slots // 2, MAX_BUCKETS)
+
+
+def build(paths, slots=SLOTS, buckets=BUCKETS, attempts=1000):
+    """
+    Returns (seeds, disp, path -> slot). The seed search is deterministic so
+    an unchanged site produces identical tables.
+    """
+    if slots & (slots - 1) or buckets & (buckets - 1):
+        raise ValueError("slots and buckets must be powers of two")
+    if len(paths) > slots:
+        raise ValueError(f"{len(paths)} paths do not fit into {slots} slots")
+    fps = {}
+    seen = {}
+    for path in paths:
+        fp = fingerprint(path)
+        if fp in seen:
+            raise ValueError(f"{path} and {seen[fp]} have the same fingerprint")
+        seen[fp] = path
+        fps[path] = fp
+
+    rng = random.Random(0)
+    for _ in range(attempts):
+        seeds = (rng.getrandbits(32), rng.getrandbits(32))
+        found = _try_seeds(fps, seeds, slots, buckets)
+        if found is not None:
+            return (seeds, *found)
+    raise RuntimeError(f"no perfect hash for {len(paths)} paths after {attempts} seeds")
+
+
+def lookup(path, seeds, disp, slots=SLOTS, buckets=BUCKETS):
+    h1, h2 = _hashes(fingerprint(path), seeds, slots, buckets)
+    return h2 ^ disp[h1]
@@ -2,8 +2,18 @@
 module top #(
   parameter TCP_ECHO_EN = 0,
   parameter reg [23:0] OFFSET_IN_FLASH = 'h40000,
+  // bytes of content copied to SDRAM, tools/content_bytes.txt
+  parameter reg [23:0] CONTENT_BYTES = 90000,
   parameter HTTP_ADDR_FILE = "",
-  parameter HTTP_SIZE_FILE = ""
+  parameter HTTP_SIZE_FILE = "",
+  parameter HTTP_KEY_FILE = "",
+  parameter HTTP_SEED_FILE = "",
+  parameter HTTP_DISP_FILE = "",
+  parameter HTTP_GZIP_ADDR_FILE = "",
+  parameter HTTP_GZIP_SIZE_FILE = "",
+  parameter HTTP_SEG_FILE = "",
+  parameter HTTP_404_FILE = "",
+  parameter HTTP_SLOT_BITS = 9
   )(
     input wire clk_25mhz,
     input wire button,
@@ -36,7 +46,10 @@ module top #(
     output wire [10:0] sdram_addr
 );
 assign mdio = 1;
-localparam reg [23:0] NUM_BYTES = 90000;
+localparam reg [23:0] NUM_BYTES = CONTENT_BYTES;
+// content.bin starts with a 1 sector layout header (tools/image.py), SDRAM
+// only holds what comes after it
+localparam reg [23:0] CONTENT_HEADER_BYTES = 'h1000;
 
 // RGMII requires specific setup and hold times.
 // This is achieved with a 90 degree phase offset tx_clk relative to the
@@ -153,7 +166,7 @@ areset _areset(.clk(sysclk), .rst_n(button & init_wait_done), .rst(rst));
       .i_en(spi_en_stretched),
       .i_size(NUM_BYTES),
       .i_inst(8'h03),
-      .i_offset(OFFSET_IN_FLASH),
+      .i_offset(OFFSET_IN_FLASH + CONTENT_HEADER_BYTES),
       .i_addr_en('1),
       .o_data_valid(spi_data_valid),
       .o_data(spi_data)
@@ -199,7 +212,10 @@ areset _areset(.clk(sysclk), .rst_n(button & init_wait_done), .rst(rst));
       .tx(gpio_3)
   );
 
-mac #(.HTTP_ADDR_FILE(HTTP_ADDR_FILE), .HTTP_SIZE_FILE(HTTP_SIZE_FILE)) mac_instance(
+mac #(.HTTP_ADDR_FILE(HTTP_ADDR_FILE), .HTTP_SIZE_FILE(HTTP_SIZE_FILE), .HTTP_KEY_FILE(HTTP_KEY_FILE),
+  .HTTP_SEED_FILE(HTTP_SEED_FILE), .HTTP_DISP_FILE(HTTP_DISP_FILE),
+  .HTTP_GZIP_ADDR_FILE(HTTP_GZIP_ADDR_FILE), .HTTP_GZIP_SIZE_FILE(HTTP_GZIP_SIZE_FILE),
+  .HTTP_SEG_FILE(HTTP_SEG_FILE), .HTTP_404_FILE(HTTP_404_FILE), .HTTP_SLOT_BITS(HTTP_SLOT_BITS)) mac_instance(
   // We use base clock here instead of PHY_TXC as we purposely hold the data
   // 90 degrees before TXC edge
   .clk(sysclk),